@@ -0,0 +1,2 @@
+from .run_benchmark import run_benchmark
+from .synthetic_db import make_synthetic_db
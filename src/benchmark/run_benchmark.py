@@ -0,0 +1,219 @@
+"""
+Defines function src.benchmark.run_benchmark.run_benchmark()
+"""
+
+import json
+import logging
+import pathlib
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterator
+
+import src.dataviz
+import src.decision
+import src.discover
+import src.discover.table_links
+import src.transform_data
+from src.decision.join_keys import DEFAULT_MIN_MATCH_CRITERIA
+
+from .synthetic_db import make_synthetic_db
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _measure(
+    stage_results: list[dict], stage: str, trace_memory: bool
+) -> Iterator[None]:
+    """Records the wall time (and peak traced memory) of the enclosed block"""
+    if trace_memory:
+        tracemalloc.start()
+    start_time: float = time.perf_counter()
+    peak_memory_mb: float | None = None
+    try:
+        yield
+        if trace_memory:
+            peak_memory_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    seconds: float = time.perf_counter() - start_time
+    stage_results.append(
+        {
+            "stage": stage,
+            "seconds": round(seconds, 3),
+            "peak_memory_mb": (
+                None if peak_memory_mb is None else round(peak_memory_mb, 1)
+            ),
+        }
+    )
+    logger.info("[%s] finished in %.2f seconds", stage, seconds)
+
+
+def discovery_quality(identified_col_pairs: list, metadata: dict) -> dict:
+    """Compares the identified join keys against the planted foreign keys
+
+    Notes:
+        - Column pairs are compared ignoring their direction
+        - recall is the share of planted (foreign key, parent id) pairs which were
+            identified
+        - precision is the share of identified pairs whose columns draw their
+            values from the same IDs (i.e. planted pairs, and also pairs of 2
+            foreign keys which reference the same parent table)
+
+    Returns:
+        dict: {"n_identified", "n_planted", "recall", "precision"}
+    """
+
+    def unordered(col_pair) -> frozenset:
+        return frozenset((tuple(col_pair[0]), tuple(col_pair[1])))
+
+    identified: set[frozenset] = {unordered(pair) for pair in identified_col_pairs}
+    planted: set[frozenset] = {unordered(pair) for pair in metadata["planted_keys"]}
+    same_domain: set[frozenset] = set()
+    for domain_cols in metadata["key_domains"]:
+        for col_idx, col_1 in enumerate(domain_cols):
+            for col_2 in domain_cols[col_idx + 1 :]:
+                same_domain.add(unordered((col_1, col_2)))
+    return {
+        "n_identified": len(identified),
+        "n_planted": len(planted),
+        "recall": (
+            round(len(identified & planted) / len(planted), 4)
+            if len(planted) > 0
+            else None
+        ),
+        "precision": (
+            round(len(identified & same_domain) / len(identified), 4)
+            if len(identified) > 0
+            else None
+        ),
+    }
+
+
+def run_benchmark(
+    scales: dict[str, dict],
+    output_dir: str = "output/benchmark",
+    join_keys_kwargs: dict | None = None,
+    min_match_criteria: tuple[tuple, ...] = DEFAULT_MIN_MATCH_CRITERIA,
+    max_path_len: int = 3,
+    trace_memory: bool = True,
+) -> list[dict]:
+    """Generates a synthetic database at each scale, runs every stage of the
+    pipeline on it, and records the time and peak memory of each stage and the
+    quality of the discovered join keys
+
+    Notes:
+        - The stages are: make_synthetic_db, pivot_jsonl, load_tables,
+            discover.join_keys, decision.join_keys, make_sqlite_skeleton and
+            table_links.create_db
+        - Peak memory is measured with tracemalloc (which slows down the code it
+            measures, so pass trace_memory=False for accurate timings). Memory
+            used by worker processes (join_keys(workers>1)) is not traced
+        - Because the foreign keys are planted, the recall and precision of the
+            identified join keys are known (see discovery_quality()), so that a
+            performance change cannot silently break discovery
+
+    Args:
+        scales (dict): Keyword arguments of src.benchmark.make_synthetic_db()
+                        for each named scale
+        output_dir (str): Each scale is written to its own subdirectory of this,
+                        along with a "benchmark_results.json" summary
+        join_keys_kwargs (dict): (optional) Extra keyword arguments of
+                        src.discover.join_keys() (e.g. {"engine": "numpy"})
+        min_match_criteria (tuple): Criteria of src.decision.join_keys()
+        max_path_len (int): Argument of src.discover.table_links.create_db()
+        trace_memory (bool): Measure the peak memory of each stage
+
+    Returns:
+        list: one dict per scale, with its "stages" timings and its "quality"
+
+    Example:
+        >>> run_benchmark(
+        ...     scales={
+        ...         "small": {"n_tables": 10, "n_rows": (1_000, 5_000)},
+        ...         "medium": {"n_tables": 30, "n_rows": (10_000, 50_000)},
+        ...     },
+        ...     join_keys_kwargs={"engine": "numpy", "random_seed": 42},
+        ... )
+    """
+    if join_keys_kwargs is None:
+        join_keys_kwargs = {}
+    results: list[dict] = []
+    for scale_name, scale_kwargs in scales.items():
+        logger.info("Running benchmark at scale [%s]", scale_name)
+        scale_dir = pathlib.Path(output_dir) / scale_name
+        for subdir in ("data_input", "temp_storage", "output"):
+            (scale_dir / subdir).mkdir(parents=True, exist_ok=True)
+        stage_results: list[dict] = []
+
+        with _measure(stage_results, "make_synthetic_db", trace_memory):
+            metadata = make_synthetic_db(
+                output_dir=str(scale_dir / "data_input"),
+                metadata_filepath=str(scale_dir / "synthetic_db_metadata.json"),
+                **scale_kwargs,
+            )
+
+        with _measure(stage_results, "pivot_jsonl", trace_memory):
+            for path in sorted((scale_dir / "data_input").glob("*.jsonl")):
+                src.transform_data.pivot_jsonl(
+                    input_filepath=path,
+                    output_filepath=scale_dir / "temp_storage" / f"{path.stem}.json",
+                )
+
+        with _measure(stage_results, "load_tables", trace_memory):
+            table_data: dict[str, dict] = {}
+            for path in sorted((scale_dir / "temp_storage").glob("*.json")):
+                with open(path, "r", encoding="utf-8") as file:
+                    table_data[path.stem] = json.load(file)
+
+        all_matches_path = scale_dir / "output" / "all_matches.json"
+        with _measure(stage_results, "discover.join_keys", trace_memory):
+            src.discover.join_keys(
+                tbl_contents=table_data,
+                output_path=str(all_matches_path),
+                **join_keys_kwargs,
+            )
+        del table_data
+
+        join_keys_path = scale_dir / "output" / "identified_join_keys.json"
+        with _measure(stage_results, "decision.join_keys", trace_memory):
+            src.decision.join_keys(
+                input_data_filepath=str(all_matches_path),
+                min_match_criteria=min_match_criteria,
+                output_filepath=str(join_keys_path),
+            )
+        with open(join_keys_path, "r", encoding="utf-8") as file:
+            identified_col_pairs = json.load(file)
+
+        with _measure(stage_results, "make_sqlite_skeleton", trace_memory):
+            src.dataviz.make_sqlite_skeleton(
+                col_pairs=identified_col_pairs,
+                output_db_path=str(scale_dir / "output" / "sqlite_skeleton.db"),
+            )
+
+        with _measure(stage_results, "table_links.create_db", trace_memory):
+            src.discover.table_links.create_db(
+                input_data_filepath=str(join_keys_path),
+                max_path_len=max_path_len,
+                output_filepath=str(scale_dir / "output" / "table_link_paths.pickle"),
+            )
+
+        results.append(
+            {
+                "scale": scale_name,
+                "scale_kwargs": scale_kwargs,
+                "n_tables": len(metadata["tables"]),
+                "n_rows": sum(metadata["tables"].values()),
+                "stages": stage_results,
+                "quality": discovery_quality(identified_col_pairs, metadata),
+            }
+        )
+        logger.info("Benchmark results at scale [%s]: %s", scale_name, results[-1])
+
+    with open(
+        pathlib.Path(output_dir) / "benchmark_results.json", "w", encoding="utf-8"
+    ) as file:
+        json.dump(results, file, indent=4, default=str)
+    return results
@@ -0,0 +1,175 @@
+"""
+Defines function src.benchmark.synthetic_db.make_synthetic_db()
+"""
+
+import json
+import logging
+import pathlib
+import random
+
+logger = logging.getLogger(__name__)
+
+VALUE_TYPES: tuple[str, ...] = ("int", "str", "float", "mixed")
+# ID ranges of different tables never overlap, and nor do the non-key values of
+# different tables (which are drawn from the negative range of their table, or
+# its string form), so that the only true join keys are the planted ones #
+ID_RANGE_SIZE: int = 1_000_000_000
+
+
+def _random_value(value_type: str, cardinality: int, offset: int, rng: random.Random):
+    """Draws a (non-key) value of the given type from `cardinality` possible values
+    (starting at `offset`)"""
+    if value_type == "int":
+        return offset + rng.randrange(cardinality)
+    if value_type == "str":
+        return f"v{offset + rng.randrange(cardinality)}"
+    if value_type == "float":
+        return round(offset + rng.random() * cardinality, 2)
+    # "mixed": the same values, stored inconsistently as int or str #
+    value = offset + rng.randrange(cardinality)
+    return value if rng.random() < 0.5 else str(value)
+
+
+def make_synthetic_db(
+    output_dir: str = "data_input",
+    n_tables: int = 10,
+    n_rows: tuple[int, int] = (1_000, 10_000),
+    n_columns: tuple[int, int] = (2, 8),
+    null_rate: float = 0.05,
+    type_mix: dict[str, float] | None = None,
+    n_foreign_keys: int = 15,
+    random_seed: int = 0,
+    metadata_filepath: str | None = None,
+) -> dict:
+    """Writes a synthetic database, as one .jsonl file per table (the input
+    format expected by src.transform_data.pivot_jsonl()), with planted
+    foreign key relationships
+
+    Notes:
+        - Every table has a unique "id" column (integer or string IDs, drawn from
+            a range which no other table uses)
+        - Each planted foreign key is a column "fk_{i}" of a child table, whose
+            values are drawn from the "id" column of an earlier (parent) table
+        - The other columns contain random values of the types in `type_mix`
+            ("mixed" columns store the same values as both int and str e.g. 3
+            and "3"). Each table draws these values from its own range, so
+            non-key columns of different tables share no values
+        - Nulls are written as explicit JSON nulls
+
+    Args:
+        output_dir (str): Directory into which the .jsonl files are written
+        n_tables (int): Number of tables
+        n_rows (tuple): (min, max) number of rows per table
+        n_columns (tuple): (min, max) number of non-key columns per table
+        null_rate (float): Proportion of null values in every non-"id" column
+        type_mix (dict): Relative frequency of each value type of the non-key
+                        columns (and of "int" vs. "str" IDs). Defaults to
+                        {"int": 0.4, "str": 0.4, "float": 0.1, "mixed": 0.1}
+        n_foreign_keys (int): Number of planted foreign key columns
+        random_seed (int): Seed, so that the database is reproducible
+        metadata_filepath (str): (optional) The returned metadata is also written
+                        to this .json file (do not put it in `output_dir`)
+
+    Returns:
+        dict: {
+                "tables": {table name: number of rows},
+                "planted_keys": [[[child table, child column], [parent table, "id"]], ...],
+                "key_domains": [[[table, column], ...], ...] i.e. the groups of
+                    columns whose values are drawn from the same IDs
+              }
+
+    Example:
+        >>> make_synthetic_db(output_dir="data_input", n_tables=20, n_foreign_keys=30)
+    """
+    if n_tables < 2 and n_foreign_keys > 0:
+        raise ValueError("At least 2 tables are required to plant foreign keys")
+    if type_mix is None:
+        type_mix = {"int": 0.4, "str": 0.4, "float": 0.1, "mixed": 0.1}
+    unknown_types = set(type_mix) - set(VALUE_TYPES)
+    if len(unknown_types) > 0:
+        raise ValueError(f"Unknown value types {unknown_types} (expected {VALUE_TYPES})")
+
+    rng = random.Random(random_seed)
+    output_path = pathlib.Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    tbl_names: list[str] = [f"table_{tbl_idx:03d}" for tbl_idx in range(n_tables)]
+    tbl_n_rows: dict[str, int] = {
+        tbl_name: rng.randint(*n_rows) for tbl_name in tbl_names
+    }
+    n_key_types: float = type_mix.get("int", 0) + type_mix.get("str", 0)
+    p_str_id: float = type_mix.get("str", 0) / n_key_types if n_key_types > 0 else 0
+    id_is_str: dict[str, bool] = {
+        tbl_name: rng.random() < p_str_id for tbl_name in tbl_names
+    }
+    # foreign key columns of each table: {fk column name: parent table} #
+    foreign_keys: dict[str, dict[str, str]] = {tbl_name: {} for tbl_name in tbl_names}
+    for fk_idx in range(n_foreign_keys):
+        child_idx = rng.randrange(1, n_tables)
+        foreign_keys[tbl_names[child_idx]][f"fk_{fk_idx}"] = tbl_names[
+            rng.randrange(child_idx)
+        ]
+
+    id_offsets: dict[str, int] = {
+        tbl_name: (tbl_idx + 1) * ID_RANGE_SIZE
+        for tbl_idx, tbl_name in enumerate(tbl_names)
+    }
+
+    def make_id(tbl_name: str, row_idx: int):
+        id_value = id_offsets[tbl_name] + row_idx
+        return f"ID{id_value}" if id_is_str[tbl_name] else id_value
+
+    value_types: list[str] = list(type_mix)
+    value_type_weights: list[float] = list(type_mix.values())
+    for tbl_name in tbl_names:
+        n_tbl_rows: int = tbl_n_rows[tbl_name]
+        column_specs: list[tuple[str, str, int]] = [
+            (
+                f"col_{col_idx}",
+                rng.choices(value_types, weights=value_type_weights)[0],
+                rng.choice((5, 100, 10 * n_tbl_rows)),
+            )
+            for col_idx in range(rng.randint(*n_columns))
+        ]
+        tbl_foreign_keys: list[tuple[str, str]] = list(foreign_keys[tbl_name].items())
+        # each table has a different row order (i.e. ids are not sorted) #
+        row_order: list[int] = rng.sample(range(n_tbl_rows), k=n_tbl_rows)
+        with open(output_path / f"{tbl_name}.jsonl", "w", encoding="utf-8") as file:
+            for row_idx in row_order:
+                row: dict = {"id": make_id(tbl_name, row_idx)}
+                for fk_colname, parent_tbl_name in tbl_foreign_keys:
+                    row[fk_colname] = (
+                        None
+                        if rng.random() < null_rate
+                        else make_id(
+                            parent_tbl_name, rng.randrange(tbl_n_rows[parent_tbl_name])
+                        )
+                    )
+                for colname, value_type, cardinality in column_specs:
+                    row[colname] = (
+                        None
+                        if rng.random() < null_rate
+                        else _random_value(
+                            value_type, cardinality, -id_offsets[tbl_name], rng
+                        )
+                    )
+                file.write(json.dumps(row) + "\n")
+        logger.info("Wrote %s rows to [%s]", f"{n_tbl_rows:,}", tbl_name)
+
+    key_domains: dict[str, list[list[str]]] = {
+        tbl_name: [[tbl_name, "id"]] for tbl_name in tbl_names
+    }
+    planted_keys: list[list[list[str]]] = []
+    for child_tbl_name, tbl_foreign_keys in foreign_keys.items():
+        for fk_colname, parent_tbl_name in tbl_foreign_keys.items():
+            planted_keys.append([[child_tbl_name, fk_colname], [parent_tbl_name, "id"]])
+            key_domains[parent_tbl_name].append([child_tbl_name, fk_colname])
+    metadata: dict = {
+        "tables": tbl_n_rows,
+        "planted_keys": planted_keys,
+        "key_domains": [cols for cols in key_domains.values() if len(cols) > 1],
+    }
+    if metadata_filepath is not None:
+        with open(metadata_filepath, "w", encoding="utf-8") as file:
+            json.dump(metadata, file, indent=4)
+    return metadata
@@ -5,23 +5,33 @@ Function src.dataviz.join_key_decisions_to_csv.join_key_decisions_to_csv()
 import csv
 import json
 
+from src.discover.match_records import MatchRecords
+
 
 def join_key_decisions_to_csv(
-    input_data_filepath: str,
+    input_data_filepath: str | MatchRecords,
     output_filepath: str,
 ) -> None:
     """Exporting the discovered join keys as a CSV file
 
     Args:
         input_data_filepath (str): .json file containing identified join columns
-                (this file created by src.decision.join_keys.join_keys())
+                (this file created by src.decision.join_keys.join_keys()), or
+                the accepted match records themselves as a MatchRecords (see
+                src.decision.join_keys.accepted_match_records())
         output_filepath (str): output .csv file will be written to here
 
     Returns:
         None: output is written to a .csv file at `output_filepath`
     """
-    with open(input_data_filepath, "r", encoding="utf-8") as file:
-        col_pairs: list[list[str]] = json.load(file)
+    if isinstance(input_data_filepath, MatchRecords):
+        col_pairs = (
+            input_data_filepath.column_pair(idx)
+            for idx in range(len(input_data_filepath))
+        )
+    else:
+        with open(input_data_filepath, "r", encoding="utf-8") as file:
+            col_pairs: list[list[str]] = json.load(file)
 
     with open(output_filepath, mode="w", encoding="utf-8") as file:
         csv_writer = csv.DictWriter(
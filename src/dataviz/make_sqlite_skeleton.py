@@ -1,17 +1,164 @@
 """
 Defines function src.dataviz.make_sqlite_skeleton.make_sqlite_skeleton()
 """
+import itertools
+import json
+import logging
 import pathlib
+import random
 import sqlite3
 from collections import defaultdict
+from typing import Iterator
 
+from src.instrumentation import emit, instrument_stage
+from src.transform_data.summarise_jsonl import ColumnSummary
 
-def make_sqlite_skeleton(col_pairs: list[tuple], output_db_path: str) -> None:
+logger = logging.getLogger(__name__)
+
+
+# pragmas used while bulk-loading sampled rows (the database is rebuilt from
+# scratch on every run, so durability during the load is not needed) #
+LOAD_PRAGMAS: tuple[str, ...] = (
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",
+)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _sqlite_value(value):
+    """Values which SQLite cannot store directly (e.g. nested JSON, or integers
+    beyond 64 bits) are stored as JSON text"""
+    if isinstance(value, int) and not -(2**63) <= value < 2**63:
+        return str(value)
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+    return json.dumps(value)
+
+
+def _load_order(tbl_names: list[str], tbl_foreign_keys: dict) -> list[str]:
+    """Orders the tables so that every table comes after all of the tables whose
+    foreign keys reference it (tables in a cycle of references are kept in their
+    original order, after the others)"""
+    referenced_by: dict[str, set] = defaultdict(set)
+    for tbl_name in tbl_names:
+        for _, ref_tbl_name, _ in tbl_foreign_keys[tbl_name]:
+            if ref_tbl_name != tbl_name:
+                referenced_by[ref_tbl_name].add(tbl_name)
+    load_order: list[str] = []
+    remaining: list[str] = list(tbl_names)
+    while ready := [
+        tbl_name
+        for tbl_name in remaining
+        if referenced_by[tbl_name].isdisjoint(remaining)
+    ]:
+        load_order.extend(ready)
+        remaining = [tbl_name for tbl_name in remaining if tbl_name not in ready]
+    return load_order + remaining
+
+
+def _sample_rows(
+    tbl_data: dict,
+    col_names: list[str],
+    n_sample_rows: int | None,
+    rng: random.Random,
+    referenced_values: dict[str, set] | None = None,
+) -> Iterator[tuple]:
+    """Yields a random sample of (at most) `n_sample_rows` rows of the columns
+    `col_names` of a (pivoted) table, in their original row order
+
+    Rows containing any of the `referenced_values` (the foreign key values of
+    the rows already sampled from the tables which reference this one, keyed by
+    column name) are sampled first, and the rest of the sample is drawn from
+    the other rows
+    """
+    columns: list = [tbl_data[col_name] for col_name in col_names]
+    if any(isinstance(column, ColumnSummary) for column in columns):
+        # the samples of a summarised table are drawn from the same rows #
+        columns = [column.sample for column in columns]
+    n_rows: int = min(len(column) for column in columns) if columns else 0
+    if n_sample_rows is None or n_rows <= n_sample_rows:
+        row_indices = range(n_rows)
+    else:
+        referenced_columns: list[tuple] = [
+            (columns[col_idx], referenced_values[col_name])
+            for col_idx, col_name in enumerate(col_names)
+            if referenced_values and referenced_values.get(col_name)
+        ]
+        joining_rows: list[int] = [
+            row_idx
+            for row_idx in range(n_rows)
+            if any(
+                _sqlite_value(column[row_idx]) in values
+                for column, values in referenced_columns
+            )
+        ]
+        if len(joining_rows) >= n_sample_rows:
+            row_indices = sorted(rng.sample(joining_rows, k=n_sample_rows))
+        else:
+            joining_rows_set: set[int] = set(joining_rows)
+            other_rows: list[int] = [
+                row_idx
+                for row_idx in range(n_rows)
+                if row_idx not in joining_rows_set
+            ]
+            row_indices = sorted(
+                joining_rows
+                + rng.sample(other_rows, k=n_sample_rows - len(joining_rows))
+            )
+    for row_idx in row_indices:
+        yield tuple(_sqlite_value(column[row_idx]) for column in columns)
+
+
+@instrument_stage("dataviz.make_sqlite_skeleton")
+def make_sqlite_skeleton(
+    col_pairs: list[tuple],
+    output_db_path: str,
+    tbl_contents: dict[str, dict] | None = None,
+    n_sample_rows: int | None = 1_000,
+    create_indexes: bool = False,
+    batch_size: int = 10_000,
+    random_seed: int | None = None,
+) -> None:
     """Creates a SQLite database containing empty tables which
     obey the specified database schema. This enables the use of any
     SQLite schema visualisation tool for visualising the schema
     (I like dbvisualizer)
 
+    Notes:
+        - If `tbl_contents` is provided, each table is also filled with a random
+            sample of its rows (only the join columns are loaded, and join
+            columns which are not columns of the table in `tbl_contents` - such
+            as composite keys - are left empty), so that the discovered joins
+            can be tried out in the database. The sampling is
+            join-aware: referencing tables are sampled first, and the rows of a
+            referenced table whose keys appear in the sampled foreign keys are
+            preferred, so that the sampled rows of the tables actually join.
+            Rows are inserted with batched executemany() calls, one transaction
+            per table, using pragmas tuned for bulk-loading (see LOAD_PRAGMAS)
+        - Indexes are created after the rows have been loaded (which is faster
+            than maintaining them during the load)
+
+    Args:
+        col_pairs (list): Identified join column pairs (the output of
+                        src.decision.join_keys.join_keys())
+        output_db_path (str): Path of the SQLite database (replaced if it exists)
+        tbl_contents (dict): (optional) The pivoted contents of each table (as
+                        for src.discover.join_keys.join_keys()), from which to
+                        load sampled rows. Summarised tables (see
+                        src.transform_data.summarise_jsonl()) are loaded from
+                        their row samples
+        n_sample_rows (int): Maximum number of rows to load per table (None loads
+                        every row)
+        create_indexes (bool): Create an index on every join column
+        batch_size (int): Number of rows per executemany() call
+        random_seed (int): (optional) Seed for sampling the rows
+
     Example:
         >>> make_sqlite_skeleton(
         ...         col_pairs=[
@@ -21,31 +168,120 @@ def make_sqlite_skeleton(col_pairs: list[tuple], output_db_path: str) -> None:
         ...         ],
         ...         output_db_path="output/key_relationships_sqlite_skeleton.db",
         ...     )
-        CREATE TABLE users_tbl( id , FOREIGN KEY (id) REFERENCES transactions_tbl(user_id) );
-        CREATE TABLE transactions_tbl( user_id, product_id , FOREIGN KEY (product_id) REFERENCES products_tbl(id) );
-        CREATE TABLE products_tbl( id );
-        CREATE TABLE user_address_tbl( user_id , FOREIGN KEY (user_id) REFERENCES users_tbl(id) );
+        CREATE TABLE "users_tbl"( "id" , FOREIGN KEY ("id") REFERENCES "transactions_tbl"("user_id") );
+        CREATE TABLE "transactions_tbl"( "user_id", "product_id" , FOREIGN KEY ("product_id") REFERENCES "products_tbl"("id") );
+        CREATE TABLE "products_tbl"( "id" );
+        CREATE TABLE "user_address_tbl"( "user_id" , FOREIGN KEY ("user_id") REFERENCES "users_tbl"("id") );
     """
     pathlib.Path(output_db_path).unlink(missing_ok=True)
     sql_con = sqlite3.connect(output_db_path)
     sql_cur = sql_con.cursor()
+    if tbl_contents is not None:
+        for pragma in LOAD_PRAGMAS:
+            sql_cur.execute(pragma)
 
+    # index of the join columns and foreign keys of each table (built in a
+    # single pass over `col_pairs`) #
     tbl_col_ref = defaultdict(set)
+    tbl_foreign_keys = defaultdict(list)
     for col1, col2 in col_pairs:
         tbl_col_ref[col1[0]].add(col1[1])
         tbl_col_ref[col2[0]].add(col2[1])
+        tbl_foreign_keys[col1[0]].append((col1[1], col2[0], col2[1]))
 
-    for tbl_name, tbl_cols in tbl_col_ref.items():
-        create_tbl_statement = (
-            f'CREATE TABLE {tbl_name}( {", ".join([str(c) for c in tbl_cols])}'
-        )
-        for col1, col2 in col_pairs:
-            if col1[0] == tbl_name:
+    with sql_con:
+        sql_cur.execute("BEGIN")
+        for tbl_name, tbl_cols in tbl_col_ref.items():
+            create_tbl_statement = (
+                f"CREATE TABLE {_quote(tbl_name)}"
+                f"( {', '.join(_quote(c) for c in tbl_cols)}"
+            )
+            for fk_col, ref_tbl_name, ref_col in tbl_foreign_keys[tbl_name]:
                 create_tbl_statement += (
-                    f" , FOREIGN KEY ({col1[1]}) REFERENCES {col2[0]}({col2[1]})"
+                    f" , FOREIGN KEY ({_quote(fk_col)})"
+                    f" REFERENCES {_quote(ref_tbl_name)}({_quote(ref_col)})"
+                )
+            create_tbl_statement += " );"
+            print(create_tbl_statement)
+            sql_cur.execute(create_tbl_statement)
+
+    if tbl_contents is not None:
+        # foreign key values of the rows sampled so far, keyed by the referenced
+        # (table name, column name) #
+        referenced_values: dict[tuple[str, str], set] = defaultdict(set)
+        for tbl_name in _load_order(list(tbl_col_ref), tbl_foreign_keys):
+            if tbl_name not in tbl_contents:
+                logger.warning("No data provided for table [%s]", tbl_name)
+                continue
+            # join columns which are not columns of the table (e.g. the composite
+            # keys of src.discover.composite_keys) are left empty #
+            col_names: list[str] = [
+                col_name
+                for col_name in tbl_col_ref[tbl_name]
+                if col_name in tbl_contents[tbl_name]
+            ]
+            if len(col_names) < len(tbl_col_ref[tbl_name]):
+                logger.info(
+                    "Not loading columns %s of table [%s] (not in tbl_contents)",
+                    sorted(set(tbl_col_ref[tbl_name]) - set(col_names)),
+                    tbl_name,
+                )
+            if len(col_names) == 0:
+                continue
+            insert_statement: str = (
+                f"INSERT INTO {_quote(tbl_name)}"
+                f" ({', '.join(_quote(c) for c in col_names)})"
+                f" VALUES ({', '.join('?' * len(col_names))})"
+            )
+            rng = (
+                random
+                if random_seed is None
+                else random.Random(f"{random_seed}:{tbl_name}")
+            )
+            rows = _sample_rows(
+                tbl_contents[tbl_name],
+                col_names,
+                n_sample_rows,
+                rng,
+                referenced_values={
+                    col_name: referenced_values[(tbl_name, col_name)]
+                    for col_name in col_names
+                    if (tbl_name, col_name) in referenced_values
+                },
+            )
+            foreign_keys: list[tuple] = [
+                (col_names.index(fk_col), (ref_tbl_name, ref_col))
+                for fk_col, ref_tbl_name, ref_col in tbl_foreign_keys[tbl_name]
+                if fk_col in col_names
+            ]
+            n_rows_loaded: int = 0
+            with sql_con:
+                while batch := list(itertools.islice(rows, batch_size)):
+                    sql_cur.executemany(insert_statement, batch)
+                    n_rows_loaded += len(batch)
+                    for col_idx, ref_col in foreign_keys:
+                        referenced_values[ref_col].update(
+                            row[col_idx] for row in batch if row[col_idx] is not None
+                        )
+            emit("count", name="rows_loaded", value=n_rows_loaded)
+            logger.info("Loaded %s rows into [%s]", f"{n_rows_loaded:,}", tbl_name)
+
+    if create_indexes:
+        with sql_con:
+            sql_cur.execute("BEGIN")
+            # index names are numbered, since e.g. ("a_b", "c") and ("a", "b_c")
+            # would otherwise both give "idx_a_b_c" #
+            index_columns = (
+                (tbl_name, col_name)
+                for tbl_name, tbl_cols in tbl_col_ref.items()
+                for col_name in tbl_cols
+            )
+            for index_num, (tbl_name, col_name) in enumerate(index_columns):
+                sql_cur.execute(
+                    f"CREATE INDEX {_quote(f'idx{index_num}_{tbl_name}_{col_name}')}"
+                    f" ON {_quote(tbl_name)} ({_quote(col_name)})"
                 )
-        create_tbl_statement += " );"
-        print(create_tbl_statement)
-        sql_cur.execute(create_tbl_statement)
+            sql_cur.execute("ANALYZE")
 
     sql_con.close()
+    emit("count", name="tables_created", value=len(tbl_col_ref))
@@ -1,3 +1,3 @@
 from .comparison_operators import greater_than, less_than
-from .join_keys import join_keys
-
+from .join_keys import accepted_match_records, join_keys
+from .metrics_table import load_metrics_table, sweep_thresholds
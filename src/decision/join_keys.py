@@ -5,23 +5,69 @@ Function src.decision.join_keys.join_keys()
 import json
 from typing import Callable
 
-from src.navigate_data import fetch_from_dict
+from src.discover.match_records import MatchRecords
+from src.instrumentation import emit, instrument_stage
+from src.navigate_data import fetch_from_dict, iter_records
 
+from . import comparison_operators
 
-def greater_than(x, y) -> bool:
-    if x is None or y is None:
-        return False
-    return x > y
 
+DEFAULT_MIN_MATCH_CRITERIA: tuple[tuple, ...] = (
+    (
+        "matches",
+        "exactly_1_match_in_lookup",
+        "percent",
+        (comparison_operators.greater_than, 0.1),
+    ),
+    (
+        "sampled_col",
+        "sample_size",
+        "percent_null",
+        (comparison_operators.less_than, 0.95),
+    ),
+    (
+        "sampled_col",
+        "sample_size",
+        "n_unique/n_rows",
+        (comparison_operators.greater_than, 0.5),
+    ),
+    ("lookup_col", "size", "percent_null", (comparison_operators.less_than, 0.95)),
+    ("sampled_col", "sample_size", "n_unique", (comparison_operators.greater_than, 4)),
+    ("lookup_col", "size", "n_unique", (comparison_operators.greater_than, 4)),
+)
 
-def less_than(x, y) -> bool:
-    if x is None or y is None:
-        return False
-    return x < y
 
+def accepted_match_records(
+    match_records: MatchRecords, min_match_criteria: tuple[tuple, ...]
+) -> MatchRecords:
+    """Selects the match records which satisfy every criterion in
+    `min_match_criteria`, reading the field values straight from the arrays of
+    `match_records` (no match record dicts are built)
 
+    Args:
+        match_records (MatchRecords): The match records to decide on
+        min_match_criteria (tuple): As for join_keys()
+
+    Returns:
+        MatchRecords: the accepted match records (in their original order)
+    """
+    criteria_values: list[tuple[Callable, object, list]] = [
+        (crit[-1][0], crit[-1][1], match_records.values(crit[:-1]))
+        for crit in min_match_criteria
+    ]
+    return match_records.select(
+        idx
+        for idx in range(len(match_records))
+        if all(
+            comparison_func(values[idx], threshold)
+            for comparison_func, threshold, values in criteria_values
+        )
+    )
+
+
+@instrument_stage("decision.join_keys")
 def join_keys(
-    input_data_filepath: str,
+    input_data_filepath: str | MatchRecords,
     min_match_criteria: tuple[tuple, ...],
     output_filepath: str
 ) -> None:
@@ -30,45 +76,68 @@ def join_keys(
     column pairs show sufficient evidence to be considered
     as joinable ID columns
 
+    Notes:
+        - The input file is streamed one match record at a time, so memory use
+            does not depend on the number of column pairs in it
+        - The match records can instead be passed in memory as a
+            src.discover.match_records.MatchRecords, in which case the criteria
+            are evaluated directly on its arrays (see accepted_match_records())
+
     Args:
-        input_data_filepath (str): TODO
-        min_match_criteria (tuple): TODO
-        output_filepath (str): TODO
+        input_data_filepath (str): .json or .jsonl file written by
+                src.discover.join_keys.join_keys() (or a MatchRecords)
+        min_match_criteria (tuple): The criteria which a match record must
+                satisfy (all of them) for its column pair to be accepted as a
+                join key pair. Each criterion is a tuple of the nested keys of a
+                match record field, followed by a (comparison function,
+                threshold) tuple e.g.
+                ("matches", "exactly_1_match_in_lookup", "percent",
+                    (greater_than, 0.1))
+                (see src.decision.comparison_operators). DEFAULT_MIN_MATCH_CRITERIA
+                is a reasonable starting point
+        output_filepath (str): Path of the .json file to which the accepted
+                column pairs are written
 
     Returns:
         None: output is exported to a .json file at `output_filepath`, in
                     the format expected by the argument `col_pairs` of function
                      src.dataviz.make_sqlite_skeleton.make_sqlite_skeleton()
     """
-    with open(input_data_filepath, "r", encoding="utf-8") as file:
-        match_data = json.load(file)
-
     results: list[tuple] = []
+    n_match_records: int = 0
 
-    for match_pair in match_data:
-        criterion_violations: int = 0
-        for crit in min_match_criteria:
-            comparison_func = crit[-1][0]
-            threshold = crit[-1][1]
-            obs_value = fetch_from_dict(dct=match_pair, selectors=crit[:-1])
-            if not comparison_func(obs_value, threshold):
-                criterion_violations += 1
-                break
-        if criterion_violations == 0:
-            results.append(
-                (
-                    (
-                        match_pair["sampled_col"]["table_name"],
-                        match_pair["sampled_col"]["column_name"],
-                    ),
+    if isinstance(input_data_filepath, MatchRecords):
+        n_match_records = len(input_data_filepath)
+        accepted = accepted_match_records(input_data_filepath, min_match_criteria)
+        results = [accepted.column_pair(idx) for idx in range(len(accepted))]
+    else:
+        for match_pair in iter_records(input_data_filepath):
+            n_match_records += 1
+            criterion_violations: int = 0
+            for crit in min_match_criteria:
+                comparison_func = crit[-1][0]
+                threshold = crit[-1][1]
+                obs_value = fetch_from_dict(dct=match_pair, selectors=crit[:-1])
+                if not comparison_func(obs_value, threshold):
+                    criterion_violations += 1
+                    break
+            if criterion_violations == 0:
+                results.append(
                     (
-                        match_pair["lookup_col"]["table_name"],
-                        match_pair["lookup_col"]["column_name"],
-                    ),
+                        (
+                            match_pair["sampled_col"]["table_name"],
+                            match_pair["sampled_col"]["column_name"],
+                        ),
+                        (
+                            match_pair["lookup_col"]["table_name"],
+                            match_pair["lookup_col"]["column_name"],
+                        ),
+                    )
                 )
-            )
 
     print(f"Discovered {len(results)} join key pairs")
+    emit("count", name="match_records_read", value=n_match_records)
+    emit("count", name="join_key_pairs_identified", value=len(results))
 
     with open(output_filepath, "w", encoding="utf-8") as file:
         json.dump(results, file, indent=4)
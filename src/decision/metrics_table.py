@@ -0,0 +1,218 @@
+"""
+Vectorised evaluation of join key decision criteria: the output of
+src.discover.join_keys.join_keys() is loaded once into a flat columnar table,
+and criteria are evaluated as numpy boolean masks
+"""
+
+import array
+import itertools
+import sys
+from typing import Callable
+
+import numpy as np  # pip install numpy
+
+from src.navigate_data import flatten_dict, iter_records
+
+from .comparison_operators import greater_than, less_than
+
+VECTORISED_COMPARISONS: dict[Callable, Callable] = {
+    greater_than: np.greater,
+    less_than: np.less,
+}
+
+
+class MetricsTable:
+    """The match records of src.discover.join_keys.join_keys(), stored as one
+    column per (nested) record field
+
+    Notes:
+        - Numeric fields are stored as float64 arrays (None is stored as NaN, so
+            that - as with the comparison functions in
+            src.decision.comparison_operators - any comparison with None is False)
+        - Text fields (table and column names), and any other non-numeric
+            fields, are stored as lists (missing values are stored as None)
+
+    Attributes:
+        n_rows (int): Number of match records
+        columns (dict): Column data, keyed by the tuple of nested keys of the field
+                            e.g. ("matches", "exactly_1_match_in_lookup", "percent")
+    """
+
+    def __init__(self, columns: dict[tuple, np.ndarray | list], n_rows: int) -> None:
+        self.columns = columns
+        self.n_rows = n_rows
+
+    def criterion_mask(self, criterion: tuple) -> np.ndarray:
+        """Evaluates a single criterion e.g.
+        ("matches", "exactly_1_match_in_lookup", "percent", (greater_than, 0.1))
+        for every match record at once"""
+        comparison_func, threshold = criterion[-1]
+        values = self.columns[tuple(criterion[:-1])]
+        if comparison_func in VECTORISED_COMPARISONS and isinstance(values, np.ndarray):
+            if threshold is None:
+                return np.zeros(self.n_rows, dtype=bool)
+            return VECTORISED_COMPARISONS[comparison_func](values, threshold)
+        # fall back to calling the comparison function on each value #
+        if isinstance(values, np.ndarray):
+            values = [None if np.isnan(x) else x for x in values.tolist()]
+        return np.fromiter(
+            (comparison_func(x, threshold) for x in values),
+            dtype=bool,
+            count=self.n_rows,
+        )
+
+    def criteria_mask(self, min_match_criteria: tuple[tuple, ...]) -> np.ndarray:
+        """Returns True for each match record which satisfies every criterion"""
+        mask = np.ones(self.n_rows, dtype=bool)
+        for criterion in min_match_criteria:
+            mask &= self.criterion_mask(criterion)
+        return mask
+
+    def column_pairs(self, mask: np.ndarray) -> list[tuple]:
+        """Returns the column pairs of the selected match records, in the format
+        written by src.decision.join_keys.join_keys()"""
+        sample_tbl = self.columns[("sampled_col", "table_name")]
+        sample_col = self.columns[("sampled_col", "column_name")]
+        lookup_tbl = self.columns[("lookup_col", "table_name")]
+        lookup_col = self.columns[("lookup_col", "column_name")]
+        return [
+            ((sample_tbl[idx], sample_col[idx]), (lookup_tbl[idx], lookup_col[idx]))
+            for idx in np.flatnonzero(mask).tolist()
+        ]
+
+
+def _is_numeric(value: object) -> bool:
+    """True for values which can be stored in a float64 column"""
+    return isinstance(value, (int, float))
+
+
+def load_metrics_table(input_data_filepath: str) -> MetricsTable:
+    """Reads the (.json or .jsonl) output of src.discover.join_keys.join_keys()
+    into a MetricsTable (streaming the input one record at a time)
+
+    Notes:
+        - The type of each field is decided by its first non-None value. A
+            numeric field which later contains a non-numeric value (e.g.
+            "adaptive_sampling.stopped_early") is converted to a list
+        - Non-scalar leaves (e.g. the column lists of "composite_key") are
+            stored as lists of objects
+        - Records which lack a field (e.g. "adaptive_sampling" on a pair rejected
+            by a prefilter) are stored as NaN (numeric) or None (other fields)
+    """
+    numeric_columns: dict[tuple, array.array] = {}
+    object_columns: dict[tuple, list] = {}
+    all_none_paths: set[tuple] = set()
+    n_rows: int = 0
+    for match_pair in iter_records(input_data_filepath):
+        for path, value in flatten_dict(match_pair).items():
+            if value is None:
+                all_none_paths.add(path)
+                continue
+            if path in numeric_columns and not _is_numeric(value):
+                object_columns[path] = [
+                    None if np.isnan(x) else x for x in numeric_columns.pop(path)
+                ]
+            if path in numeric_columns:
+                column = numeric_columns[path]
+                column.extend([np.nan] * (n_rows - len(column)))
+                column.append(value)
+            elif path not in object_columns and _is_numeric(value):
+                numeric_columns[path] = array.array("d", [np.nan] * n_rows)
+                numeric_columns[path].append(value)
+            else:
+                column = object_columns.setdefault(path, [])
+                column.extend([None] * (n_rows - len(column)))
+                column.append(sys.intern(value) if isinstance(value, str) else value)
+        n_rows += 1
+    for path in all_none_paths - set(numeric_columns) - set(object_columns):
+        numeric_columns[path] = array.array("d")
+    columns: dict[tuple, np.ndarray | list] = {}
+    for path, values in numeric_columns.items():
+        values.extend([np.nan] * (n_rows - len(values)))
+        columns[path] = np.array(values, dtype=np.float64)
+    for path, values in object_columns.items():
+        values.extend([None] * (n_rows - len(values)))
+        columns[path] = values
+    return MetricsTable(columns=columns, n_rows=n_rows)
+
+
+def sweep_thresholds(
+    input_data_filepath: str,
+    min_match_criteria: tuple[tuple, ...],
+    threshold_grid: dict[tuple, list],
+) -> list[dict]:
+    """Evaluates every combination of candidate thresholds in one pass, and
+    reports how many join key pairs each combination accepts
+
+    Notes:
+        - The input is read only once, and the mask of each (criterion, threshold)
+            is computed only once, so evaluating a large grid costs little more
+            than evaluating a single configuration
+
+    Args:
+        input_data_filepath (str): .json or .jsonl file written by
+                src.discover.join_keys.join_keys()
+        min_match_criteria (tuple): Criteria in the format expected by
+                src.decision.join_keys.join_keys()
+        threshold_grid (dict): Candidate thresholds to try for some (or all) of
+                the criteria, keyed by the criterion's selectors. Criteria which
+                are not in the grid keep their threshold from `min_match_criteria`
+
+    Returns:
+        list: one dict per threshold combination, containing the thresholds used
+                and the number of join key pairs accepted ("n_join_pairs")
+
+    Example:
+        >>> sweep_thresholds(
+        ...     input_data_filepath="output/discover/join_keys/all_matches.json",
+        ...     min_match_criteria=(
+        ...         ("matches", "exactly_1_match_in_lookup", "percent", (greater_than, 0.1)),
+        ...         ("sampled_col", "sample_size", "n_unique", (greater_than, 4)),
+        ...     ),
+        ...     threshold_grid={
+        ...         ("matches", "exactly_1_match_in_lookup", "percent"): [0.1, 0.5, 0.9],
+        ...     },
+        ... )
+        [{'thresholds': {'matches.exactly_1_match_in_lookup.percent': 0.1,
+                         'sampled_col.sample_size.n_unique': 4}, 'n_join_pairs': 61}, ...]
+    """
+    criteria_selectors: list[tuple] = [tuple(crit[:-1]) for crit in min_match_criteria]
+    unknown_selectors = set(threshold_grid) - set(criteria_selectors)
+    if len(unknown_selectors) > 0:
+        raise ValueError(
+            f"threshold_grid contains selectors which are not in min_match_criteria: "
+            f"{unknown_selectors}"
+        )
+
+    metrics_table = load_metrics_table(input_data_filepath)
+    criterion_thresholds: list[list] = [
+        threshold_grid.get(selectors, [crit[-1][1]])
+        for selectors, crit in zip(criteria_selectors, min_match_criteria)
+    ]
+    masks: list[dict] = [
+        {
+            threshold: metrics_table.criterion_mask(
+                (*selectors, (crit[-1][0], threshold))
+            )
+            for threshold in thresholds
+        }
+        for selectors, crit, thresholds in zip(
+            criteria_selectors, min_match_criteria, criterion_thresholds
+        )
+    ]
+
+    sweep_results: list[dict] = []
+    for thresholds in itertools.product(*criterion_thresholds):
+        mask = np.ones(metrics_table.n_rows, dtype=bool)
+        for criterion_masks, threshold in zip(masks, thresholds):
+            mask &= criterion_masks[threshold]
+        sweep_results.append(
+            {
+                "thresholds": {
+                    ".".join(str(s) for s in selectors): threshold
+                    for selectors, threshold in zip(criteria_selectors, thresholds)
+                },
+                "n_join_pairs": int(np.count_nonzero(mask)),
+            }
+        )
+    return sweep_results
@@ -1 +1,4 @@
+from .column_profile import ColumnProfileCache
+from .composite_keys import composite_join_keys
 from .join_keys import join_keys
+from .match_records import MatchRecords
@@ -0,0 +1,121 @@
+"""
+Defines class src.discover.adaptive_sampling.AdaptiveSampler
+"""
+
+import math
+import random
+from dataclasses import dataclass
+from typing import Callable
+
+
+def _bernoulli_kl(p: float, q: float) -> float:
+    """Kullback-Leibler divergence between Bernoulli(p) and Bernoulli(q)"""
+    divergence: float = 0.0
+    if p > 0:
+        divergence += p * math.log(p / q) if q > 0 else math.inf
+    if p < 1:
+        divergence += (1 - p) * math.log((1 - p) / (1 - q)) if q < 1 else math.inf
+    return divergence
+
+
+@dataclass
+class AdaptiveSampler:
+    """Scores a column pair in growing batches of sampled values, and stops as
+    soon as the "exactly 1 match in lookup" rate is confidently below (a clear
+    non-match) or above (a clear match) `threshold`
+
+    Notes:
+        - The distinct sampled values are scored in a random order, in batches of
+            `initial_batch_size`, 2*`initial_batch_size`, 4*`initial_batch_size` etc.
+        - After each batch, a Chernoff (Kullback-Leibler) bound is placed on the
+            match rate, with a union bound over the number of batches. The bound
+            also holds for sampling without replacement (Hoeffding, 1963), and is
+            much tighter than the plain Hoeffding bound for rates near 0 (the
+            common case of 2 unrelated columns). Scoring stops once the observed
+            rate is far enough from `threshold` that the probability of it being
+            on the other side is below 1-`confidence`
+        - `threshold` should be the "exactly_1_match_in_lookup" "percent"
+            threshold used in src.decision.join_keys.join_keys()
+        - The match counts and percentages in the output record are then
+            computed over the values which were scored, and the number of values
+            scored is recorded under "adaptive_sampling" in the record
+
+    Example:
+        >>> src.discover.join_keys(
+        ...     tbl_contents=table_data,
+        ...     adaptive_sampler=AdaptiveSampler(threshold=0.1, confidence=0.99),
+        ... )
+    """
+
+    threshold: float = 0.1
+    confidence: float = 0.99
+    initial_batch_size: int = 32
+
+    def is_settled(self, n_matched: int, n_scored: int, n_values: int) -> str | None:
+        """Checks whether the match rate of all `n_values` values is confidently
+        below or above `threshold`, having seen `n_matched` of the first
+        `n_scored` values match
+
+        Returns:
+            str: "below_threshold", "above_threshold" or None (not yet settled)
+        """
+        n_batches: int = max(
+            1, math.ceil(math.log2(max(n_values / self.initial_batch_size, 1))) + 1
+        )
+        required_evidence: float = math.log(n_batches / (1 - self.confidence))
+        match_rate: float = n_matched / n_scored
+        if match_rate == self.threshold:
+            return None
+        if n_scored * _bernoulli_kl(match_rate, self.threshold) < required_evidence:
+            return None
+        return "below_threshold" if match_rate < self.threshold else "above_threshold"
+
+    def count_matches(
+        self,
+        sample_profile,
+        lookup_profile,
+        count_matches_func: Callable,
+        rng: random.Random,
+    ) -> tuple[int, int, dict]:
+        """Counts matches batch by batch, stopping early where possible
+
+        Returns:
+            tuple: (n_in_sample_have_any_matches, n_in_sample_have_exactly_1_match,
+                    dict describing the adaptive sampling of this pair)
+        """
+        n_values: int = sample_profile.sample_n_unique
+        # lazy Fisher-Yates shuffle: positions which have been swapped are stored
+        # in `swapped`, so only the part of the order which is scored is drawn #
+        swapped: dict[int, int] = {}
+        n_any_matches: int = 0
+        n_exactly_1_match: int = 0
+        n_scored: int = 0
+        batch_size: int = self.initial_batch_size
+        stopped_early: str | None = None
+        while n_scored < n_values:
+            batch: list[int] = []
+            for position in range(n_scored, min(n_scored + batch_size, n_values)):
+                swap_position = rng.randrange(position, n_values)
+                batch.append(swapped.get(swap_position, swap_position))
+                swapped[swap_position] = swapped.get(position, position)
+            batch_n_any_matches, batch_n_exactly_1_match = count_matches_func(
+                sample_profile.sample_subset(batch), lookup_profile
+            )
+            n_any_matches += batch_n_any_matches
+            n_exactly_1_match += batch_n_exactly_1_match
+            n_scored += len(batch)
+            batch_size *= 2
+            if n_scored == n_values:
+                break
+            stopped_early = self.is_settled(n_exactly_1_match, n_scored, n_values)
+            if stopped_early is not None:
+                break
+        return (
+            n_any_matches,
+            n_exactly_1_match,
+            {
+                "n_values_scored": n_scored,
+                "n_values_available": n_values,
+                "stopped_early": stopped_early,
+            },
+        )
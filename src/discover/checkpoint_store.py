@@ -0,0 +1,164 @@
+"""
+Defines class src.discover.checkpoint_store.CheckpointStore
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import sqlite3
+from typing import Iterable, Sequence
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BLOCK_SIZE: int = 65_536
+
+
+def column_fingerprint(values: Sequence) -> str:
+    """Hashes the contents (and order) of a column
+
+    Example:
+        >>> column_fingerprint([1, 2, None]) == column_fingerprint([1, 2, None])
+        True
+        >>> column_fingerprint([1, 2, None]) == column_fingerprint(["1", 2, None])
+        False
+    """
+    if hasattr(values, "fingerprint"):  # e.g. a summarised column #
+        return values.fingerprint()
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(str(len(values)).encode("ascii"))
+    values_iter = iter(values)
+    while block := list(itertools.islice(values_iter, FINGERPRINT_BLOCK_SIZE)):
+        hasher.update(json.dumps(block, default=repr).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class CheckpointStore:
+    """SQLite store of finished column pair comparisons, so that an interrupted
+    src.discover.join_keys.join_keys() run can be resumed, and so that a rerun only
+    recomputes the column pairs involving columns whose contents have changed
+
+    Notes:
+        - Each stored result is keyed by the table and column names of the pair,
+            the fingerprint of the contents of both columns (see
+            column_fingerprint()) and the discovery parameters which affect the
+            result (`params`). A stored result is only reused if all of these match
+        - Results are committed after every table pair, so at most one table
+            pair of work is lost if a run dies
+
+    Example:
+        >>> store = CheckpointStore("output/discover/join_keys/checkpoint.db",
+        ...     params={"n_samples": 500, "random_seed": 42})
+    """
+
+    def __init__(self, db_path: str, params: dict) -> None:
+        self.db_path = db_path
+        self.params_key: str = json.dumps(params, sort_keys=True)
+        self._con = sqlite3.connect(db_path)
+        self._con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pair_results (
+                sample_table    TEXT NOT NULL,
+                sample_column   TEXT NOT NULL,
+                lookup_table    TEXT NOT NULL,
+                lookup_column   TEXT NOT NULL,
+                params          TEXT NOT NULL,
+                sample_fingerprint  TEXT NOT NULL,
+                lookup_fingerprint  TEXT NOT NULL,
+                record          TEXT NOT NULL,
+                PRIMARY KEY (sample_table, lookup_table, sample_column, lookup_column, params)
+            )
+            """
+        )
+        self._con.commit()
+
+    def close(self) -> None:
+        self._con.close()
+
+    def _iter_rows(
+        self,
+        sample_tbl_name: str,
+        lookup_tbl_name: str,
+        fingerprints: dict[tuple[str, str], str],
+        with_records: bool,
+    ) -> Iterable[tuple]:
+        cursor = self._con.execute(
+            f"""
+            SELECT  sample_column, lookup_column, sample_fingerprint, lookup_fingerprint
+                    {", record" if with_records else ""}
+            FROM    pair_results
+            WHERE   sample_table = ? AND lookup_table = ? AND params = ?
+            """,
+            (sample_tbl_name, lookup_tbl_name, self.params_key),
+        )
+        for row in cursor:
+            sample_colname, lookup_colname, sample_fp, lookup_fp = row[:4]
+            if fingerprints.get((sample_tbl_name, sample_colname)) == sample_fp and (
+                fingerprints.get((lookup_tbl_name, lookup_colname)) == lookup_fp
+            ):
+                yield row
+
+    def completed_column_pairs(
+        self,
+        sample_tbl_name: str,
+        lookup_tbl_name: str,
+        fingerprints: dict[tuple[str, str], str],
+    ) -> set[tuple[str, str]]:
+        """Returns the (sample column, lookup column) pairs of the table pair which
+        have a stored result for the current column contents"""
+        return {
+            (row[0], row[1])
+            for row in self._iter_rows(
+                sample_tbl_name, lookup_tbl_name, fingerprints, with_records=False
+            )
+        }
+
+    def fetch_records(
+        self,
+        sample_tbl_name: str,
+        lookup_tbl_name: str,
+        fingerprints: dict[tuple[str, str], str],
+    ) -> dict[tuple[str, str], dict]:
+        """Returns the stored match records of the table pair, keyed by
+        (sample column, lookup column)"""
+        return {
+            (row[0], row[1]): json.loads(row[4])
+            for row in self._iter_rows(
+                sample_tbl_name, lookup_tbl_name, fingerprints, with_records=True
+            )
+        }
+
+    def save_records(
+        self, records: list[dict], fingerprints: dict[tuple[str, str], str]
+    ) -> None:
+        """Stores match records (in a single transaction)"""
+        with self._con:
+            self._con.executemany(
+                """
+                INSERT OR REPLACE INTO pair_results
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    (
+                        record["sampled_col"]["table_name"],
+                        record["sampled_col"]["column_name"],
+                        record["lookup_col"]["table_name"],
+                        record["lookup_col"]["column_name"],
+                        self.params_key,
+                        fingerprints[
+                            (
+                                record["sampled_col"]["table_name"],
+                                record["sampled_col"]["column_name"],
+                            )
+                        ],
+                        fingerprints[
+                            (
+                                record["lookup_col"]["table_name"],
+                                record["lookup_col"]["column_name"],
+                            )
+                        ],
+                        json.dumps(record),
+                    )
+                    for record in records
+                ),
+            )
@@ -0,0 +1,324 @@
+"""
+Defines class src.discover.column_profile.ColumnProfile and
+class src.discover.column_profile.ColumnProfileCache
+"""
+
+import dataclasses
+import functools
+import random
+import sys
+import time
+import weakref
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Sequence
+
+from src.instrumentation import emit, hooks_active
+from src.transform_data.summarise_jsonl import ColumnSummary
+
+
+@dataclass
+class ColumnProfile:
+    """Summary statistics of a single column, computed once and then reused
+    for every column pair that the column takes part in
+
+    Attributes:
+        n_rows (int): Number of rows in the column
+        n_null (int): Number of None values in the column
+        value_counts (dict): Number of times that each (non-null) value appears
+                                in the column
+        type_fingerprint (frozenset): Names of the data types of the distinct
+                                (non-null) values in the column
+        sample (list): Random sample of (at most) `n_samples` values from the column
+        sample_n_null (int): Number of None values in `sample`
+        sample_distinct (tuple): Distinct non-null values in `sample`
+    """
+
+    n_rows: int
+    n_null: int
+    value_counts: dict
+    type_fingerprint: frozenset
+    sample: list
+    sample_n_null: int
+    sample_distinct: tuple
+    nbytes: int = field(default=0, repr=False)
+
+    @property
+    def n_unique(self) -> int:
+        """Number of distinct values in the column (None counts as a value)"""
+        return len(self.value_counts) + (1 if self.n_null > 0 else 0)
+
+    @property
+    def sample_n_rows(self) -> int:
+        return len(self.sample)
+
+    @property
+    def sample_n_unique(self) -> int:
+        """Number of distinct non-null values in the sample"""
+        return len(self.sample_distinct)
+
+    def sample_subset(self, indices: list[int]) -> "ColumnProfile":
+        """Returns a copy of the profile whose distinct sampled values are only
+        those at `indices` (used for scoring a sample in batches)"""
+        return dataclasses.replace(
+            self, sample_distinct=tuple(self.sample_distinct[i] for i in indices)
+        )
+
+
+def estimate_nbytes(profile: ColumnProfile) -> int:
+    """Estimates the memory footprint of a ColumnProfile: its containers, plus
+    the distinct values and counts in `value_counts` (the values in `sample` and
+    `sample_distinct` are the same objects as the keys of `value_counts`, so are
+    only counted once)"""
+    return (
+        sys.getsizeof(profile.value_counts)
+        + sum(
+            sys.getsizeof(value) + sys.getsizeof(count)
+            for value, count in profile.value_counts.items()
+        )
+        + sys.getsizeof(profile.sample)
+        + sys.getsizeof(profile.sample_distinct)
+    )
+
+
+def draw_sample(
+    values: Sequence, n_samples: int, rng: random.Random | None = None
+) -> list:
+    """Draws the random sample of a column: all of its values if it has at most
+    `n_samples` rows, and otherwise a random selection of `n_samples` of them"""
+    if len(values) > n_samples:
+        return (rng or random).sample(values, k=n_samples)
+    return list(values)
+
+
+def profile_column(
+    values: Sequence, n_samples: int, rng: random.Random | None = None
+) -> ColumnProfile:
+    """Computes the ColumnProfile of a single column in one pass over its values
+
+    Args:
+        values (list): The column contents
+        n_samples (int): Where the column has more than `n_samples` rows, only a
+                        random selection of `n_samples` rows is kept as the sample
+        rng (random.Random): (optional) random number generator used to draw the
+                        sample (the global `random` module is used if omitted)
+
+    Returns:
+        ColumnProfile: the column statistics
+    """
+    value_counts = Counter(values)
+    n_null: int = value_counts.pop(None, 0)
+    sample = draw_sample(values, n_samples, rng)
+    sample_distinct = tuple(dict.fromkeys(x for x in sample if x is not None))
+    profile = ColumnProfile(
+        n_rows=len(values),
+        n_null=n_null,
+        value_counts=dict(value_counts),
+        type_fingerprint=frozenset(type(x).__name__ for x in value_counts),
+        sample=sample,
+        sample_n_null=sum([1 if x is None else 0 for x in sample]),
+        sample_distinct=sample_distinct,
+    )
+    profile.nbytes = estimate_nbytes(profile)
+    return profile
+
+
+def summary_sample(
+    summary: ColumnSummary, n_samples: int, rng: random.Random | None = None
+) -> list:
+    """Returns a random sample of (at most) `n_samples` rows of a summarised column
+    (a random selection of the reservoir sample, if it holds more rows)"""
+    if len(summary.sample) > n_samples:
+        return (rng or random).sample(summary.sample, k=n_samples)
+    if len(summary.sample) < min(summary.n_rows, n_samples):
+        raise ValueError(
+            f"The column summary holds a sample of {len(summary.sample)} rows, but"
+            f" n_samples={n_samples} were requested (summarise the table again with"
+            f" n_samples >= {n_samples})"
+        )
+    return list(summary.sample)
+
+
+def profile_column_summary(
+    summary: ColumnSummary, n_samples: int, rng: random.Random | None = None
+) -> ColumnProfile:
+    """Computes the ColumnProfile of a column from its ColumnSummary (see
+    src.transform_data.summarise_jsonl()), without reading the column itself"""
+    sample = summary_sample(summary, n_samples, rng)
+    profile = ColumnProfile(
+        n_rows=summary.n_rows,
+        n_null=summary.n_null,
+        value_counts=summary.value_counts,
+        type_fingerprint=frozenset(summary.value_types),
+        sample=sample,
+        sample_n_null=sum([1 if x is None else 0 for x in sample]),
+        sample_distinct=tuple(dict.fromkeys(x for x in sample if x is not None)),
+    )
+    profile.nbytes = estimate_nbytes(profile)
+    return profile
+
+
+def count_matches(
+    sample_profile: ColumnProfile, lookup_profile: ColumnProfile
+) -> tuple[int, int]:
+    """Counts how many of the distinct (non-null) sampled values appear in the
+    lookup column at least once, and how many appear in it exactly once
+
+    Returns:
+        tuple: (n_in_sample_have_any_matches, n_in_sample_have_exactly_1_match)
+    """
+    lookup_value_counts = lookup_profile.value_counts
+    n_in_sample_have_any_matches: int = 0
+    n_in_sample_have_exactly_1_match: int = 0
+    for val in sample_profile.sample_distinct:
+        n_matches = lookup_value_counts.get(val, 0)
+        if n_matches > 0:
+            n_in_sample_have_any_matches += 1
+            if n_matches == 1:
+                n_in_sample_have_exactly_1_match += 1
+    return n_in_sample_have_any_matches, n_in_sample_have_exactly_1_match
+
+
+def _source_ref(values: Sequence) -> Callable[[], object]:
+    """Returns a weak reference to the column object if its type supports weak
+    references (e.g. numpy arrays), and otherwise a strong reference (e.g. lists)"""
+    try:
+        return weakref.ref(values)
+    except TypeError:
+        return lambda: values
+
+
+class ColumnProfileCache:
+    """Least-recently-used cache of ColumnProfile objects, keyed by
+    (table name, column name)
+
+    Notes:
+        - engine="python" computes ColumnProfile objects (python dicts of values),
+            engine="numpy" computes dictionary-encoded EncodedColumnProfile objects
+            (see src.discover.encoded_columns), using a single value encoder
+            shared by every column in the cache
+        - The estimated memory footprint of the cached profiles is kept below
+            `max_bytes` by evicting the least recently used profiles
+        - A cached profile is only reused if it was computed from the same
+            column object (i.e. the same list of values) with the same number
+            of rows, so that the cache can safely be shared across multiple
+            calls to src.discover.join_keys.join_keys(). The cache keeps a
+            reference to the column object of each cached profile (a weak
+            reference, where the type of the column object allows it), so that
+            the identity check cannot be fooled by a new column object which
+            reuses the memory address of a freed one
+        - If `random_seed` is provided, the sample of each column is drawn using a
+            random number generator seeded by (random_seed, table name, column
+            name), so that samples are reproducible (including across processes)
+        - Columns may also be given as a ColumnSummary (see
+            src.transform_data.summarise_jsonl()), whose profile is built from the
+            summary's value counts and reservoir sample
+
+    Example:
+        >>> cache = ColumnProfileCache(n_samples=500, max_bytes=2 * 1024**3)
+        >>> profile = cache.get("users_table", "id", [1, 2, 3, None])
+        >>> profile.n_null
+        1
+    """
+
+    def __init__(
+        self,
+        n_samples: int = 500,
+        max_bytes: int = 1024**3,
+        engine: str = "python",
+        random_seed: int | None = None,
+    ) -> None:
+        self.n_samples = n_samples
+        self.max_bytes = max_bytes
+        self.engine = engine
+        self.random_seed = random_seed
+        self.profile_func: Callable
+        self.summary_profile_func: Callable
+        self.count_matches_func: Callable
+        if engine == "python":
+            self.profile_func = profile_column
+            self.summary_profile_func = profile_column_summary
+            self.count_matches_func = count_matches
+        elif engine == "numpy":
+            from .encoded_columns import (
+                ValueEncoder,
+                count_encoded_matches,
+                profile_encoded_column,
+                profile_encoded_column_summary,
+            )
+
+            self.encoder = ValueEncoder()
+            self.profile_func = functools.partial(
+                profile_encoded_column, encoder=self.encoder
+            )
+            self.summary_profile_func = functools.partial(
+                profile_encoded_column_summary, encoder=self.encoder
+            )
+            self.count_matches_func = count_encoded_matches
+        else:
+            raise ValueError(
+                f"Unknown engine '{engine}' (expected 'python' or 'numpy')"
+            )
+        self.nbytes: int = 0
+        self.n_hits: int = 0
+        self.n_misses: int = 0
+        self._profiles: OrderedDict[
+            tuple[str, str], tuple[Callable[[], object], ColumnProfile]
+        ] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def get(self, table_name: str, column_name: str, values: Sequence):
+        """Returns the profile of the column, computing it if it is not cached"""
+        key = (table_name, column_name)
+        if key in self._profiles:
+            source_ref, profile = self._profiles[key]
+            if source_ref() is values and profile.n_rows == len(values):
+                self._profiles.move_to_end(key)
+                self.n_hits += 1
+                return profile
+            self._evict(key)
+
+        self.n_misses += 1
+        start_time: float | None = time.perf_counter() if hooks_active() else None
+        profile_func: Callable = (
+            self.summary_profile_func
+            if isinstance(values, ColumnSummary)
+            else self.profile_func
+        )
+        profile = profile_func(
+            values,
+            n_samples=self.n_samples,
+            rng=(
+                None
+                if self.random_seed is None
+                else random.Random(f"{self.random_seed}:{table_name}:{column_name}")
+            ),
+        )
+        if start_time is not None:
+            emit("count", name="values_profiled", value=len(values))
+            emit(
+                "column_profiled",
+                column=[table_name, column_name],
+                seconds=time.perf_counter() - start_time,
+                n_values=len(values),
+            )
+        self._profiles[key] = (_source_ref(values), profile)
+        self.nbytes += profile.nbytes
+        while self.nbytes > self.max_bytes and len(self._profiles) > 1:
+            self._evict(next(iter(self._profiles)))
+        return profile
+
+    def discard(self, table_name: str, column_name: str) -> None:
+        """Removes the profile of the column from the cache (if it is cached)"""
+        if (table_name, column_name) in self._profiles:
+            self._evict((table_name, column_name))
+
+    def clear(self) -> None:
+        self._profiles.clear()
+        self.nbytes = 0
+
+    def _evict(self, key: tuple[str, str]) -> None:
+        _, profile = self._profiles.pop(key)
+        self.nbytes -= profile.nbytes
@@ -0,0 +1,393 @@
+"""
+Defines function src.discover.composite_keys.composite_join_keys()
+"""
+
+import datetime
+import itertools
+import logging
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Sequence
+
+from src.instrumentation import emit, instrument_stage
+
+from .column_profile import ColumnProfileCache
+from .hashing import splitmix64, stable_hash64
+from .join_keys import only_allowed_types, score_column_pair
+from .result_writers import RESULT_WRITERS
+
+logger = logging.getLogger(__name__)
+
+
+def composite_column_name(column_names: Sequence[str]) -> str:
+    """The name under which a tuple of columns appears in a match record
+
+    Example:
+        >>> composite_column_name(("branch_id", "account_no"))
+        '(branch_id, account_no)'
+    """
+    return f"({', '.join(column_names)})"
+
+
+def hash_column_tuple(columns: Sequence[Sequence]) -> list[int | None]:
+    """Hashes each row of a tuple of columns into a single 64-bit integer key
+    (None if any of the row's values is None)
+
+    Notes:
+        - Each value is hashed with src.discover.hashing.stable_hash64(), so that
+            rows with equal values (in the same column order) get equal keys in
+            every table. Hash collisions between different rows are negligible
+            (the chance of any collision among 1 billion distinct rows is ~3%)
+    """
+    keys: list[int | None] = []
+    for row in zip(*columns):
+        if any(value is None for value in row):
+            keys.append(None)
+            continue
+        key: int = 0
+        for value in row:
+            key = splitmix64(key ^ stable_hash64(value))
+        keys.append(key)
+    return keys
+
+
+@dataclass
+class CompositeCandidate:
+    """A (sample column tuple, lookup column tuple) to compare, with the lookup
+    columns in the order in which they are aligned with the sample columns"""
+
+    sample_tbl_name: str
+    sample_colnames: tuple[str, ...]
+    lookup_tbl_name: str
+    lookup_colnames: tuple[str, ...]
+    priority: float
+    order: int
+
+
+@instrument_stage("discover.composite_join_keys")
+def composite_join_keys(
+    tbl_contents: dict[str, dict],
+    output_path: str = "output/discover/composite_join_keys.json",
+    max_key_columns: int = 2,
+    n_samples: int = 500,
+    allowed_key_types: tuple[type] = (int, str),
+    cost_budget: int = 100_000_000,
+    max_column_unique_ratio: float = 0.95,
+    max_column_null_ratio: float = 0.5,
+    min_key_n_unique: int = 5,
+    random_seed: int | None = None,
+    output_format: str = "json",
+    profile_cache: ColumnProfileCache | None = None,
+) -> dict:
+    """Discovers candidate composite (multi-column) join keys e.g. a
+    (branch_id, account_no) pair in one table matching a (branch, account_number)
+    pair in another, which src.discover.join_keys.join_keys() (only comparing
+    single columns) cannot find
+
+    Notes:
+        - Each row of a tuple of columns is hashed into a single integer key (see
+            hash_column_tuple()), and the hashed key columns are then compared
+            exactly as join_keys() compares single columns, producing the same
+            match records (so that src.decision.join_keys() can be used on the
+            output). The column name of a tuple is e.g. "(branch_id, account_no)",
+            and each record also contains the individual column names under
+            "composite_key"
+        - The number of column tuples grows combinatorially, so candidates are
+            pruned using the statistics of the individual columns (which are
+            profiled exactly as join_keys() profiles them):
+            1. Columns which are (almost) unique on their own are left out, since
+                a single-column key already identifies their rows, as are columns
+                which are mostly null or have a single distinct value
+            2. Column tuples which can have at most `min_key_n_unique` distinct
+                values (the product of the numbers of distinct values of their
+                columns) are left out
+            3. A sample tuple is only compared to a lookup tuple if every pair
+                of aligned columns has some matching values (a sampled tuple
+                value can only match if each of its values does)
+        - The remaining candidates are compared in order of the weakest match rate
+            of their aligned column pairs (strongest first), until `cost_budget`
+            is used up. The cost is counted in values processed: rows profiled
+            or hashed, plus sampled values looked up. Candidates which do not fit
+            in the budget are counted in the returned report
+        - Tables are only compared to other tables (not to themselves)
+
+    Args:
+        tbl_contents (dict): The contents of each table (as for join_keys())
+        output_path (str): Local path on filesystem to which the output will be written
+        max_key_columns (int): Largest number of columns in a composite key
+        n_samples (int): As for join_keys()
+        allowed_key_types (tuple): As for join_keys()
+        cost_budget (int): Maximum number of values to process (see Notes)
+        max_column_unique_ratio (float): Columns with a higher n_unique/n_rows are
+                        not used in composite keys
+        max_column_null_ratio (float): Columns with a higher percentage of null
+                        values are not used in composite keys
+        min_key_n_unique (int): Column tuples which cannot have more than this
+                        number of distinct values are not considered
+        random_seed (int): As for join_keys()
+        output_format (str): As for join_keys()
+        profile_cache (ColumnProfileCache): (optional) As for join_keys() e.g. the
+                        cache used by a previous join_keys() call, to reuse its
+                        profiles of the individual columns
+
+    Returns:
+        dict: report of the number of candidates pruned, compared and left out due
+                to the cost budget (output is written to `output_path`)
+
+    Example:
+        >>> src.discover.composite_keys.composite_join_keys(
+        ...     tbl_contents=table_data,
+        ...     output_path="output/discover/composite_join_keys/all_matches.json",
+        ...     max_key_columns=2,
+        ...     cost_budget=500_000_000,
+        ...     random_seed=42,
+        ... )
+    """
+    if output_format not in RESULT_WRITERS:
+        raise ValueError(
+            f"Unknown output_format '{output_format}'"
+            f" (expected one of {list(RESULT_WRITERS)})"
+        )
+    if max_key_columns < 2:
+        raise ValueError(f"max_key_columns={max_key_columns} must be at least 2")
+    if profile_cache is None:
+        profile_cache = ColumnProfileCache(n_samples=n_samples, random_seed=random_seed)
+    elif (profile_cache.n_samples, profile_cache.random_seed) != (
+        n_samples,
+        random_seed,
+    ):
+        raise ValueError(
+            f"profile_cache was built with n_samples={profile_cache.n_samples},"
+            f" random_seed={profile_cache.random_seed} (expected"
+            f" n_samples={n_samples}, random_seed={random_seed})"
+        )
+
+    report: dict = {
+        "n_columns": 0,
+        "n_columns_eligible": 0,
+        "n_tuples": 0,
+        "n_tuples_pruned": 0,
+        "n_candidates_pruned": 0,
+        "n_candidates": 0,
+        "n_candidates_compared": 0,
+        "n_candidates_over_budget": 0,
+        "n_table_pairs_over_budget": 0,
+        "cost_used": 0,
+        "cost_budget": cost_budget,
+    }
+    profiled_columns: set[tuple[str, str]] = set()
+
+    def get_profile(tbl_name: str, col_name: str):
+        if (tbl_name, col_name) not in profiled_columns:
+            report["cost_used"] += len(tbl_contents[tbl_name][col_name])
+            profiled_columns.add((tbl_name, col_name))
+        return profile_cache.get(tbl_name, col_name, tbl_contents[tbl_name][col_name])
+
+    # 1. eligible columns and column tuples of each table #
+    table_columns: dict[str, list[str]] = {}
+    table_tuples: dict[str, list[tuple[str, ...]]] = {}
+    for tbl_name, cols in tbl_contents.items():
+        eligible_colnames: list[str] = []
+        n_distinct: dict[str, int] = {}
+        for col_name, col_values in cols.items():
+            if not only_allowed_types(
+                values=col_values, sample_size=50, allowed_types=allowed_key_types
+            ):
+                continue
+            report["n_columns"] += 1
+            profile = get_profile(tbl_name, col_name)
+            n_distinct[col_name] = profile.n_unique - (1 if profile.n_null > 0 else 0)
+            if (
+                profile.n_rows > 0
+                and profile.n_unique / profile.n_rows <= max_column_unique_ratio
+                and profile.n_null / profile.n_rows <= max_column_null_ratio
+                and n_distinct[col_name] > 1
+            ):
+                eligible_colnames.append(col_name)
+        report["n_columns_eligible"] += len(eligible_colnames)
+        table_tuples[tbl_name] = []
+        for n_key_columns in range(2, max_key_columns + 1):
+            for colnames in itertools.combinations(eligible_colnames, n_key_columns):
+                report["n_tuples"] += 1
+                max_n_unique: int = min(
+                    len(cols[colnames[0]]),
+                    math.prod(n_distinct[col_name] for col_name in colnames),
+                )
+                if max_n_unique <= min_key_n_unique:
+                    report["n_tuples_pruned"] += 1
+                    continue
+                table_tuples[tbl_name].append(colnames)
+        table_columns[tbl_name] = sorted(
+            {col_name for colnames in table_tuples[tbl_name] for col_name in colnames},
+            key=eligible_colnames.index,
+        )
+
+    # 2. candidate (sample tuple, aligned lookup tuple) pairs: each sampled column
+    # is only aligned with the lookup columns containing some of its values #
+    candidates: list[CompositeCandidate] = []
+    n_table_pairs_over_budget: int = 0
+    for sample_tbl_name, lookup_tbl_name in itertools.permutations(
+        (tbl_name for tbl_name in table_tuples if len(table_tuples[tbl_name]) > 0),
+        r=2,
+    ):
+        if report["cost_used"] >= cost_budget:
+            n_table_pairs_over_budget += 1
+            continue
+        matching_columns: dict[str, list[tuple[str, float]]] = {}
+        for sample_colname in table_columns[sample_tbl_name]:
+            sample_profile = get_profile(sample_tbl_name, sample_colname)
+            matching_columns[sample_colname] = []
+            for lookup_colname in table_columns[lookup_tbl_name]:
+                n_any_matches, _ = profile_cache.count_matches_func(
+                    sample_profile, get_profile(lookup_tbl_name, lookup_colname)
+                )
+                report["cost_used"] += sample_profile.sample_n_unique
+                if n_any_matches > 0:
+                    matching_columns[sample_colname].append(
+                        (lookup_colname, n_any_matches / sample_profile.sample_n_unique)
+                    )
+        lookup_tuples: set[frozenset[str]] = {
+            frozenset(colnames) for colnames in table_tuples[lookup_tbl_name]
+        }
+        n_lookup_tuples: Counter = Counter(
+            len(colnames) for colnames in table_tuples[lookup_tbl_name]
+        )
+        for sample_colnames in table_tuples[sample_tbl_name]:
+            n_aligned: int = 0
+            for aligned in itertools.product(
+                *(matching_columns[col_name] for col_name in sample_colnames)
+            ):
+                lookup_colnames = tuple(col_name for col_name, _ in aligned)
+                if frozenset(lookup_colnames) not in lookup_tuples or len(
+                    set(lookup_colnames)
+                ) < len(lookup_colnames):
+                    continue
+                n_aligned += 1
+                candidates.append(
+                    CompositeCandidate(
+                        sample_tbl_name=sample_tbl_name,
+                        sample_colnames=sample_colnames,
+                        lookup_tbl_name=lookup_tbl_name,
+                        lookup_colnames=lookup_colnames,
+                        priority=min(match_rate for _, match_rate in aligned),
+                        order=len(candidates),
+                    )
+                )
+            report["n_candidates_pruned"] += (
+                n_lookup_tuples[len(sample_colnames)]
+                * math.factorial(len(sample_colnames))
+                - n_aligned
+            )
+    report["n_candidates"] = len(candidates)
+    report["n_table_pairs_over_budget"] = n_table_pairs_over_budget
+
+    # 3. choose the candidates to compare, strongest first, within the budget #
+    hashed_tuples: set[tuple[str, tuple[str, ...]]] = set()
+
+    def hashing_cost(tbl_name: str, colnames: tuple[str, ...]) -> int:
+        if (tbl_name, colnames) in hashed_tuples:
+            return 0
+        return len(tbl_contents[tbl_name][colnames[0]]) * len(colnames)
+
+    selected: list[CompositeCandidate] = []
+    for candidate in sorted(candidates, key=lambda c: (-c.priority, c.order)):
+        sample_n_rows: int = len(
+            tbl_contents[candidate.sample_tbl_name][candidate.sample_colnames[0]]
+        )
+        cost: int = (
+            hashing_cost(candidate.sample_tbl_name, candidate.sample_colnames)
+            + hashing_cost(candidate.lookup_tbl_name, candidate.lookup_colnames)
+            + min(n_samples, sample_n_rows)
+        )
+        if report["cost_used"] + cost > cost_budget:
+            report["n_candidates_over_budget"] += 1
+            continue
+        report["cost_used"] += cost
+        hashed_tuples.add((candidate.sample_tbl_name, candidate.sample_colnames))
+        hashed_tuples.add((candidate.lookup_tbl_name, candidate.lookup_colnames))
+        selected.append(candidate)
+    selected.sort(key=lambda c: c.order)
+    if report["n_candidates_over_budget"] > 0 or n_table_pairs_over_budget > 0:
+        logger.warning(
+            "%s of %s composite key candidates (and %s table pairs) were left out to"
+            " stay within cost_budget=%s",
+            f"{report['n_candidates_over_budget']:,}",
+            f"{len(candidates):,}",
+            f"{n_table_pairs_over_budget:,}",
+            f"{cost_budget:,}",
+        )
+
+    # 4. compare the hashed keys of the chosen candidates (each hashed key column
+    # is kept only until the last candidate which uses it) #
+    hashed_keys: dict[tuple[str, tuple[str, ...]], list[int | None]] = {}
+    last_use: dict[tuple[str, tuple[str, ...]], int] = {}
+    for candidate_idx, candidate in enumerate(selected):
+        last_use[(candidate.sample_tbl_name, candidate.sample_colnames)] = candidate_idx
+        last_use[(candidate.lookup_tbl_name, candidate.lookup_colnames)] = candidate_idx
+
+    def get_hashed_keys(tbl_name: str, colnames: tuple[str, ...]) -> list:
+        key = (tbl_name, colnames)
+        if key not in hashed_keys:
+            hashed_keys[key] = hash_column_tuple(
+                [tbl_contents[tbl_name][col_name] for col_name in colnames]
+            )
+        return hashed_keys[key]
+
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        result_writer = RESULT_WRITERS[output_format](output_file)
+        for candidate_idx, candidate in enumerate(selected, start=1):
+            sample_name = composite_column_name(candidate.sample_colnames)
+            lookup_name = composite_column_name(candidate.lookup_colnames)
+            match_pair = score_column_pair(
+                sample_tbl_name=candidate.sample_tbl_name,
+                sample_colname=sample_name,
+                sample_profile=profile_cache.get(
+                    candidate.sample_tbl_name,
+                    sample_name,
+                    get_hashed_keys(
+                        candidate.sample_tbl_name, candidate.sample_colnames
+                    ),
+                ),
+                lookup_tbl_name=candidate.lookup_tbl_name,
+                lookup_colname=lookup_name,
+                lookup_profile=profile_cache.get(
+                    candidate.lookup_tbl_name,
+                    lookup_name,
+                    get_hashed_keys(
+                        candidate.lookup_tbl_name, candidate.lookup_colnames
+                    ),
+                ),
+                count_matches_func=profile_cache.count_matches_func,
+            )
+            match_pair["composite_key"] = {
+                "sampled_columns": list(candidate.sample_colnames),
+                "lookup_columns": list(candidate.lookup_colnames),
+            }
+            result_writer.write(match_pair)
+            report["n_candidates_compared"] += 1
+            for key in (
+                (candidate.sample_tbl_name, candidate.sample_colnames),
+                (candidate.lookup_tbl_name, candidate.lookup_colnames),
+            ):
+                if last_use[key] == candidate_idx - 1:
+                    del hashed_keys[key]
+                    # the cache holds a reference to the hashed keys #
+                    profile_cache.discard(key[0], composite_column_name(key[1]))
+            emit(
+                "progress",
+                stage="discover.composite_join_keys",
+                n_done=candidate_idx,
+                n_total=len(selected),
+                unit="column tuple pairs",
+            )
+        result_writer.close()
+    emit("count", name="column_pairs_written", value=report["n_candidates_compared"])
+
+    print(
+        f"{datetime.datetime.now().strftime('%H:%M:%S')} Compared"
+        f" {report['n_candidates_compared']:,} composite key candidates"
+        f" (cost {report['cost_used']:,} of {cost_budget:,})"
+    )
+    logger.info("Composite join keys: %s", report)
+    return report
@@ -0,0 +1,195 @@
+"""
+Dictionary-encoded (NumPy) column profiles, used by the "numpy" engine of
+src.discover.join_keys.join_keys()
+"""
+
+import dataclasses
+import random
+from dataclasses import dataclass, field
+from typing import Sequence
+
+import numpy as np  # pip install numpy
+
+from src.transform_data.summarise_jsonl import ColumnSummary
+
+from .column_profile import summary_sample
+
+
+class ValueEncoder:
+    """Maps every distinct value in the database to an integer code
+
+    Notes:
+        - A single encoder is shared by every column, so that equal values in
+            different columns (and tables) are given the same code
+        - Values are compared using python equality (exactly as in the "python"
+            engine), so that e.g. "3" and 3 get different codes
+        - None is always encoded as -1
+    """
+
+    def __init__(self) -> None:
+        self.codes: dict = {}
+        self.values: list = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, values: Sequence) -> np.ndarray:
+        codes = self.codes
+        decoded = self.values
+
+        def get_code(value) -> int:
+            if value is None:
+                return -1
+            code = codes.get(value)
+            if code is None:
+                code = len(decoded)
+                codes[value] = code
+                decoded.append(value)
+            return code
+
+        return np.fromiter(
+            (get_code(value) for value in values), dtype=np.int64, count=len(values)
+        )
+
+    def decode(self, codes: np.ndarray) -> list:
+        return [self.values[code] for code in codes]
+
+
+@dataclass
+class EncodedColumnProfile:
+    """Summary statistics of a single dictionary-encoded column
+
+    Attributes:
+        n_rows (int): Number of rows in the column
+        n_null (int): Number of None values in the column
+        unique_codes (np.ndarray): Sorted distinct (non-null) codes in the column
+        code_counts (np.ndarray): Number of times that each of `unique_codes`
+                                    appears in the column
+        sample_n_rows (int): Number of rows in the random sample of the column
+        sample_n_null (int): Number of None values in the sample
+        sample_codes (np.ndarray): Sorted distinct (non-null) codes in the sample
+    """
+
+    n_rows: int
+    n_null: int
+    unique_codes: np.ndarray
+    code_counts: np.ndarray
+    sample_n_rows: int
+    sample_n_null: int
+    sample_codes: np.ndarray
+    nbytes: int = field(default=0, repr=False)
+
+    @property
+    def n_unique(self) -> int:
+        """Number of distinct values in the column (None counts as a value)"""
+        return len(self.unique_codes) + (1 if self.n_null > 0 else 0)
+
+    @property
+    def sample_n_unique(self) -> int:
+        """Number of distinct non-null values in the sample"""
+        return len(self.sample_codes)
+
+    def sample_subset(self, indices: list[int]) -> "EncodedColumnProfile":
+        """Returns a copy of the profile whose distinct sampled codes are only
+        those at `indices` (used for scoring a sample in batches)"""
+        return dataclasses.replace(
+            self, sample_codes=np.sort(self.sample_codes[np.asarray(indices, dtype=np.int64)])
+        )
+
+
+def profile_encoded_column(
+    values: Sequence,
+    n_samples: int,
+    encoder: ValueEncoder,
+    rng: random.Random | None = None,
+) -> EncodedColumnProfile:
+    """Dictionary-encodes a column and computes its EncodedColumnProfile
+
+    Args:
+        values (list): The column contents
+        n_samples (int): Where the column has more than `n_samples` rows, only a
+                        random selection of `n_samples` rows is kept as the sample
+        encoder (ValueEncoder): The (database-wide) value encoder
+        rng (random.Random): (optional) random number generator used to draw the
+                        sample (the global `random` module is used if omitted)
+
+    Returns:
+        EncodedColumnProfile: the column statistics
+    """
+    codes = encoder.encode(values)
+    is_null = codes < 0
+    unique_codes, code_counts = np.unique(codes[~is_null], return_counts=True)
+    if len(codes) > n_samples:
+        sample = codes[(rng or random).sample(range(len(codes)), k=n_samples)]
+    else:
+        sample = codes
+    sample_is_null = sample < 0
+    profile = EncodedColumnProfile(
+        n_rows=len(codes),
+        n_null=int(is_null.sum()),
+        unique_codes=unique_codes,
+        code_counts=code_counts,
+        sample_n_rows=len(sample),
+        sample_n_null=int(sample_is_null.sum()),
+        sample_codes=np.unique(sample[~sample_is_null]),
+    )
+    profile.nbytes = (
+        profile.unique_codes.nbytes
+        + profile.code_counts.nbytes
+        + profile.sample_codes.nbytes
+    )
+    return profile
+
+
+def profile_encoded_column_summary(
+    summary: ColumnSummary,
+    n_samples: int,
+    encoder: ValueEncoder,
+    rng: random.Random | None = None,
+) -> EncodedColumnProfile:
+    """Computes the EncodedColumnProfile of a column from its ColumnSummary (see
+    src.transform_data.summarise_jsonl()), without reading the column itself"""
+    unique_codes = encoder.encode(list(summary.value_counts))
+    code_counts = np.fromiter(
+        summary.value_counts.values(), dtype=np.int64, count=len(summary.value_counts)
+    )
+    code_order = np.argsort(unique_codes)
+    sample = encoder.encode(summary_sample(summary, n_samples, rng))
+    sample_is_null = sample < 0
+    profile = EncodedColumnProfile(
+        n_rows=summary.n_rows,
+        n_null=summary.n_null,
+        unique_codes=unique_codes[code_order],
+        code_counts=code_counts[code_order],
+        sample_n_rows=len(sample),
+        sample_n_null=int(sample_is_null.sum()),
+        sample_codes=np.unique(sample[~sample_is_null]),
+    )
+    profile.nbytes = (
+        profile.unique_codes.nbytes
+        + profile.code_counts.nbytes
+        + profile.sample_codes.nbytes
+    )
+    return profile
+
+
+def count_encoded_matches(
+    sample_profile: EncodedColumnProfile, lookup_profile: EncodedColumnProfile
+) -> tuple[int, int]:
+    """Counts how many of the distinct (non-null) sampled codes appear in the
+    lookup column at least once, and how many appear in it exactly once
+
+    Returns:
+        tuple: (n_in_sample_have_any_matches, n_in_sample_have_exactly_1_match)
+    """
+    lookup_codes = lookup_profile.unique_codes
+    if len(lookup_codes) == 0 or len(sample_profile.sample_codes) == 0:
+        return 0, 0
+    is_match = np.isin(
+        sample_profile.sample_codes, lookup_codes, assume_unique=True
+    )
+    matched_codes = sample_profile.sample_codes[is_match]
+    matched_counts = lookup_profile.code_counts[
+        np.searchsorted(lookup_codes, matched_codes)
+    ]
+    return int(is_match.sum()), int(np.count_nonzero(matched_counts == 1))
@@ -0,0 +1,46 @@
+"""
+Defines function src.discover.hashing.stable_hash64()
+"""
+
+import hashlib
+
+MASK64: int = 2**64 - 1
+
+
+def splitmix64(x: int) -> int:
+    """Scrambles a 64-bit integer (the finaliser of the SplitMix64 generator)"""
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def stable_hash64(value) -> int:
+    """Hashes a column value to a 64-bit integer which is the same in every python
+    process (unlike the builtin hash(), which is randomised for strings)
+
+    Notes:
+        - Values which are equal in python are given the same hash
+            (e.g. 1 == 1.0 == True), matching the exact-equality comparison
+            used by src.discover.join_keys.join_keys(). In particular "3" and 3
+            get different hashes
+
+    Example:
+        >>> stable_hash64(1) == stable_hash64(1.0) == stable_hash64(True)
+        True
+        >>> stable_hash64("1") == stable_hash64(1)
+        False
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int):
+        if -(2**63) <= value < 2**63:
+            return splitmix64(int(value) & MASK64)
+        value_bytes = b"i" + str(int(value)).encode("ascii")
+    elif isinstance(value, str):
+        value_bytes = b"s" + value.encode("utf-8", "surrogatepass")
+    else:
+        value_bytes = b"r" + repr(value).encode("utf-8", "surrogatepass")
+    return int.from_bytes(
+        hashlib.blake2b(value_bytes, digest_size=8).digest(), "little"
+    )
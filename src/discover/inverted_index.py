@@ -0,0 +1,261 @@
+"""
+Defines class src.discover.inverted_index.InvertedValueIndex, used by the
+inverted index mode of src.discover.join_keys.join_keys()
+"""
+
+import logging
+import pathlib
+import pickle
+import random
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterator, Sequence
+
+from src.instrumentation import emit
+from src.transform_data.summarise_jsonl import ColumnSummary
+
+from .column_profile import draw_sample, summary_sample
+from .join_keys import match_record
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ColumnStats:
+    """The column statistics which appear in a match record (the inverted index
+    mode does not keep a full profile of each column)"""
+
+    n_rows: int
+    n_null: int
+    n_unique: int
+    sample_n_rows: int
+    sample_n_null: int
+    sample_n_unique: int
+
+
+class InvertedValueIndex:
+    """Database-wide inverted index from each value to the (column, count) of
+    every column containing it, from which the match counts of every column pair
+    are accumulated in one pass (instead of comparing every column pair)
+
+    Notes:
+        - Every (allowed-type) column is scanned once. First, the sample of each
+            column is drawn (exactly as src.discover.join_keys() draws it), giving
+            an index of sampled values → the columns whose sample contains them.
+            Then the values of each column are counted, and a posting (value,
+            column, count) is added to the index for every value which is in some
+            sample (no other value can contribute to a match)
+        - The match counts are accumulated value by value: a sampled value of
+            column A which appears in column B counts as a match of the pair
+            (A, B), and as an "exactly 1" match if it appears once. Column pairs
+            with no shared values are never touched
+        - Postings are hash-partitioned by value into `n_partitions` partitions.
+            Once more than `max_buffered_postings` postings are held in memory,
+            they are spilled to one file per partition (in a temporary directory),
+            and the partitions are then accumulated one at a time, so that only
+            one partition of the index is in memory at once
+        - The output is identical to the default (pairwise) mode
+        - `report` describes the size of the index after join_keys() has run
+
+    Example:
+        >>> index = src.discover.inverted_index.InvertedValueIndex(
+        ...     n_partitions=64, max_buffered_postings=5_000_000
+        ... )
+        >>> src.discover.join_keys(tbl_contents=table_data, inverted_index=index)
+        >>> index.report
+    """
+
+    def __init__(
+        self,
+        n_partitions: int = 16,
+        max_buffered_postings: int = 2_000_000,
+    ) -> None:
+        self.n_partitions = n_partitions
+        self.max_buffered_postings = max_buffered_postings
+        self.report: dict = {}
+        self._buffers: list[list[tuple]] = [[] for _ in range(n_partitions)]
+        self._n_buffered: int = 0
+        self._n_postings_spilled: int = 0
+        self._spill_paths: list[pathlib.Path] | None = None
+
+    def _add_posting(self, value, column_idx: int, count: int) -> None:
+        self._buffers[hash(value) % self.n_partitions].append(
+            (value, column_idx, count)
+        )
+        self._n_buffered += 1
+        if self._n_buffered >= self.max_buffered_postings:
+            self._spill()
+
+    def _spill(self) -> None:
+        """Appends the buffered postings of each partition to its spill file"""
+        for partition_idx, buffer in enumerate(self._buffers):
+            if len(buffer) > 0:
+                with open(self._spill_paths[partition_idx], "ab") as file:
+                    pickle.dump(buffer, file, protocol=pickle.HIGHEST_PROTOCOL)
+                self._buffers[partition_idx] = []
+        self._n_postings_spilled += self._n_buffered
+        self._n_buffered = 0
+
+    def _iter_partition(self, partition_idx: int) -> Iterator[tuple]:
+        """Iterates over the postings (spilled and buffered) of one partition"""
+        spill_path = self._spill_paths[partition_idx]
+        if spill_path.exists():
+            with open(spill_path, "rb") as file:
+                while True:
+                    try:
+                        yield from pickle.load(file)
+                    except EOFError:
+                        break
+            spill_path.unlink()
+        yield from self._buffers[partition_idx]
+        self._buffers[partition_idx] = []
+
+    def count_all_matches(
+        self,
+        columns: list[tuple[str, str, Sequence]],
+        n_samples: int,
+        random_seed: int | None,
+        temp_dir: str | pathlib.Path,
+    ) -> tuple[list[ColumnStats], dict[tuple[int, int], list[int]]]:
+        """Builds the index of `columns` and accumulates the match counts of every
+        column pair (of columns in different tables) with any shared values
+
+        Args:
+            columns (list): (table name, column name, values) of every column
+            n_samples (int): As for src.discover.join_keys()
+            random_seed (int): As for src.discover.join_keys()
+            temp_dir (str): Directory in which to create the spill directory
+
+        Returns:
+            tuple: (the ColumnStats of each column,
+                    {(sample column idx, lookup column idx): [n_in_sample_have_any_matches,
+                                                               n_in_sample_have_exactly_1_match]})
+        """
+        start_time: float = time.perf_counter()
+        self._buffers = [[] for _ in range(self.n_partitions)]
+        self._n_buffered = 0
+        self._n_postings_spilled = 0
+        column_stats: list[ColumnStats] = []
+        # sampled value → indices of the columns whose sample contains it #
+        sampled_value_columns: dict = {}
+        for column_idx, (tbl_name, col_name, values) in enumerate(columns):
+            rng = (
+                None
+                if random_seed is None
+                else random.Random(f"{random_seed}:{tbl_name}:{col_name}")
+            )
+            if isinstance(values, ColumnSummary):
+                sample = summary_sample(values, n_samples, rng)
+            else:
+                sample = draw_sample(values, n_samples, rng)
+            sample_distinct = dict.fromkeys(x for x in sample if x is not None)
+            for value in sample_distinct:
+                sampled_value_columns.setdefault(value, []).append(column_idx)
+            column_stats.append(
+                ColumnStats(
+                    n_rows=len(values),
+                    n_null=0,
+                    n_unique=0,
+                    sample_n_rows=len(sample),
+                    sample_n_null=sum([1 if x is None else 0 for x in sample]),
+                    sample_n_unique=len(sample_distinct),
+                )
+            )
+
+        table_names: list[str] = [tbl_name for tbl_name, _, _ in columns]
+        pair_counts: dict[tuple[int, int], list[int]] = {}
+        n_postings: int = 0
+        with tempfile.TemporaryDirectory(dir=temp_dir) as spill_dir:
+            self._spill_paths = [
+                pathlib.Path(spill_dir) / f"p{partition_idx}.pickle"
+                for partition_idx in range(self.n_partitions)
+            ]
+            for column_idx, (_, _, values) in enumerate(columns):
+                if isinstance(values, ColumnSummary):
+                    value_counts, n_null = values.value_counts, values.n_null
+                else:
+                    value_counts = Counter(values)
+                    n_null = value_counts.pop(None, 0)
+                column_stats[column_idx].n_null = n_null
+                column_stats[column_idx].n_unique = len(value_counts) + (
+                    1 if n_null > 0 else 0
+                )
+                for value, count in value_counts.items():
+                    if value in sampled_value_columns:
+                        self._add_posting(value, column_idx, count)
+                        n_postings += 1
+                emit("count", name="values_indexed", value=len(values))
+
+            for partition_idx in range(self.n_partitions):
+                for value, lookup_idx, count in self._iter_partition(partition_idx):
+                    for sample_idx in sampled_value_columns[value]:
+                        if table_names[sample_idx] == table_names[lookup_idx]:
+                            continue
+                        counts = pair_counts.get((sample_idx, lookup_idx))
+                        if counts is None:
+                            counts = pair_counts[(sample_idx, lookup_idx)] = [0, 0]
+                        counts[0] += 1
+                        if count == 1:
+                            counts[1] += 1
+            self._n_buffered = 0
+            self._spill_paths = None
+
+        self.report = {
+            "n_columns": len(columns),
+            "n_sampled_values": len(sampled_value_columns),
+            "n_postings": n_postings,
+            "n_postings_spilled": self._n_postings_spilled,
+            "n_column_pairs_touched": len(pair_counts),
+            "seconds": round(time.perf_counter() - start_time, 3),
+        }
+        logger.info("Inverted value index: %s", self.report)
+        return column_stats, pair_counts
+
+
+def iter_inverted_index_comparisons(
+    limit_keytypes: dict[str, dict],
+    comparison_pairs: list[tuple[str, str]],
+    inverted_index: InvertedValueIndex,
+    n_samples: int,
+    random_seed: int | None,
+    temp_dir: str | pathlib.Path,
+) -> Iterator[list[dict]]:
+    """Computes the match records of every (sample table, lookup table) in
+    `comparison_pairs` from an InvertedValueIndex
+
+    Yields:
+        list: the match records of each table pair, in the order of `comparison_pairs`
+    """
+    columns: list[tuple[str, str, Sequence]] = [
+        (tbl_name, col_name, col_values)
+        for tbl_name, cols in limit_keytypes.items()
+        for col_name, col_values in cols.items()
+    ]
+    column_idx: dict[tuple[str, str], int] = {
+        (tbl_name, col_name): idx for idx, (tbl_name, col_name, _) in enumerate(columns)
+    }
+    column_stats, pair_counts = inverted_index.count_all_matches(
+        columns, n_samples=n_samples, random_seed=random_seed, temp_dir=temp_dir
+    )
+    for sample_tbl_name, lookup_tbl_name in comparison_pairs:
+        results: list[dict] = []
+        for sample_colname in limit_keytypes[sample_tbl_name]:
+            sample_idx = column_idx[(sample_tbl_name, sample_colname)]
+            for lookup_colname in limit_keytypes[lookup_tbl_name]:
+                lookup_idx = column_idx[(lookup_tbl_name, lookup_colname)]
+                n_any, n_exactly_1 = pair_counts.get((sample_idx, lookup_idx), (0, 0))
+                results.append(
+                    match_record(
+                        sample_tbl_name=sample_tbl_name,
+                        sample_colname=sample_colname,
+                        sample_profile=column_stats[sample_idx],
+                        lookup_tbl_name=lookup_tbl_name,
+                        lookup_colname=lookup_colname,
+                        lookup_profile=column_stats[lookup_idx],
+                        n_in_sample_have_any_matches=n_any,
+                        n_in_sample_have_exactly_1_match=n_exactly_1,
+                    )
+                )
+        yield results
@@ -5,7 +5,23 @@ Defines function src.discover.join_keys.join_keys()
 import datetime
 import json
 import itertools
+import pathlib
 import random
+import time
+from typing import TYPE_CHECKING, Callable, Iterator
+
+from src.instrumentation import emit, hooks_active, instrument_stage
+
+from .checkpoint_store import CheckpointStore, column_fingerprint
+from .column_profile import ColumnProfile, ColumnProfileCache, count_matches
+from .result_writers import RESULT_WRITERS
+
+if TYPE_CHECKING:
+    from .adaptive_sampling import AdaptiveSampler
+    from .inverted_index import InvertedValueIndex
+    from .match_records import MatchRecords
+    from .prefilters import FingerprintPrefilter
+    from .sketch_pruning import SketchPruner
 
 
 def only_allowed_types(
@@ -14,7 +30,16 @@ def only_allowed_types(
     """Takes a random sample of values, and checks that each value in the
     random sample is of one of the allowed types.
     None values are ignored.
+
+    Notes:
+        - Columns which record the types of their values (e.g. columns loaded by
+            src.transform_data.load_columnar_tables()) are checked exactly, without
+            reading any of their values
     """
+    value_types = getattr(values, "value_types", None)
+    if value_types is not None:
+        allowed_type_names = {t.__name__ for t in allowed_types}
+        return all(type_name in allowed_type_names for type_name in value_types)
     for value in random.sample(values, k=min(sample_size, len(values))):
         if type(value) not in allowed_types:
             if value is not None:
@@ -22,12 +47,312 @@ def only_allowed_types(
     return True
 
 
+def match_record(
+    sample_tbl_name: str,
+    sample_colname: str,
+    sample_profile: ColumnProfile,
+    lookup_tbl_name: str,
+    lookup_colname: str,
+    lookup_profile: ColumnProfile,
+    n_in_sample_have_any_matches: int,
+    n_in_sample_have_exactly_1_match: int,
+    adaptive_sampling: dict | None = None,
+) -> dict:
+    """Builds the output record describing a single compared column pair
+    (this is the record format consumed by src.decision.join_keys.join_keys())
+
+    Args:
+        adaptive_sampling (dict): (optional) Description of how many of the sampled
+                        values were scored (see src.discover.adaptive_sampling).
+                        If provided, the match percentages are computed over the
+                        scored values only, and it is included in the record
+    """
+    sample_n_rows: int = sample_profile.sample_n_rows
+    sample_n_null: int = sample_profile.sample_n_null
+    sample_n_unique_vals: int = sample_profile.sample_n_unique
+    lookup_n_rows: int = lookup_profile.n_rows
+    lookup_n_null: int = lookup_profile.n_null
+    lookup_n_unique_vals: int = lookup_profile.n_unique
+    n_scored_vals: int = (
+        sample_n_unique_vals
+        if adaptive_sampling is None
+        else adaptive_sampling["n_values_scored"]
+    )
+    if n_scored_vals == 0:
+        percent_in_sample_have_any_matches = None
+        percent_in_sample_have_exactly_1_match = None
+    else:
+        percent_in_sample_have_any_matches = round(
+            n_in_sample_have_any_matches / n_scored_vals, 2
+        )
+        percent_in_sample_have_exactly_1_match = round(
+            n_in_sample_have_exactly_1_match / n_scored_vals, 2
+        )
+    record: dict = {
+        "sampled_col": {
+            "table_name": sample_tbl_name,
+            "column_name": sample_colname,
+            "sample_size": {
+                "n_rows": sample_n_rows,
+                "n_null": sample_n_null,
+                "percent_null": round(sample_n_null / sample_n_rows, 2),
+                "n_unique": sample_n_unique_vals,
+                "n_unique/n_rows": round(sample_n_unique_vals / sample_n_rows, 2),
+            },
+        },
+        "lookup_col": {
+            "table_name": lookup_tbl_name,
+            "column_name": lookup_colname,
+            "size": {
+                "n_rows": lookup_n_rows,
+                "n_null": lookup_n_null,
+                "percent_null": round(lookup_n_null / lookup_n_rows),
+                "n_unique": lookup_n_unique_vals,
+                "n_unique/n_rows": round(lookup_n_unique_vals / lookup_n_rows, 2),
+            },
+        },
+        "matches": {
+            "any_matches_in_lookup": {
+                "n": n_in_sample_have_any_matches,
+                "percent": percent_in_sample_have_any_matches,
+            },
+            "exactly_1_match_in_lookup": {
+                "n": n_in_sample_have_exactly_1_match,
+                "percent": percent_in_sample_have_exactly_1_match,
+            },
+        },
+    }
+    if adaptive_sampling is not None:
+        record["adaptive_sampling"] = adaptive_sampling
+    return record
+
+
+def score_column_pair(
+    sample_tbl_name: str,
+    sample_colname: str,
+    sample_profile: ColumnProfile,
+    lookup_tbl_name: str,
+    lookup_colname: str,
+    lookup_profile: ColumnProfile,
+    count_matches_func: Callable = count_matches,
+    adaptive_sampler: "AdaptiveSampler | None" = None,
+    rng: random.Random | None = None,
+) -> dict:
+    """Compares the sample of one column against the full contents of another
+    column, using only their (precomputed) profiles
+
+    Args:
+        adaptive_sampler (AdaptiveSampler): (optional) If provided, the sampled
+                        values are scored in batches (in an order drawn from `rng`)
+                        until the match rate is clearly above or below threshold
+    """
+    adaptive_sampling: dict | None = None
+    if adaptive_sampler is None:
+        n_in_sample_have_any_matches, n_in_sample_have_exactly_1_match = (
+            count_matches_func(sample_profile, lookup_profile)
+        )
+    else:
+        (
+            n_in_sample_have_any_matches,
+            n_in_sample_have_exactly_1_match,
+            adaptive_sampling,
+        ) = adaptive_sampler.count_matches(
+            sample_profile,
+            lookup_profile,
+            count_matches_func=count_matches_func,
+            rng=rng if rng is not None else random.Random(),
+        )
+    return match_record(
+        sample_tbl_name=sample_tbl_name,
+        sample_colname=sample_colname,
+        sample_profile=sample_profile,
+        lookup_tbl_name=lookup_tbl_name,
+        lookup_colname=lookup_colname,
+        lookup_profile=lookup_profile,
+        n_in_sample_have_any_matches=n_in_sample_have_any_matches,
+        n_in_sample_have_exactly_1_match=n_in_sample_have_exactly_1_match,
+        adaptive_sampling=adaptive_sampling,
+    )
+
+
+def make_pair_filter(
+    sketch_pruner: "SketchPruner | None",
+    skip_column_pairs: frozenset[tuple[str, str]],
+) -> Callable[[tuple[str, str], tuple[str, str]], bool] | None:
+    """Combines the column pairs which do not need to be compared (i.e. already
+    in the checkpoint store, or pruned by the sketch pruner) into a single filter
+    function for compare_table_pair()"""
+    if sketch_pruner is None and len(skip_column_pairs) == 0:
+        return None
+
+    def is_candidate(
+        sample_column: tuple[str, str], lookup_column: tuple[str, str]
+    ) -> bool:
+        if (sample_column[1], lookup_column[1]) in skip_column_pairs:
+            return False
+        return sketch_pruner is None or sketch_pruner.contains(
+            sample_column, lookup_column
+        )
+
+    return is_candidate
+
+
+def compare_table_pair(
+    sample_tbl_name: str,
+    sample_tbl_data: dict,
+    lookup_tbl_name: str,
+    lookup_tbl_data: dict,
+    profile_cache: ColumnProfileCache,
+    verbose: bool = False,
+    is_candidate: Callable[[tuple[str, str], tuple[str, str]], bool] | None = None,
+    adaptive_sampler: "AdaptiveSampler | None" = None,
+    prefilter: "FingerprintPrefilter | None" = None,
+) -> list[dict]:
+    """Compares the sample of every column in one table against the full contents
+    of every column in another table
+
+    Args:
+        is_candidate (Callable): (optional) Column pairs for which this returns
+                        False are skipped (see src.discover.sketch_pruning)
+        adaptive_sampler (AdaptiveSampler): (optional) Score each column pair
+                        adaptively (see src.discover.adaptive_sampling). The order
+                        in which values are scored is seeded per column pair from
+                        the random seed of `profile_cache`
+        prefilter (FingerprintPrefilter): (optional) Column pairs which this shows
+                        cannot have any matches are not scored (they are given
+                        0 matches, see src.discover.prefilters)
+
+    Returns:
+        list: one match record per compared column pair (see match_record())
+    """
+    results: list[dict] = []
+    for sample_colname, sample_coldata in sample_tbl_data.items():
+        for lookup_colname, lookup_coldata in lookup_tbl_data.items():
+            if verbose:
+                print(
+                    f"sample_tbl_name={sample_tbl_name} sample_colname={sample_colname}"
+                )
+                print(
+                    f"lookup_tbl_name={lookup_tbl_name} lookup_colname={lookup_colname}"
+                )
+            if is_candidate is not None and not is_candidate(
+                (sample_tbl_name, sample_colname), (lookup_tbl_name, lookup_colname)
+            ):
+                continue
+            sample_profile = profile_cache.get(
+                sample_tbl_name, sample_colname, sample_coldata
+            )
+            lookup_profile = profile_cache.get(
+                lookup_tbl_name, lookup_colname, lookup_coldata
+            )
+            start_time: float | None = (
+                time.perf_counter() if hooks_active() else None
+            )
+            if prefilter is not None and prefilter.rejects(
+                (sample_tbl_name, sample_colname), (lookup_tbl_name, lookup_colname)
+            ):
+                results.append(
+                    match_record(
+                        sample_tbl_name=sample_tbl_name,
+                        sample_colname=sample_colname,
+                        sample_profile=sample_profile,
+                        lookup_tbl_name=lookup_tbl_name,
+                        lookup_colname=lookup_colname,
+                        lookup_profile=lookup_profile,
+                        n_in_sample_have_any_matches=0,
+                        n_in_sample_have_exactly_1_match=0,
+                    )
+                )
+            else:
+                results.append(
+                    score_column_pair(
+                        sample_tbl_name=sample_tbl_name,
+                        sample_colname=sample_colname,
+                        sample_profile=sample_profile,
+                        lookup_tbl_name=lookup_tbl_name,
+                        lookup_colname=lookup_colname,
+                        lookup_profile=lookup_profile,
+                        count_matches_func=profile_cache.count_matches_func,
+                        adaptive_sampler=adaptive_sampler,
+                        rng=(
+                            None
+                            if profile_cache.random_seed is None
+                            else random.Random(
+                                f"{profile_cache.random_seed}:{sample_tbl_name}:{sample_colname}"
+                                f":{lookup_tbl_name}:{lookup_colname}"
+                            )
+                        ),
+                    )
+                )
+            if start_time is not None:
+                emit(
+                    "pair_scored",
+                    sample_column=[sample_tbl_name, sample_colname],
+                    lookup_column=[lookup_tbl_name, lookup_colname],
+                    seconds=time.perf_counter() - start_time,
+                    n_values=sample_profile.sample_n_unique,
+                )
+            if verbose:
+                print(json.dumps(results[-1], indent=4, default=str))
+    return results
+
+
+def merge_checkpointed_results(
+    checkpoint_store: CheckpointStore,
+    fingerprints: dict[tuple[str, str], str],
+    sample_tbl_name: str,
+    sample_colnames: list[str],
+    lookup_tbl_name: str,
+    lookup_colnames: list[str],
+    computed_results: list[dict],
+    sketch_pruner: "SketchPruner | None",
+) -> list[dict]:
+    """Saves the newly computed match records of a table pair to the checkpoint
+    store, and merges them with the previously stored records of the table pair
+    (in the same order as compare_table_pair() would have produced them)"""
+    pair_results_lookup: dict[tuple[str, str], dict] = checkpoint_store.fetch_records(
+        sample_tbl_name, lookup_tbl_name, fingerprints
+    )
+    checkpoint_store.save_records(computed_results, fingerprints)
+    for match_pair in computed_results:
+        pair_results_lookup[
+            (
+                match_pair["sampled_col"]["column_name"],
+                match_pair["lookup_col"]["column_name"],
+            )
+        ] = match_pair
+    return [
+        pair_results_lookup[(sample_colname, lookup_colname)]
+        for sample_colname in sample_colnames
+        for lookup_colname in lookup_colnames
+        if (sample_colname, lookup_colname) in pair_results_lookup
+        and (
+            sketch_pruner is None
+            or sketch_pruner.contains(
+                (sample_tbl_name, sample_colname), (lookup_tbl_name, lookup_colname)
+            )
+        )
+    ]
+
+
+@instrument_stage("discover.join_keys")
 def join_keys(
     tbl_contents: dict[str, dict],
     n_samples: int = 500,
     allowed_key_types: tuple[type] = (int, str),
     output_path: str = "output/discovered_join_keys.json",
     verbose: bool = False,
+    profile_cache: ColumnProfileCache | None = None,
+    engine: str = "python",
+    sketch_pruner: "SketchPruner | None" = None,
+    workers: int = 1,
+    random_seed: int | None = None,
+    checkpoint_path: str | None = None,
+    output_format: str = "json",
+    adaptive_sampler: "AdaptiveSampler | None" = None,
+    prefilter: "FingerprintPrefilter | None" = None,
+    inverted_index: "InvertedValueIndex | None" = None,
+    match_records: "MatchRecords | None" = None,
 ) -> None:
     """Determines (by sampling and brute force) which columns might be candidates for
     joining between multiple tables (i.e. are ID columns in common)
@@ -36,6 +361,9 @@ def join_keys(
         - None values and strings containing only whitespace are ignored
         - Exact equality is used for comparison, so columns with the same data stored
             as different data types will be considered as non-matching (e.g. "3" != 3).
+        - The statistics of each column (null count, distinct values, sample etc.)
+            are computed only once and then reused for every column pair (see
+            src.discover.column_profile.ColumnProfileCache)
 
     Args:
         tbl_contents (dict): The contents of each table, stored as a dictionary
@@ -47,6 +375,74 @@ def join_keys(
                         as join keys
         output_path (str): Local path on filesystem to which the output will be written
         verbose (bool): Print match output to standard out while the code runs
+        profile_cache (ColumnProfileCache): Cache of column profiles to use (and
+                        populate). A cache can be shared across multiple calls to
+                        reuse profiles, or to control its memory cap. If not
+                        provided, a new cache (with a 1GiB memory cap) is used
+        engine (str): How column pairs are compared. One of
+                        "python": python dictionaries of column values
+                        "numpy": every column is dictionary-encoded into integer
+                            codes (shared across the whole database) and matches
+                            are counted using vectorised numpy operations
+                        Both engines produce the same output
+        sketch_pruner (SketchPruner): (optional) If provided, column pairs which
+                        the MinHash/LSH sketches show are unlikely to match are
+                        skipped (and left out of the output). Refer to
+                        src.discover.sketch_pruning.SketchPruner
+        workers (int): Number of processes to split the table pairs across. Column
+                        data is shared with the worker processes by memory-mapping
+                        (tables loaded by src.transform_data.load_columnar_tables()
+                        are used in place, other tables are first written to a
+                        temporary columnar store). Output order does not depend
+                        on `workers`
+        random_seed (int): (optional) Seed for sampling. The sample of each column
+                        is drawn using its own seed derived from `random_seed` and
+                        the table and column name, so output is reproducible
+                        regardless of `workers`
+        checkpoint_path (str): (optional) Path of a SQLite checkpoint database. Each
+                        finished table pair is saved to it, keyed by a fingerprint
+                        of the contents of each column, and column pairs which are
+                        already in it are not recomputed. This makes interrupted
+                        runs resumable, and makes reruns after a table is added
+                        or changed only recompute the pairs involving its columns
+        output_format (str): One of
+                        "json": a single JSON array of match records
+                        "jsonl": compact newline-delimited JSON, one match record
+                            per line
+                        In both cases, each record is written to `output_path` as
+                        soon as it is produced (records are not held in memory)
+        adaptive_sampler (AdaptiveSampler): (optional) If provided, each column
+                        pair is scored in growing batches of its sampled values,
+                        stopping as soon as a confidence bound shows that the
+                        "exactly 1 match" rate is clearly below (or above) the
+                        decision threshold. The number of values scored is
+                        recorded under "adaptive_sampling" in each match record.
+                        Refer to src.discover.adaptive_sampling.AdaptiveSampler
+        prefilter (FingerprintPrefilter): (optional) If provided, cheap per-column
+                        fingerprints (value types, min/max, string lengths,
+                        character classes and a Bloom filter) are used to find
+                        column pairs which cannot have any matches. These are not
+                        scored (but are still written to the output, with 0
+                        matches). The number of pairs skipped by each rule is
+                        reported in `prefilter.report`. Requires `random_seed`,
+                        so that the fingerprinted sample of each column is the
+                        same sample which is scored (in worker processes, and
+                        after a column is evicted from `profile_cache`). Refer to
+                        src.discover.prefilters.FingerprintPrefilter
+        inverted_index (InvertedValueIndex): (optional) If provided, instead of
+                        comparing every column pair, every column is scanned once
+                        into a database-wide inverted index of value → (column,
+                        count), which can spill to disk, and the match counts of
+                        every column pair are accumulated from it in a single pass.
+                        The output is the same. Cannot be combined with
+                        `sketch_pruner`, `adaptive_sampler`, `prefilter` or
+                        `workers` > 1. Refer to
+                        src.discover.inverted_index.InvertedValueIndex
+        match_records (MatchRecords): (optional) If provided, every match record
+                        is also appended to it, in compact (array-backed) form,
+                        so that it can be passed to src.decision.join_keys()
+                        without reading `output_path` back. Refer to
+                        src.discover.match_records.MatchRecords
 
     Returns:
         None: output is written to a json file on the local filesystem
@@ -68,7 +464,44 @@ def join_keys(
         ... }
         >>> discover_join_keys(tbl_contents=table_data)
     """
-    results: list[dict] = []
+    if output_format not in RESULT_WRITERS:
+        raise ValueError(
+            f"Unknown output_format '{output_format}'"
+            f" (expected one of {list(RESULT_WRITERS)})"
+        )
+
+    if prefilter is not None and random_seed is None:
+        raise ValueError(
+            "prefilter requires random_seed (otherwise the sample which is"
+            " fingerprinted can differ from the sample which is scored)"
+        )
+
+    if inverted_index is not None and (
+        sketch_pruner is not None
+        or adaptive_sampler is not None
+        or prefilter is not None
+        or workers > 1
+    ):
+        raise ValueError(
+            "inverted_index cannot be combined with sketch_pruner, adaptive_sampler,"
+            " prefilter or workers > 1"
+        )
+
+    if profile_cache is None:
+        profile_cache = ColumnProfileCache(
+            n_samples=n_samples, engine=engine, random_seed=random_seed
+        )
+    elif (
+        profile_cache.n_samples,
+        profile_cache.engine,
+        profile_cache.random_seed,
+    ) != (n_samples, engine, random_seed):
+        raise ValueError(
+            f"profile_cache was built with n_samples={profile_cache.n_samples},"
+            f" engine='{profile_cache.engine}', random_seed={profile_cache.random_seed}"
+            f" (expected n_samples={n_samples}, engine='{engine}',"
+            f" random_seed={random_seed})"
+        )
 
     limit_keytypes = {}
     for tbl, cols in tbl_contents.items():
@@ -79,98 +512,166 @@ def join_keys(
             ):
                 limit_keytypes[tbl][col_name] = col_values
 
+    def iter_column_profiles() -> Iterator[tuple[tuple[str, str], object]]:
+        """Yields the profile of each column one at a time (so that only the
+        profiles which fit in the profile cache are kept in memory)"""
+        for tbl, cols in limit_keytypes.items():
+            for col_name, col_values in cols.items():
+                yield (tbl, col_name), profile_cache.get(tbl, col_name, col_values)
+
+    if sketch_pruner is not None:
+        sketch_pruner.fit(iter_column_profiles())
+    if prefilter is not None:
+        prefilter.fit(
+            iter_column_profiles(),
+            value_encoder=getattr(profile_cache, "encoder", None),
+        )
+
+    checkpoint_store: CheckpointStore | None = None
+    fingerprints: dict[tuple[str, str], str] = {}
+    if checkpoint_path is not None:
+        checkpoint_params: dict = {"n_samples": n_samples, "random_seed": random_seed}
+        if adaptive_sampler is not None:
+            checkpoint_params["adaptive_sampler"] = vars(adaptive_sampler)
+        checkpoint_store = CheckpointStore(checkpoint_path, params=checkpoint_params)
+        fingerprints = {
+            (tbl, col_name): column_fingerprint(col_values)
+            for tbl, cols in limit_keytypes.items()
+            for col_name, col_values in cols.items()
+        }
+
+    def completed_column_pairs(
+        sample_tbl_name: str, lookup_tbl_name: str
+    ) -> frozenset[tuple[str, str]]:
+        if checkpoint_store is None:
+            return frozenset()
+        return frozenset(
+            checkpoint_store.completed_column_pairs(
+                sample_tbl_name, lookup_tbl_name, fingerprints
+            )
+        )
+
     comparison_pairs = list(itertools.permutations(limit_keytypes.items(), r=2))
     # comparison_pairs = list(itertools.combinations(tbl_contents.items(), 2))
-    comparison_counter = itertools.count(1)
-    for (sample_tbl_name, sample_tbl_data), (
-        lookup_tbl_name,
-        lookup_tbl_data,
-    ) in comparison_pairs:
-        for sample_colname, sample_coldata in sample_tbl_data.items():
-            for lookup_colname, lookup_coldata in lookup_tbl_data.items():
-                if verbose:
-                    print(
-                        f"sample_tbl_name={sample_tbl_name} sample_colname={sample_colname}"
-                    )
-                    print(
-                        f"lookup_tbl_name={lookup_tbl_name} lookup_colname={lookup_colname}"
-                    )
-                if len(sample_coldata) > n_samples:
-                    sample = random.sample(sample_coldata, k=n_samples)
-                else:
-                    sample = sample_coldata
-                sample_n_null: int = sum([1 if x is None else 0 for x in sample])
-                lookup_n_null: int = sum(
-                    [1 if x is None else 0 for x in lookup_coldata]
-                )
-                sample_match_counts = {val: 0 for val in sample if val is not None}
-                for val in lookup_coldata:
-                    if val in sample_match_counts:
-                        sample_match_counts[val] += 1
-                n_in_sample_have_any_matches = sum(
-                    [1 for x in sample_match_counts.values() if x > 0]
+    if inverted_index is not None:
+        from .inverted_index import iter_inverted_index_comparisons
+
+        table_pair_results = iter_inverted_index_comparisons(
+            limit_keytypes=limit_keytypes,
+            comparison_pairs=[
+                (sample_tbl_name, lookup_tbl_name)
+                for (sample_tbl_name, _), (lookup_tbl_name, _) in comparison_pairs
+            ],
+            inverted_index=inverted_index,
+            n_samples=n_samples,
+            random_seed=random_seed,
+            temp_dir=pathlib.Path(output_path).parent,
+        )
+    elif workers > 1:
+        from .parallel import iter_parallel_comparisons
+
+        table_pair_results = iter_parallel_comparisons(
+            tbl_contents=tbl_contents,
+            limit_keytypes=limit_keytypes,
+            comparison_pairs=[
+                (
+                    sample_tbl_name,
+                    lookup_tbl_name,
+                    completed_column_pairs(sample_tbl_name, lookup_tbl_name),
                 )
-                n_in_sample_have_exactly_1_match = sum(
-                    [1 for x in sample_match_counts.values() if x == 1]
+                for (sample_tbl_name, _), (lookup_tbl_name, _) in comparison_pairs
+            ],
+            workers=workers,
+            n_samples=n_samples,
+            engine=engine,
+            random_seed=random_seed,
+            verbose=verbose,
+            sketch_pruner=sketch_pruner,
+            adaptive_sampler=adaptive_sampler,
+            prefilter=prefilter,
+            temp_dir=pathlib.Path(output_path).parent,
+        )
+    else:
+        table_pair_results = (
+            compare_table_pair(
+                sample_tbl_name=sample_tbl_name,
+                sample_tbl_data=sample_tbl_data,
+                lookup_tbl_name=lookup_tbl_name,
+                lookup_tbl_data=lookup_tbl_data,
+                profile_cache=profile_cache,
+                verbose=verbose,
+                is_candidate=make_pair_filter(
+                    sketch_pruner=sketch_pruner,
+                    skip_column_pairs=completed_column_pairs(
+                        sample_tbl_name, lookup_tbl_name
+                    ),
+                ),
+                adaptive_sampler=adaptive_sampler,
+                prefilter=prefilter,
+            )
+            for (sample_tbl_name, sample_tbl_data), (
+                lookup_tbl_name,
+                lookup_tbl_data,
+            ) in comparison_pairs
+        )
+
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        result_writer = RESULT_WRITERS[output_format](output_file)
+        comparison_counter = itertools.count(1)
+        for ((sample_tbl_name, sample_tbl_data), (lookup_tbl_name, lookup_tbl_data)), (
+            pair_results
+        ) in zip(comparison_pairs, table_pair_results):
+            if checkpoint_store is not None:
+                pair_results = merge_checkpointed_results(
+                    checkpoint_store=checkpoint_store,
+                    fingerprints=fingerprints,
+                    sample_tbl_name=sample_tbl_name,
+                    sample_colnames=list(sample_tbl_data),
+                    lookup_tbl_name=lookup_tbl_name,
+                    lookup_colnames=list(lookup_tbl_data),
+                    computed_results=pair_results,
+                    sketch_pruner=sketch_pruner,
                 )
-                if len(sample_match_counts) == 0:
-                    percent_in_sample_have_any_matches = None
-                    percent_in_sample_have_exactly_1_match = None
-                else:
-                    percent_in_sample_have_any_matches = round(
-                        n_in_sample_have_any_matches / len(sample_match_counts), 2
-                    )
-                    percent_in_sample_have_exactly_1_match = round(
-                        n_in_sample_have_exactly_1_match / len(sample_match_counts), 2
+            if sketch_pruner is not None:
+                for sample_colname in sample_tbl_data:
+                    for lookup_colname in lookup_tbl_data:
+                        sketch_pruner.is_candidate(
+                            (sample_tbl_name, sample_colname),
+                            (lookup_tbl_name, lookup_colname),
+                        )
+                for match_pair in pair_results:
+                    sketch_pruner.observe_kept_pair(match_pair)
+            if prefilter is not None:
+                for match_pair in pair_results:
+                    prefilter.observe_pair(
+                        (sample_tbl_name, match_pair["sampled_col"]["column_name"]),
+                        (lookup_tbl_name, match_pair["lookup_col"]["column_name"]),
                     )
-                sample_n_unique_vals: int = len(sample_match_counts)
-                lookup_n_unique_vals: int = len(set(lookup_coldata))
-                results.append(
-                    {
-                        "sampled_col": {
-                            "table_name": sample_tbl_name,
-                            "column_name": sample_colname,
-                            "sample_size": {
-                                "n_rows": len(sample),
-                                "n_null": sample_n_null,
-                                "percent_null": round(sample_n_null / len(sample), 2),
-                                "n_unique": sample_n_unique_vals,
-                                "n_unique/n_rows": round(
-                                    sample_n_unique_vals / len(sample), 2
-                                ),
-                            },
-                        },
-                        "lookup_col": {
-                            "table_name": lookup_tbl_name,
-                            "column_name": lookup_colname,
-                            "size": {
-                                "n_rows": len(lookup_coldata),
-                                "n_null": lookup_n_null,
-                                "percent_null": round(
-                                    lookup_n_null / len(lookup_coldata)
-                                ),
-                                "n_unique": lookup_n_unique_vals,
-                                "n_unique/n_rows": round(
-                                    lookup_n_unique_vals / len(lookup_coldata), 2
-                                ),
-                            },
-                        },
-                        "matches": {
-                            "any_matches_in_lookup": {
-                                "n": n_in_sample_have_any_matches,
-                                "percent": percent_in_sample_have_any_matches,
-                            },
-                            "exactly_1_match_in_lookup": {
-                                "n": n_in_sample_have_exactly_1_match,
-                                "percent": percent_in_sample_have_exactly_1_match,
-                            },
-                        },
-                    }
-                )
-                if verbose:
-                    print(json.dumps(results[-1], indent=4, default=str))
-        print(
-            f"{datetime.datetime.now().strftime('%H:%M:%S')} Completed comparison {next(comparison_counter):,} of {len(comparison_pairs):,}"
+            for match_pair in pair_results:
+                result_writer.write(match_pair)
+            if match_records is not None:
+                match_records.extend(pair_results)
+            emit("count", name="column_pairs_written", value=len(pair_results))
+            n_comparisons_done: int = next(comparison_counter)
+            emit(
+                "progress",
+                stage="discover.join_keys",
+                n_done=n_comparisons_done,
+                n_total=len(comparison_pairs),
+                unit="table pairs",
+            )
+            print(
+                f"{datetime.datetime.now().strftime('%H:%M:%S')} Completed comparison {n_comparisons_done:,} of {len(comparison_pairs):,}"
+            )
+        result_writer.close()
+    if checkpoint_store is not None:
+        checkpoint_store.close()
+    if sketch_pruner is not None:
+        sketch_pruner.finalise_report(
+            get_profile=lambda column_key: profile_cache.get(
+                *column_key, limit_keytypes[column_key[0]][column_key[1]]
+            ),
+            count_matches_func=profile_cache.count_matches_func,
         )
-    with open(output_path, "w", encoding="utf-8") as file:
-        json.dump(results, file, indent=4)
+    if prefilter is not None:
+        prefilter.finalise_report()
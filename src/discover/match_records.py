@@ -0,0 +1,261 @@
+"""
+Defines class src.discover.match_records.MatchRecords
+"""
+
+import array
+import math
+import sys
+from typing import Iterable, Iterator
+
+from src.navigate_data import flatten_dict, iter_records
+
+from .result_writers import RESULT_WRITERS
+
+# (table name, column name) fields of a match record, stored as interned name ids #
+NAME_FIELDS: tuple[tuple[str, ...], ...] = (
+    ("sampled_col", "table_name"),
+    ("sampled_col", "column_name"),
+    ("lookup_col", "table_name"),
+    ("lookup_col", "column_name"),
+)
+
+# numeric fields of a match record, and the array typecode each is stored as
+# ("q" for int, "d" for float - with None stored as NaN) #
+NUMERIC_FIELDS: tuple[tuple[tuple[str, ...], str], ...] = (
+    (("sampled_col", "sample_size", "n_rows"), "q"),
+    (("sampled_col", "sample_size", "n_null"), "q"),
+    (("sampled_col", "sample_size", "percent_null"), "d"),
+    (("sampled_col", "sample_size", "n_unique"), "q"),
+    (("sampled_col", "sample_size", "n_unique/n_rows"), "d"),
+    (("lookup_col", "size", "n_rows"), "q"),
+    (("lookup_col", "size", "n_null"), "q"),
+    (("lookup_col", "size", "percent_null"), "q"),
+    (("lookup_col", "size", "n_unique"), "q"),
+    (("lookup_col", "size", "n_unique/n_rows"), "d"),
+    (("matches", "any_matches_in_lookup", "n"), "q"),
+    (("matches", "any_matches_in_lookup", "percent"), "d"),
+    (("matches", "exactly_1_match_in_lookup", "n"), "q"),
+    (("matches", "exactly_1_match_in_lookup", "percent"), "d"),
+)
+
+# every field, in the order in which src.discover.join_keys.match_record()
+# builds the record #
+RECORD_FIELDS: tuple[tuple[str, ...], ...] = (
+    NAME_FIELDS[:2] + tuple(path for path, _ in NUMERIC_FIELDS[:5])
+    + NAME_FIELDS[2:] + tuple(path for path, _ in NUMERIC_FIELDS[5:])
+)
+
+# fields which only some records have (see src.discover.adaptive_sampling and
+# src.discover.composite_keys), which are stored as is #
+OPTIONAL_FIELDS: tuple[str, ...] = ("adaptive_sampling", "composite_key")
+
+
+class MatchRecords:
+    """Compact in-memory container of the match records of
+    src.discover.join_keys.join_keys(), stored as one array per field (instead
+    of one nested dict per column pair)
+
+    Notes:
+        - Table and column names are interned: each distinct name is stored once,
+            and each record stores only integer name ids
+        - Numeric fields are stored in typed arrays (8 bytes per value), so a
+            record takes ~130 bytes instead of the several KB of its nested dict
+        - The conversion to and from the nested dict (JSON) format is lossless:
+            MatchRecords.from_records(records).to_records() == records, including
+            the int/float type of every value. The optional "adaptive_sampling"
+            and "composite_key" fields are stored (sparsely) as is
+        - Records which do not follow the match record format of
+            src.discover.join_keys.match_record() are rejected with a ValueError
+        - Values are read without building dicts through values(), name() and
+            column_pair(), which is how src.decision.join_keys() and
+            src.dataviz.join_key_decisions_to_csv() consume a MatchRecords
+
+    Example:
+        >>> match_records = MatchRecords.from_file("output/discover/join_keys/all_matches.json")
+        >>> len(match_records)
+        14762
+        >>> match_records[:2].to_records()
+        [{'sampled_col': {'table_name': 'orders', ...}, ...}, {...}]
+        >>> match_records.values(("matches", "exactly_1_match_in_lookup", "percent"))[:3]
+        [0.0, 0.97, None]
+    """
+
+    def __init__(self, names: list[str] | None = None) -> None:
+        # the name pool can be shared between containers (see select()), since
+        # a name's id never changes once assigned #
+        self._names: list[str] = [] if names is None else names
+        self._name_ids: dict[str, int] = {
+            name: name_id for name_id, name in enumerate(self._names)
+        }
+        self._name_columns: dict[tuple, array.array] = {
+            path: array.array("I") for path in NAME_FIELDS
+        }
+        self._numeric_columns: dict[tuple, array.array] = {
+            path: array.array(typecode) for path, typecode in NUMERIC_FIELDS
+        }
+        self._optional: dict[int, dict] = {}
+        self._n_records: int = 0
+
+    def __len__(self) -> int:
+        return self._n_records
+
+    def _name_id(self, name: str) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = len(self._names)
+            self._names.append(sys.intern(name))
+            self._name_ids[name] = name_id
+        return name_id
+
+    def append(self, record: dict) -> None:
+        """Adds a single match record (in the nested dict format)"""
+        flat: dict[tuple, object] = flatten_dict(
+            {key: value for key, value in record.items() if key not in OPTIONAL_FIELDS}
+        )
+        if list(flat) != list(RECORD_FIELDS):
+            raise ValueError(
+                f"Not a match record: expected fields {list(RECORD_FIELDS)},"
+                f" got {list(flat)}"
+            )
+        for path in NAME_FIELDS:
+            if not isinstance(flat[path], str):
+                raise ValueError(f"{path} must be a str (got {flat[path]!r})")
+        for path, typecode in NUMERIC_FIELDS:
+            value = flat[path]
+            if typecode == "q" and type(value) is not int:
+                raise ValueError(f"{path} must be an int (got {value!r})")
+            if typecode == "d" and not (
+                value is None or (type(value) is float and not math.isnan(value))
+            ):
+                raise ValueError(f"{path} must be a float or None (got {value!r})")
+        for path in NAME_FIELDS:
+            self._name_columns[path].append(self._name_id(flat[path]))
+        for path, _ in NUMERIC_FIELDS:
+            value = flat[path]
+            self._numeric_columns[path].append(math.nan if value is None else value)
+        optional: dict = {
+            key: value for key, value in record.items() if key in OPTIONAL_FIELDS
+        }
+        if len(optional) > 0:
+            self._optional[self._n_records] = optional
+        self._n_records += 1
+
+    def extend(self, records: Iterable[dict]) -> None:
+        for record in records:
+            self.append(record)
+
+    def name(self, idx: int, path: tuple[str, ...]) -> str:
+        """The table or column name at `path` (one of NAME_FIELDS) of one record"""
+        return self._names[self._name_columns[tuple(path)][idx]]
+
+    def column_pair(self, idx: int) -> tuple[tuple[str, str], tuple[str, str]]:
+        """((sample table, sample column), (lookup table, lookup column)) of one
+        record (the format written by src.decision.join_keys.join_keys())"""
+        sample_tbl, sample_col, lookup_tbl, lookup_col = (
+            self._names[self._name_columns[path][idx]] for path in NAME_FIELDS
+        )
+        return (sample_tbl, sample_col), (lookup_tbl, lookup_col)
+
+    def values(self, path: tuple[str, ...]) -> list:
+        """Every record's value of a single field (None where the value is None)
+
+        Args:
+            path (tuple): The nested keys of the field
+                        e.g. ("matches", "exactly_1_match_in_lookup", "percent")
+        """
+        path = tuple(path)
+        if path in self._name_columns:
+            return [self._names[name_id] for name_id in self._name_columns[path]]
+        if path not in self._numeric_columns:
+            raise KeyError(f"{path} is not a field of a match record")
+        values = self._numeric_columns[path].tolist()
+        if self._numeric_columns[path].typecode == "d":
+            return [None if math.isnan(x) else x for x in values]
+        return values
+
+    def record(self, idx: int) -> dict:
+        """A single record, in the nested dict (JSON) format"""
+        if idx < 0:
+            idx += self._n_records
+        if not 0 <= idx < self._n_records:
+            raise IndexError("MatchRecords index out of range")
+        flat: dict[tuple, object] = {
+            path: self._names[self._name_columns[path][idx]] for path in NAME_FIELDS
+        }
+        for path, _ in NUMERIC_FIELDS:
+            value = self._numeric_columns[path][idx]
+            if isinstance(value, float) and math.isnan(value):
+                value = None
+            flat[path] = value
+        record: dict = {}
+        for path in RECORD_FIELDS:
+            nested = record
+            for key in path[:-1]:
+                nested = nested.setdefault(key, {})
+            nested[path[-1]] = flat[path]
+        record.update(self._optional.get(idx, {}))
+        return record
+
+    def select(self, indices: Iterable[int]) -> "MatchRecords":
+        """A new MatchRecords containing only the records at `indices` (in that
+        order). It shares this container's name pool"""
+        selected = MatchRecords(names=self._names)
+        selected._name_ids = self._name_ids
+        indices = list(indices)
+        for path, column in self._name_columns.items():
+            selected._name_columns[path] = array.array(
+                "I", (column[i] for i in indices)
+            )
+        for path, column in self._numeric_columns.items():
+            selected._numeric_columns[path] = array.array(
+                column.typecode, (column[i] for i in indices)
+            )
+        selected._optional = {
+            new_idx: self._optional[idx]
+            for new_idx, idx in enumerate(indices)
+            if idx in self._optional
+        }
+        selected._n_records = len(indices)
+        return selected
+
+    def __getitem__(self, key: int | slice) -> "dict | MatchRecords":
+        if isinstance(key, slice):
+            return self.select(range(*key.indices(self._n_records)))
+        return self.record(key)
+
+    def __iter__(self) -> Iterator[dict]:
+        for idx in range(self._n_records):
+            yield self.record(idx)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the stored values (excluding names)"""
+        return sum(
+            column.itemsize * len(column)
+            for columns in (self._name_columns, self._numeric_columns)
+            for column in columns.values()
+        )
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "MatchRecords":
+        match_records = cls()
+        match_records.extend(records)
+        return match_records
+
+    def to_records(self) -> list[dict]:
+        return list(self)
+
+    @classmethod
+    def from_file(cls, filepath: str) -> "MatchRecords":
+        """Reads the (.json or .jsonl) output of src.discover.join_keys.join_keys()
+        (streaming the input one record at a time)"""
+        return cls.from_records(iter_records(filepath))
+
+    def write(self, filepath: str, output_format: str = "json") -> None:
+        """Writes the records in the format of src.discover.join_keys.join_keys()
+        (see its `output_format` argument)"""
+        with open(filepath, "w", encoding="utf-8") as file:
+            result_writer = RESULT_WRITERS[output_format](file)
+            for record in self:
+                result_writer.write(record)
+            result_writer.close()
@@ -0,0 +1,153 @@
+"""
+Process-pool execution of src.discover.join_keys.join_keys(workers=N)
+"""
+
+import multiprocessing
+import pathlib
+import random
+import tempfile
+from typing import TYPE_CHECKING, Iterator
+
+from src.transform_data.columnar_store import (
+    ColumnarTable,
+    load_columnar_table,
+    write_columnar_table,
+)
+from src.transform_data.summarise_jsonl import ColumnSummary
+
+from .column_profile import ColumnProfileCache
+from .join_keys import compare_table_pair, make_pair_filter
+
+if TYPE_CHECKING:
+    from .adaptive_sampling import AdaptiveSampler
+    from .prefilters import FingerprintPrefilter
+    from .sketch_pruning import SketchPruner
+
+# state of each worker process (populated by _init_worker()) #
+_worker_tables: dict[str, dict] = {}
+_worker_profile_cache: ColumnProfileCache | None = None
+_worker_verbose: bool = False
+_worker_sketch_pruner: "SketchPruner | None" = None
+_worker_adaptive_sampler: "AdaptiveSampler | None" = None
+_worker_prefilter: "FingerprintPrefilter | None" = None
+
+
+def _init_worker(
+    table_dirs: dict[str, str],
+    summarised_tables: dict[str, dict],
+    table_columns: dict[str, list[str]],
+    n_samples: int,
+    engine: str,
+    random_seed: int | None,
+    verbose: bool,
+    sketch_pruner: "SketchPruner | None",
+    adaptive_sampler: "AdaptiveSampler | None",
+    prefilter: "FingerprintPrefilter | None",
+) -> None:
+    """Memory-maps the (allowed-type) columns of every table into the worker"""
+    global _worker_tables, _worker_profile_cache, _worker_verbose
+    global _worker_sketch_pruner, _worker_adaptive_sampler, _worker_prefilter
+    if random_seed is not None:
+        random.seed(random_seed)
+    _worker_tables = {}
+    for tbl_name, table_dir in table_dirs.items():
+        table = load_columnar_table(table_dir)
+        _worker_tables[tbl_name] = {
+            col_name: table[col_name] for col_name in table_columns[tbl_name]
+        }
+    _worker_tables.update(summarised_tables)
+    _worker_profile_cache = ColumnProfileCache(
+        n_samples=n_samples, engine=engine, random_seed=random_seed
+    )
+    _worker_verbose = verbose
+    _worker_sketch_pruner = sketch_pruner
+    _worker_adaptive_sampler = adaptive_sampler
+    _worker_prefilter = prefilter
+
+
+def _compare_table_pair_in_worker(
+    table_pair: tuple[str, str, frozenset[tuple[str, str]]]
+) -> list[dict]:
+    sample_tbl_name, lookup_tbl_name, skip_column_pairs = table_pair
+    return compare_table_pair(
+        sample_tbl_name=sample_tbl_name,
+        sample_tbl_data=_worker_tables[sample_tbl_name],
+        lookup_tbl_name=lookup_tbl_name,
+        lookup_tbl_data=_worker_tables[lookup_tbl_name],
+        profile_cache=_worker_profile_cache,
+        verbose=_worker_verbose,
+        is_candidate=make_pair_filter(
+            sketch_pruner=_worker_sketch_pruner, skip_column_pairs=skip_column_pairs
+        ),
+        adaptive_sampler=_worker_adaptive_sampler,
+        prefilter=_worker_prefilter,
+    )
+
+
+def iter_parallel_comparisons(
+    tbl_contents: dict[str, dict],
+    limit_keytypes: dict[str, dict],
+    comparison_pairs: list[tuple[str, str, frozenset[tuple[str, str]]]],
+    workers: int,
+    n_samples: int,
+    engine: str,
+    random_seed: int | None,
+    verbose: bool,
+    sketch_pruner: "SketchPruner | None",
+    adaptive_sampler: "AdaptiveSampler | None",
+    prefilter: "FingerprintPrefilter | None",
+    temp_dir: str | pathlib.Path,
+) -> Iterator[list[dict]]:
+    """Compares every (sample table, lookup table, column pairs to skip) entry in
+    `comparison_pairs` using a pool of `workers` processes
+
+    Notes:
+        - Column data is never pickled: tables which were loaded with
+            src.transform_data.load_columnar_tables() are memory-mapped directly by
+            each worker, and all other tables are first written to a temporary
+            columnar store (in `temp_dir`) which the workers memory-map. The
+            exception is summarised tables (see src.transform_data.summarise_jsonl()),
+            which are small, and so are sent to each worker as they are
+        - Each worker builds its own column profile cache, and samples each column
+            using a seed derived from `random_seed`, so results do not depend on
+            which worker processes which table pair
+
+    Yields:
+        list: the match records of each table pair, in the order of `comparison_pairs`
+    """
+    with tempfile.TemporaryDirectory(dir=temp_dir) as spill_dir:
+        table_dirs: dict[str, str] = {}
+        summarised_tables: dict[str, dict] = {}
+        for tbl_idx, (tbl_name, cols) in enumerate(limit_keytypes.items()):
+            if isinstance(tbl_contents[tbl_name], ColumnarTable):
+                table_dirs[tbl_name] = str(tbl_contents[tbl_name].table_dir)
+            elif any(
+                isinstance(col_values, ColumnSummary) for col_values in cols.values()
+            ):
+                summarised_tables[tbl_name] = cols
+            else:
+                table_dirs[tbl_name] = str(pathlib.Path(spill_dir) / f"t{tbl_idx}")
+                write_columnar_table(
+                    columns={
+                        col_name: (lambda col_values=col_values: col_values)
+                        for col_name, col_values in cols.items()
+                    },
+                    output_dir=table_dirs[tbl_name],
+                )
+        with multiprocessing.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(
+                table_dirs,
+                summarised_tables,
+                {tbl_name: list(cols) for tbl_name, cols in limit_keytypes.items()},
+                n_samples,
+                engine,
+                random_seed,
+                verbose,
+                sketch_pruner,
+                adaptive_sampler,
+                prefilter,
+            ),
+        ) as pool:
+            yield from pool.imap(_compare_table_pair_in_worker, comparison_pairs)
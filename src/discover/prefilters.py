@@ -0,0 +1,278 @@
+"""
+Defines class src.discover.prefilters.FingerprintPrefilter
+"""
+
+import logging
+import string
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+from .hashing import stable_hash64
+
+logger = logging.getLogger(__name__)
+
+PREFILTER_RULES: tuple[str, ...] = (
+    "type",
+    "range",
+    "string_length",
+    "char_class",
+    "bloom",
+)
+# value types whose equality is exactly mirrored by their range, length,
+# character classes and stable_hash64() #
+COMPARABLE_TYPE_CLASSES: frozenset[str] = frozenset(("number", "str"))
+MAX_TRACKED_STRING_LENGTH: int = 63
+CHAR_CLASSES: tuple[frozenset[str], ...] = (
+    frozenset(string.digits),
+    frozenset(string.ascii_lowercase),
+    frozenset(string.ascii_uppercase),
+    frozenset(string.whitespace),
+    frozenset(string.punctuation),
+)
+
+
+def type_class(value) -> str:
+    """Groups value types which can compare equal in python (e.g. 1 == 1.0 == True)"""
+    if isinstance(value, (int, float)):
+        return "number"
+    return type(value).__name__
+
+
+def char_class_signature(value: str) -> int:
+    """Returns the index (0-63) of the combination of character classes (digit,
+    lowercase, uppercase, whitespace, punctuation, other) present in a string"""
+    chars = set(value)
+    signature: int = 0
+    for class_idx, char_class in enumerate(CHAR_CLASSES):
+        if not chars.isdisjoint(char_class):
+            signature |= 1 << class_idx
+            chars -= char_class
+    if len(chars) > 0:
+        signature |= 1 << len(CHAR_CLASSES)
+    return signature
+
+
+@dataclass
+class ColumnFingerprint:
+    """Cheap summary of a set of distinct column values
+
+    Attributes:
+        type_classes (frozenset): The type_class() of every value
+        numeric_range (tuple): (min, max) of the numeric values (None if there are
+                        none, or if there are NaN values)
+        string_range (tuple): (min, max) of the string values (None if there are none)
+        string_length_mask (int): Bit i is set if a string of length i is present
+                        (lengths above MAX_TRACKED_STRING_LENGTH share the last bit)
+        char_class_mask (int): Bit i is set if a string with char_class_signature()
+                        i is present
+        bloom (int): Bloom filter (with a single hash function) of the values
+    """
+
+    type_classes: frozenset[str]
+    numeric_range: tuple | None
+    string_range: tuple[str, str] | None
+    string_length_mask: int
+    char_class_mask: int
+    bloom: int
+
+
+def fingerprint_values(values: Iterable, bloom_bits: int) -> ColumnFingerprint:
+    """Computes the ColumnFingerprint of a collection of distinct non-null values"""
+    type_classes: set[str] = set()
+    numbers: list = []
+    has_nan: bool = False
+    strings: list[str] = []
+    string_length_mask: int = 0
+    char_class_mask: int = 0
+    bloom = bytearray(bloom_bits // 8)
+    for value in values:
+        value_type_class = type_class(value)
+        type_classes.add(value_type_class)
+        if value_type_class == "number":
+            if value != value:
+                has_nan = True
+            else:
+                numbers.append(value)
+        elif value_type_class == "str":
+            strings.append(value)
+            string_length_mask |= 1 << min(len(value), MAX_TRACKED_STRING_LENGTH)
+            char_class_mask |= 1 << char_class_signature(value)
+        bit_idx = stable_hash64(value) % bloom_bits
+        bloom[bit_idx >> 3] |= 1 << (bit_idx & 7)
+    return ColumnFingerprint(
+        type_classes=frozenset(type_classes),
+        numeric_range=(
+            (min(numbers), max(numbers)) if len(numbers) > 0 and not has_nan else None
+        ),
+        string_range=(min(strings), max(strings)) if len(strings) > 0 else None,
+        string_length_mask=string_length_mask,
+        char_class_mask=char_class_mask,
+        bloom=int.from_bytes(bloom, "little"),
+    )
+
+
+def _ranges_overlap(range_1: tuple | None, range_2: tuple | None) -> bool:
+    if range_1 is None or range_2 is None:
+        return True
+    return range_1[0] <= range_2[1] and range_2[0] <= range_1[1]
+
+
+class FingerprintPrefilter:
+    """Optional pre-stage of src.discover.join_keys.join_keys() which uses cheap
+    per-column fingerprints to find column pairs which cannot possibly have any
+    matches, without scoring them
+
+    Notes:
+        - For each sampled column, a ColumnFingerprint is computed over the distinct
+            values in its sample. For each lookup column, the same is computed
+            over all of its distinct values
+        - Each column pair is then checked (in constant time) by these rules, in order:
+            "type":          the columns share no type of value (e.g. int vs. str)
+            "range":         the (min, max) ranges of the columns do not overlap
+            "string_length": the columns share no string length
+            "char_class":    the columns share no combination of character classes
+                                (e.g. "digits only" vs. "lowercase and digits")
+            "bloom":         the Bloom filters of the columns have no bit in common
+                                (this is only effective for columns with few
+                                distinct values)
+        - Every rule is exact: a rejected pair is known to have no matches at all.
+            Rejected pairs are therefore not scored, but (unlike
+            src.discover.sketch_pruning.SketchPruner) they are still written to
+            the output, with 0 matches, so the output is unchanged
+        - Rules are only applied to numbers and strings (values of other types
+            can be equal without sharing their range, hash etc.)
+        - The sampled column fingerprints are only exact for the sample which is
+            scored if every profile of a column draws the same sample, so
+            join_keys() requires `random_seed` when a prefilter is used
+
+    Attributes:
+        report (dict): Skip counts of the most recent join_keys() run.
+                        "n_skipped_by_rule" counts each rejected pair under the
+                        first rule which rejected it, and "n_rejectable_by_rule"
+                        counts every pair (sharing a type of value) which each
+                        rule would reject on its own
+
+    Example:
+        >>> from src.discover.prefilters import FingerprintPrefilter
+        >>> prefilter = FingerprintPrefilter()
+        >>> src.discover.join_keys(
+        ...     tbl_contents=table_data, prefilter=prefilter, random_seed=42
+        ... )
+        >>> prefilter.report["n_skipped_by_rule"]
+        {'type': 512, 'range': 230, 'string_length': 12, 'char_class': 3, 'bloom': 40}
+    """
+
+    def __init__(self, bloom_bits: int = 4096) -> None:
+        if bloom_bits <= 0 or bloom_bits % 8 != 0:
+            raise ValueError("bloom_bits must be a positive multiple of 8")
+        self.bloom_bits = bloom_bits
+        self.report: dict = {}
+        self._sample_fingerprints: dict[tuple[str, str], ColumnFingerprint] = {}
+        self._lookup_fingerprints: dict[tuple[str, str], ColumnFingerprint] = {}
+        self._fit_seconds: float = 0.0
+        self._n_pairs: int = 0
+        self._n_skipped_by_rule: dict[str, int] = {}
+        self._n_rejectable_by_rule: dict[str, int] = {}
+
+    def fit(
+        self,
+        column_profiles: Iterable[tuple[tuple[str, str], object]],
+        value_encoder=None,
+    ) -> None:
+        """Fingerprints the sample and the full contents of every column
+
+        Args:
+            column_profiles (Iterable): ((table name, column name), profile) of
+                                    each column (e.g. a generator, so that only
+                                    one profile needs to be in memory at a time)
+            value_encoder (ValueEncoder): The encoder of the profiles, if they are
+                                    dictionary-encoded (engine="numpy")
+        """
+        start_time: float = time.perf_counter()
+        self._n_pairs = 0
+        self._n_skipped_by_rule = {rule: 0 for rule in PREFILTER_RULES}
+        self._n_rejectable_by_rule = {rule: 0 for rule in PREFILTER_RULES}
+        self._sample_fingerprints = {}
+        self._lookup_fingerprints = {}
+        for column_key, profile in column_profiles:
+            if hasattr(profile, "unique_codes"):
+                decoded = value_encoder.values
+                sample_values = (decoded[code] for code in profile.sample_codes.tolist())
+                lookup_values = (decoded[code] for code in profile.unique_codes.tolist())
+            else:
+                sample_values = profile.sample_distinct
+                lookup_values = profile.value_counts.keys()
+            self._sample_fingerprints[column_key] = fingerprint_values(
+                sample_values, self.bloom_bits
+            )
+            self._lookup_fingerprints[column_key] = fingerprint_values(
+                lookup_values, self.bloom_bits
+            )
+        self._fit_seconds = time.perf_counter() - start_time
+
+    def rejecting_rules(
+        self, sample_column: tuple[str, str], lookup_column: tuple[str, str]
+    ) -> list[str]:
+        """Returns every rule (in PREFILTER_RULES order) which shows that the pair
+        has no matches (an empty list if the pair must be scored)"""
+        sample_fp = self._sample_fingerprints[sample_column]
+        lookup_fp = self._lookup_fingerprints[lookup_column]
+        shared_types: frozenset[str] = sample_fp.type_classes & lookup_fp.type_classes
+        if len(shared_types) == 0:
+            return ["type"]
+        if not shared_types <= COMPARABLE_TYPE_CLASSES:
+            return []
+        rules: list[str] = []
+        if not any(
+            _ranges_overlap(
+                *(
+                    (sample_fp.numeric_range, lookup_fp.numeric_range)
+                    if shared_type == "number"
+                    else (sample_fp.string_range, lookup_fp.string_range)
+                )
+            )
+            for shared_type in shared_types
+        ):
+            rules.append("range")
+        if shared_types == {"str"}:
+            if sample_fp.string_length_mask & lookup_fp.string_length_mask == 0:
+                rules.append("string_length")
+            if sample_fp.char_class_mask & lookup_fp.char_class_mask == 0:
+                rules.append("char_class")
+        if sample_fp.bloom & lookup_fp.bloom == 0:
+            rules.append("bloom")
+        return rules
+
+    def rejects(
+        self, sample_column: tuple[str, str], lookup_column: tuple[str, str]
+    ) -> bool:
+        """Returns True if the pair is known to have no matches"""
+        return len(self.rejecting_rules(sample_column, lookup_column)) > 0
+
+    def observe_pair(
+        self, sample_column: tuple[str, str], lookup_column: tuple[str, str]
+    ) -> None:
+        """Records the outcome of the rules on a pair, for the skip report"""
+        self._n_pairs += 1
+        rules = self.rejecting_rules(sample_column, lookup_column)
+        if len(rules) > 0:
+            self._n_skipped_by_rule[rules[0]] += 1
+        for rule in rules:
+            self._n_rejectable_by_rule[rule] += 1
+
+    def finalise_report(self) -> dict:
+        """Populates (and logs) `report`"""
+        n_skipped: int = sum(self._n_skipped_by_rule.values())
+        self.report = {
+            "n_column_pairs": self._n_pairs,
+            "n_skipped_pairs": n_skipped,
+            "skip_ratio": (
+                round(n_skipped / self._n_pairs, 4) if self._n_pairs > 0 else None
+            ),
+            "n_skipped_by_rule": dict(self._n_skipped_by_rule),
+            "n_rejectable_by_rule": dict(self._n_rejectable_by_rule),
+            "fit_seconds": round(self._fit_seconds, 3),
+        }
+        logger.info("Fingerprint prefilter report: %s", self.report)
+        return self.report
@@ -0,0 +1,47 @@
+"""
+Writers which stream the match records of src.discover.join_keys.join_keys()
+to disk as they are produced
+"""
+
+import json
+import textwrap
+from typing import TextIO
+
+
+class JsonResultWriter:
+    """Writes records as a single JSON array (formatted exactly as
+    json.dump(records, file, indent=4) would), without holding the records
+    in memory"""
+
+    def __init__(self, file: TextIO) -> None:
+        self.file = file
+        self.n_records: int = 0
+
+    def write(self, record: dict) -> None:
+        self.file.write("[\n" if self.n_records == 0 else ",\n")
+        self.file.write(textwrap.indent(json.dumps(record, indent=4), "    "))
+        self.n_records += 1
+
+    def close(self) -> None:
+        self.file.write("[]" if self.n_records == 0 else "\n]")
+
+
+class JsonlResultWriter:
+    """Writes records as compact newline-delimited JSON (one record per line)"""
+
+    def __init__(self, file: TextIO) -> None:
+        self.file = file
+        self.n_records: int = 0
+
+    def write(self, record: dict) -> None:
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.n_records += 1
+
+    def close(self) -> None:
+        return None
+
+
+RESULT_WRITERS: dict[str, type] = {
+    "json": JsonResultWriter,
+    "jsonl": JsonlResultWriter,
+}
@@ -0,0 +1,442 @@
+"""
+Sharded execution of src.discover.join_keys.join_keys() across independent
+processes (or machines): plan_shards() → run_shard() (once per shard) →
+merge_shards()
+
+Example:
+    >>> plan = plan_shards(table_data, n_shards=8, random_seed=42)
+    >>> plan.write("shard_plan.json")
+    # then on each machine/job (shard = 0, ..., 7) #
+    $ python -m src.discover.sharding --plan shard_plan.json \\
+        --shard 3 --tables-dir temp_storage --output-path shard_3.jsonl
+    # then, once every shard has finished #
+    >>> merge_shards(
+    ...     plan,
+    ...     shard_output_paths=[f"shard_{i}.jsonl" for i in range(8)],
+    ...     output_path="output/discover/join_keys/all_matches.json",
+    ... )
+"""
+
+import argparse
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import pathlib
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterator
+
+from src.instrumentation import emit, instrument_stage
+from src.navigate_data import iter_records
+
+from .column_profile import ColumnProfileCache
+from .join_keys import compare_table_pair, only_allowed_types
+from .result_writers import RESULT_WRITERS
+
+if TYPE_CHECKING:
+    from .adaptive_sampling import AdaptiveSampler
+
+logger = logging.getLogger(__name__)
+
+# relative cost of profiling 1 row of a column, and of scoring 1 sampled value #
+PROFILE_COST_PER_ROW: float = 1.0
+SCORE_COST_PER_VALUE: float = 1.0
+
+
+@dataclass
+class ShardPlan:
+    """Assignment of every unit of work of src.discover.join_keys() (a sample
+    column of one table, compared against every column of another table) to
+    one of `n_shards` shards
+
+    Attributes:
+        n_shards (int): Number of shards
+        tables (dict): {table name: [names of the columns to compare]}, in the
+                        order in which join_keys() would compare them
+        units (list): [sample table, lookup table, sample column, shard index] of
+                        every unit of work, in the order in which join_keys()
+                        would compare them
+        shard_costs (list): Estimated cost of each shard
+        join_keys_params (dict): Parameters which every shard must use (so that
+                        each column is sampled identically in every shard)
+    """
+
+    n_shards: int
+    tables: dict[str, list[str]]
+    units: list[list]
+    shard_costs: list[float]
+    join_keys_params: dict = field(default_factory=dict)
+
+    def shard_units(self, shard_idx: int) -> list[tuple[str, str, str]]:
+        """The (sample table, lookup table, sample column) units of one shard"""
+        return [
+            (sample_tbl_name, lookup_tbl_name, sample_colname)
+            for sample_tbl_name, lookup_tbl_name, sample_colname, unit_shard_idx in (
+                self.units
+            )
+            if unit_shard_idx == shard_idx
+        ]
+
+    def shard_table_names(self, shard_idx: int) -> list[str]:
+        """Names of the tables which one shard reads"""
+        return sorted(
+            {
+                tbl_name
+                for unit in self.shard_units(shard_idx)
+                for tbl_name in unit[:2]
+            }
+        )
+
+    def write(self, filepath: str) -> None:
+        with open(filepath, "w", encoding="utf-8") as file:
+            json.dump(vars(self), file, indent=4)
+
+    @classmethod
+    def load(cls, filepath: str) -> "ShardPlan":
+        with open(filepath, "r", encoding="utf-8") as file:
+            return cls(**json.load(file))
+
+
+def plan_shards(
+    tbl_contents: dict[str, dict],
+    n_shards: int,
+    random_seed: int,
+    n_samples: int = 500,
+    allowed_key_types: tuple[type] = (int, str),
+    engine: str = "python",
+) -> ShardPlan:
+    """Splits the column pairs compared by src.discover.join_keys() into
+    `n_shards` shards of similar estimated cost
+
+    Notes:
+        - The unit of work is a (sample table, lookup table, sample column) i.e.
+            the sample of one column compared against every column of another table
+        - The cost of a unit is the number of sampled values which it scores.
+            Every shard must also profile each column which it reads (a cost
+            proportional to the number of rows in the column), which is only
+            paid once per shard. Units are assigned greedily (most expensive
+            first) to the shard whose total cost would increase the least, so
+            that units which read the same columns tend to share a shard
+        - The plan is deterministic: the same tables and parameters always give
+            the same plan
+        - A fixed `random_seed` is required, since each shard must draw the same
+            sample of each column (see src.discover.column_profile.ColumnProfileCache)
+
+    Args:
+        tbl_contents (dict): The contents of each table (as for join_keys())
+        n_shards (int): Number of shards
+        random_seed (int): Seed for sampling, used by every shard
+        n_samples (int): As for join_keys()
+        allowed_key_types (tuple): As for join_keys()
+        engine (str): As for join_keys()
+
+    Returns:
+        ShardPlan: the plan (write it to a file with ShardPlan.write())
+    """
+    tables: dict[str, list[str]] = {}
+    n_rows: dict[tuple[str, str], int] = {}
+    for tbl_name, cols in tbl_contents.items():
+        tables[tbl_name] = []
+        for col_name, col_values in cols.items():
+            if only_allowed_types(
+                values=col_values, sample_size=50, allowed_types=allowed_key_types
+            ):
+                tables[tbl_name].append(col_name)
+                n_rows[(tbl_name, col_name)] = len(col_values)
+
+    units: list[tuple[str, str, str]] = [
+        (sample_tbl_name, lookup_tbl_name, sample_colname)
+        for sample_tbl_name, lookup_tbl_name in itertools.permutations(tables, r=2)
+        for sample_colname in tables[sample_tbl_name]
+    ]
+
+    def unit_columns(unit: tuple[str, str, str]) -> list[tuple[str, str]]:
+        sample_tbl_name, lookup_tbl_name, sample_colname = unit
+        return [(sample_tbl_name, sample_colname)] + [
+            (lookup_tbl_name, lookup_colname)
+            for lookup_colname in tables[lookup_tbl_name]
+        ]
+
+    def score_cost(unit: tuple[str, str, str]) -> float:
+        sample_tbl_name, lookup_tbl_name, sample_colname = unit
+        return (
+            SCORE_COST_PER_VALUE
+            * min(n_samples, n_rows[(sample_tbl_name, sample_colname)])
+            * len(tables[lookup_tbl_name])
+        )
+
+    shard_costs: list[float] = [0.0] * n_shards
+    shard_columns: list[set[tuple[str, str]]] = [set() for _ in range(n_shards)]
+    unit_shards: dict[tuple[str, str, str], int] = {}
+    for _, unit in sorted(
+        enumerate(units),
+        key=lambda x: (
+            -score_cost(x[1])
+            - PROFILE_COST_PER_ROW * sum(n_rows[col] for col in unit_columns(x[1])),
+            x[0],
+        ),
+    ):
+        best_cost: float | None = None
+        best_shard_idx: int = 0
+        for shard_idx in range(n_shards):
+            cost: float = shard_costs[shard_idx] + score_cost(unit) + sum(
+                PROFILE_COST_PER_ROW * n_rows[col]
+                for col in unit_columns(unit)
+                if col not in shard_columns[shard_idx]
+            )
+            if best_cost is None or cost < best_cost:
+                best_cost, best_shard_idx = cost, shard_idx
+        shard_costs[best_shard_idx] = best_cost
+        shard_columns[best_shard_idx].update(unit_columns(unit))
+        unit_shards[unit] = best_shard_idx
+
+    logger.info(
+        "Planned %s units of work across %s shards (estimated costs %s)",
+        f"{len(units):,}",
+        n_shards,
+        [f"{cost:,.0f}" for cost in shard_costs],
+    )
+    return ShardPlan(
+        n_shards=n_shards,
+        tables=tables,
+        units=[[*unit, unit_shards[unit]] for unit in units],
+        shard_costs=shard_costs,
+        join_keys_params={
+            "n_samples": n_samples,
+            "random_seed": random_seed,
+            "engine": engine,
+            "allowed_key_types": [t.__name__ for t in allowed_key_types],
+        },
+    )
+
+
+@instrument_stage("discover.sharding.run_shard")
+def run_shard(
+    tbl_contents: dict[str, dict],
+    plan: ShardPlan,
+    shard_idx: int,
+    output_path: str,
+    output_format: str = "jsonl",
+    adaptive_sampler: "AdaptiveSampler | None" = None,
+) -> None:
+    """Computes the match records of every unit of work in one shard of `plan`
+
+    Notes:
+        - Records are written in the order in which src.discover.join_keys()
+            would write them, so that merge_shards() can merge the shards
+            without holding them in memory
+        - Only the tables which the shard reads need to be in `tbl_contents`
+
+    Args:
+        tbl_contents (dict): The contents of (at least) the tables of the shard
+        plan (ShardPlan): The output of plan_shards()
+        shard_idx (int): Which shard to run (0, ..., plan.n_shards - 1)
+        output_path (str): Where to write the match records of the shard
+        output_format (str): "json" or "jsonl" (see join_keys())
+        adaptive_sampler (AdaptiveSampler): (optional) As for join_keys() - use
+                        the same sampler in every shard
+    """
+    if not 0 <= shard_idx < plan.n_shards:
+        raise ValueError(f"shard_idx={shard_idx} is not in [0, {plan.n_shards})")
+    profile_cache = ColumnProfileCache(
+        n_samples=plan.join_keys_params["n_samples"],
+        engine=plan.join_keys_params["engine"],
+        random_seed=plan.join_keys_params["random_seed"],
+    )
+    shard_units = plan.shard_units(shard_idx)
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        result_writer = RESULT_WRITERS[output_format](output_file)
+        for unit_idx, (sample_tbl_name, lookup_tbl_name, sample_colname) in enumerate(
+            shard_units, start=1
+        ):
+            unit_results = compare_table_pair(
+                sample_tbl_name=sample_tbl_name,
+                sample_tbl_data={
+                    sample_colname: tbl_contents[sample_tbl_name][sample_colname]
+                },
+                lookup_tbl_name=lookup_tbl_name,
+                lookup_tbl_data={
+                    lookup_colname: tbl_contents[lookup_tbl_name][lookup_colname]
+                    for lookup_colname in plan.tables[lookup_tbl_name]
+                },
+                profile_cache=profile_cache,
+                adaptive_sampler=adaptive_sampler,
+            )
+            for match_pair in unit_results:
+                result_writer.write(match_pair)
+            emit("count", name="column_pairs_written", value=len(unit_results))
+            emit(
+                "progress",
+                stage="discover.sharding.run_shard",
+                n_done=unit_idx,
+                n_total=len(shard_units),
+                unit="units",
+            )
+        result_writer.close()
+    print(
+        f"{datetime.datetime.now().strftime('%H:%M:%S')} Completed shard {shard_idx}"
+        f" ({len(shard_units):,} units)"
+    )
+
+
+@instrument_stage("discover.sharding.merge_shards")
+def merge_shards(
+    plan: ShardPlan,
+    shard_output_paths: list[str],
+    output_path: str,
+    output_format: str = "json",
+) -> None:
+    """Merges the outputs of every shard into a single file of match records, in
+    the same format and order as src.discover.join_keys() (i.e. the input
+    expected by src.decision.join_keys())
+
+    Notes:
+        - The shard outputs are streamed and merged one record at a time (each
+            shard output is already in order), so memory use does not depend on
+            the number of records
+
+    Args:
+        plan (ShardPlan): The plan which the shards were run with
+        shard_output_paths (list): The output of each shard, in shard order
+        output_path (str): Where to write the merged match records
+        output_format (str): "json" or "jsonl" (see join_keys())
+    """
+    if len(shard_output_paths) != plan.n_shards:
+        raise ValueError(
+            f"Expected the outputs of {plan.n_shards} shards,"
+            f" but got {len(shard_output_paths)}"
+        )
+    unit_order: dict[tuple[str, str, str], int] = {
+        (sample_tbl_name, lookup_tbl_name, sample_colname): unit_idx
+        for unit_idx, (sample_tbl_name, lookup_tbl_name, sample_colname, _) in (
+            enumerate(plan.units)
+        )
+    }
+
+    def keyed_records(shard_output_path: str) -> Iterator[tuple[int, dict]]:
+        for match_pair in iter_records(shard_output_path):
+            yield (
+                unit_order[
+                    (
+                        match_pair["sampled_col"]["table_name"],
+                        match_pair["lookup_col"]["table_name"],
+                        match_pair["sampled_col"]["column_name"],
+                    )
+                ],
+                match_pair,
+            )
+
+    n_records: int = 0
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        result_writer = RESULT_WRITERS[output_format](output_file)
+        for _, match_pair in heapq.merge(
+            *(keyed_records(path) for path in shard_output_paths),
+            key=lambda keyed_record: keyed_record[0],
+        ):
+            result_writer.write(match_pair)
+            n_records += 1
+        result_writer.close()
+    emit("count", name="column_pairs_written", value=n_records)
+    logger.info(
+        "Merged %s match records from %s shards into [%s]",
+        f"{n_records:,}",
+        plan.n_shards,
+        output_path,
+    )
+
+
+def run_shards_locally(
+    plan_filepath: str,
+    tables_dir: str,
+    output_dir: str,
+    output_path: str,
+    output_format: str = "json",
+) -> None:
+    """Runs every shard of a plan as a separate process on this machine (all at
+    the same time), and then merges their outputs - i.e. what a cluster of
+    machines would do, for testing
+
+    Args:
+        plan_filepath (str): File written by ShardPlan.write()
+        tables_dir (str): Directory of the tables (see src.transform_data.load_tables())
+        output_dir (str): Directory into which the output of each shard is written
+        output_path (str): Where to write the merged match records
+        output_format (str): "json" or "jsonl" (see join_keys())
+    """
+    plan = ShardPlan.load(plan_filepath)
+    pathlib.Path(output_dir).mkdir(parents=True, exist_ok=True)
+    shard_output_paths: list[str] = [
+        str(pathlib.Path(output_dir) / f"shard_{shard_idx}.jsonl")
+        for shard_idx in range(plan.n_shards)
+    ]
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "src.discover.sharding",
+                "--plan",
+                plan_filepath,
+                "--shard",
+                str(shard_idx),
+                "--tables-dir",
+                tables_dir,
+                "--output-path",
+                shard_output_paths[shard_idx],
+            ]
+        )
+        for shard_idx in range(plan.n_shards)
+    ]
+    for shard_idx, process in enumerate(processes):
+        if process.wait() != 0:
+            raise RuntimeError(
+                f"Shard {shard_idx} failed (exit code {process.returncode})"
+            )
+    merge_shards(
+        plan,
+        shard_output_paths=shard_output_paths,
+        output_path=output_path,
+        output_format=output_format,
+    )
+
+
+def main() -> None:
+    """Command-line entry point which runs a single shard"""
+    import src.transform_data
+
+    parser = argparse.ArgumentParser(
+        prog="python -m src.discover.sharding",
+        description="Runs one shard of a src.discover.sharding.ShardPlan",
+    )
+    parser.add_argument(
+        "--plan", required=True, help="File written by ShardPlan.write()"
+    )
+    parser.add_argument("--shard", required=True, type=int, help="Shard index")
+    parser.add_argument(
+        "--tables-dir",
+        required=True,
+        help="Directory of the tables (see src.transform_data.load_tables())",
+    )
+    parser.add_argument("--output-path", required=True)
+    parser.add_argument("--output-format", default="jsonl", choices=RESULT_WRITERS)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    plan = ShardPlan.load(args.plan)
+    run_shard(
+        tbl_contents=src.transform_data.load_tables(
+            args.tables_dir, table_names=plan.shard_table_names(args.shard)
+        ),
+        plan=plan,
+        shard_idx=args.shard,
+        output_path=args.output_path,
+        output_format=args.output_format,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Defines class src.discover.sketch_pruning.SketchPruner
+"""
+
+import logging
+import random
+from typing import Callable, Iterable
+
+from .sketches import (
+    LSHEnsembleIndex,
+    hash_values,
+    hyperloglog_cardinality,
+    hyperloglog_registers,
+    minhash_permutations,
+    minhash_signature,
+    mix_codes,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SketchPruner:
+    """Optional pre-stage of src.discover.join_keys.join_keys() which uses
+    MinHash/LSH and HyperLogLog sketches to skip column pairs which are unlikely
+    to match, before they are scored exactly
+
+    Notes:
+        - For each sampled column, a MinHash signature and HyperLogLog cardinality
+            estimate is computed over the distinct values in its sample. For each
+            lookup column, the same is computed over all of its distinct values
+        - Lookup signatures are stored in an LSHEnsembleIndex, which is queried
+            with each sampled column's signature to find lookup columns which
+            plausibly contain at least `min_containment` of the sampled values
+            (i.e. "percent any_matches_in_lookup" >= `min_containment`)
+        - Pruned column pairs are left out of the join_keys() output entirely
+        - Recall is estimated by exactly scoring a random sample of (at most)
+            `recall_check_size` of the pruned pairs
+        - `min_containment` is the recall/pruning tradeoff knob: lower values
+            prune less aggressively
+
+    Attributes:
+        report (dict): Pruning statistics of the most recent join_keys() run
+
+    Example:
+        >>> from src.discover.sketch_pruning import SketchPruner
+        >>> pruner = SketchPruner(min_containment=0.1)
+        >>> src.discover.join_keys(tbl_contents=table_data, sketch_pruner=pruner)
+        >>> pruner.report["pruning_ratio"], pruner.report["estimated_recall"]
+        (0.94, 0.99)
+    """
+
+    def __init__(
+        self,
+        min_containment: float = 0.1,
+        num_perm: int = 128,
+        hll_precision: int = 12,
+        recall_check_size: int = 100,
+        seed: int = 0,
+    ) -> None:
+        self.min_containment = min_containment
+        self.num_perm = num_perm
+        self.hll_precision = hll_precision
+        self.recall_check_size = recall_check_size
+        self.seed = seed
+        self.report: dict = {}
+        self._permutations = minhash_permutations(num_perm, seed)
+        self._candidates: dict[tuple[str, str], set[tuple[str, str]]] = {}
+        self._rng = random.Random(seed)
+        self._n_pairs: int = 0
+        self._n_kept_pairs: int = 0
+        self._n_kept_true_pairs: int = 0
+        self._n_pruned_pairs: int = 0
+        self._pruned_pairs_sample: list[tuple[tuple[str, str], tuple[str, str]]] = []
+
+    def _sketch(self, profile, sample_side: bool) -> tuple:
+        """Computes the (MinHash signature, HyperLogLog cardinality) of the
+        distinct values in the sample (or whole) of a profiled column"""
+        if hasattr(profile, "unique_codes"):
+            hashes = mix_codes(
+                profile.sample_codes if sample_side else profile.unique_codes
+            )
+        else:
+            hashes = hash_values(
+                profile.sample_distinct
+                if sample_side
+                else tuple(profile.value_counts.keys())
+            )
+        return (
+            minhash_signature(hashes, self._permutations),
+            hyperloglog_cardinality(
+                hyperloglog_registers(hashes, precision=self.hll_precision)
+            ),
+        )
+
+    def fit(self, column_profiles: Iterable[tuple[tuple[str, str], object]]) -> None:
+        """Sketches every column, and finds the candidate lookup columns of
+        every sampled column
+
+        Args:
+            column_profiles (Iterable): ((table name, column name), profile) of
+                                    each column (e.g. a generator, so that only
+                                    one profile needs to be in memory at a time)
+        """
+        self._n_pairs = self._n_kept_pairs = self._n_kept_true_pairs = 0
+        self._n_pruned_pairs = 0
+        self._pruned_pairs_sample = []
+        index = LSHEnsembleIndex(num_perm=self.num_perm)
+        sample_sketches: dict[tuple[str, str], tuple] = {}
+        for column_key, profile in column_profiles:
+            signature, cardinality = self._sketch(profile, sample_side=False)
+            if profile.n_unique > 0:
+                index.add(column_key, signature, cardinality)
+            sample_sketches[column_key] = self._sketch(profile, sample_side=True)
+        self._candidates = {
+            column_key: index.query(signature, cardinality, self.min_containment)
+            for column_key, (signature, cardinality) in sample_sketches.items()
+        }
+
+    def contains(
+        self, sample_column: tuple[str, str], lookup_column: tuple[str, str]
+    ) -> bool:
+        """Returns True if the pair should be scored exactly"""
+        return lookup_column in self._candidates.get(sample_column, ())
+
+    def is_candidate(
+        self, sample_column: tuple[str, str], lookup_column: tuple[str, str]
+    ) -> bool:
+        """Returns True if the pair should be scored exactly (and records the
+        outcome for the pruning report)"""
+        self._n_pairs += 1
+        if self.contains(sample_column, lookup_column):
+            self._n_kept_pairs += 1
+            return True
+        # reservoir sample of the pruned pairs, for estimating recall #
+        self._n_pruned_pairs += 1
+        if len(self._pruned_pairs_sample) < self.recall_check_size:
+            self._pruned_pairs_sample.append((sample_column, lookup_column))
+        else:
+            replace_idx = self._rng.randrange(self._n_pruned_pairs)
+            if replace_idx < self.recall_check_size:
+                self._pruned_pairs_sample[replace_idx] = (sample_column, lookup_column)
+        return False
+
+    def observe_kept_pair(self, match_record: dict) -> None:
+        """Records the exact outcome of a pair which was not pruned"""
+        percent_any_matches = match_record["matches"]["any_matches_in_lookup"][
+            "percent"
+        ]
+        if (
+            percent_any_matches is not None
+            and percent_any_matches >= self.min_containment
+        ):
+            self._n_kept_true_pairs += 1
+
+    def finalise_report(
+        self, get_profile: Callable[[tuple[str, str]], object], count_matches_func
+    ) -> dict:
+        """Estimates recall by exactly scoring the sample of pruned pairs, and
+        populates `report`
+
+        Args:
+            get_profile (Callable): Returns the profile of a (table name, column name)
+            count_matches_func (Callable): Exact match counting function (see
+                                    src.discover.column_profile.ColumnProfileCache)
+        """
+        n_pruned_true_pairs_found: int = 0
+        for sample_column, lookup_column in self._pruned_pairs_sample:
+            sample_profile = get_profile(sample_column)
+            n_any_matches, _ = count_matches_func(
+                sample_profile, get_profile(lookup_column)
+            )
+            if (
+                sample_profile.sample_n_unique > 0
+                and round(n_any_matches / sample_profile.sample_n_unique, 2)
+                >= self.min_containment
+            ):
+                n_pruned_true_pairs_found += 1
+        n_checked: int = len(self._pruned_pairs_sample)
+        estimated_n_missed = (
+            n_pruned_true_pairs_found / n_checked * self._n_pruned_pairs
+            if n_checked > 0
+            else 0.0
+        )
+        estimated_n_true_pairs = self._n_kept_true_pairs + estimated_n_missed
+        self.report = {
+            "min_containment": self.min_containment,
+            "n_column_pairs": self._n_pairs,
+            "n_candidate_pairs": self._n_kept_pairs,
+            "pruning_ratio": (
+                round(self._n_pruned_pairs / self._n_pairs, 4)
+                if self._n_pairs > 0
+                else None
+            ),
+            "n_candidate_pairs_matching": self._n_kept_true_pairs,
+            "n_pruned_pairs_checked": n_checked,
+            "n_pruned_pairs_checked_matching": n_pruned_true_pairs_found,
+            "estimated_recall": (
+                round(self._n_kept_true_pairs / estimated_n_true_pairs, 4)
+                if estimated_n_true_pairs > 0
+                else None
+            ),
+        }
+        logger.info("Sketch pruning report: %s", self.report)
+        return self.report
@@ -0,0 +1,170 @@
+"""
+Probabilistic column sketches (MinHash signatures, HyperLogLog cardinality
+estimates) and an LSH index over them, used by
+src.discover.sketch_pruning.SketchPruner
+"""
+
+import math
+from collections import defaultdict
+from typing import Hashable
+
+import numpy as np  # pip install numpy
+
+from .hashing import stable_hash64
+
+MERSENNE_PRIME = np.uint64(2**61 - 1)
+MASK32 = np.uint64(2**32 - 1)
+MINHASH_BLOCK_SIZE: int = 4_096
+
+
+def hash_values(values) -> np.ndarray:
+    """Hashes column values to uint64 (see src.discover.hashing.stable_hash64())"""
+    return np.fromiter(
+        (stable_hash64(value) for value in values), dtype=np.uint64, count=len(values)
+    )
+
+
+def mix_codes(codes: np.ndarray) -> np.ndarray:
+    """Hashes (non-negative) integer value codes to uniformly distributed uint64
+    (vectorised SplitMix64 finaliser)"""
+    with np.errstate(over="ignore"):
+        x = codes.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def minhash_permutations(num_perm: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """Generates the parameters (a, b) of `num_perm` hash functions of the form
+    h(x) = (a*x + b) mod p"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signature(
+    hashes: np.ndarray, permutations: tuple[np.ndarray, np.ndarray]
+) -> np.ndarray:
+    """Computes the MinHash signature of a set of (uint64) value hashes"""
+    a, b = permutations
+    signature = np.full(len(a), MERSENNE_PRIME, dtype=np.uint64)
+    hashes32 = (hashes >> np.uint64(32)) ^ (hashes & MASK32)
+    for block_start in range(0, len(hashes32), MINHASH_BLOCK_SIZE):
+        block = hashes32[block_start : block_start + MINHASH_BLOCK_SIZE]
+        permuted = (block[:, np.newaxis] * a + b) % MERSENNE_PRIME
+        signature = np.minimum(signature, permuted.min(axis=0))
+    return signature
+
+
+def hyperloglog_registers(hashes: np.ndarray, precision: int = 12) -> np.ndarray:
+    """Computes the HyperLogLog registers of a set of (uint64) value hashes"""
+    if not 11 <= precision <= 16:
+        raise ValueError("precision must be between 11 and 16")
+    n_value_bits = 64 - precision
+    registers = np.zeros(2**precision, dtype=np.uint8)
+    if len(hashes) == 0:
+        return registers
+    register_idx = (hashes >> np.uint64(n_value_bits)).astype(np.int64)
+    remaining_bits = hashes & np.uint64(2**n_value_bits - 1)
+    # frexp() returns the exact bit length, since the remaining bits fit in a float64
+    _, bit_length = np.frexp(remaining_bits.astype(np.float64))
+    ranks = (n_value_bits - bit_length + 1).astype(np.uint8)
+    np.maximum.at(registers, register_idx, ranks)
+    return registers
+
+
+def hyperloglog_cardinality(registers: np.ndarray) -> float:
+    """Estimates the number of distinct values from HyperLogLog registers"""
+    n_registers = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / n_registers)
+    estimate = (
+        alpha * n_registers**2 / np.sum(np.power(2.0, -registers.astype(np.float64)))
+    )
+    n_zero_registers = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * n_registers and n_zero_registers > 0:
+        return n_registers * math.log(n_registers / n_zero_registers)
+    return float(estimate)
+
+
+class LSHEnsembleIndex:
+    """Locality-sensitive hashing index of MinHash signatures, for finding the
+    indexed sets which (approximately) contain a query set
+
+    Notes:
+        - Containment |Q n X| / |Q| cannot be thresholded directly using banded
+            MinHash LSH (which thresholds Jaccard similarity). Following the
+            "LSH Ensemble" approach, indexed sets are partitioned by cardinality,
+            and each partition is queried with the Jaccard threshold implied by
+            the containment threshold and the partition's largest cardinality
+        - Each partition is indexed with several band sizes (`rows_per_band`),
+            and the most selective band size whose similarity threshold is still
+            below the implied Jaccard threshold is used at query time. Where no
+            band size is permissive enough, every set in the partition is
+            returned (i.e. that partition is not pruned)
+    """
+
+    def __init__(
+        self,
+        num_perm: int,
+        rows_per_band: tuple[int, ...] = (1, 2, 4, 8),
+        partition_base: float = 4.0,
+    ) -> None:
+        self.num_perm = num_perm
+        self.rows_per_band = tuple(r for r in rows_per_band if r <= num_perm)
+        self.partition_base = partition_base
+        self._band_tables: dict[int, dict[int, list[dict[bytes, list]]]] = {}
+        self._partition_keys: dict[int, list] = defaultdict(list)
+
+    def _partition(self, cardinality: float) -> int:
+        return int(math.log(max(cardinality, 1.0), self.partition_base))
+
+    def _band_threshold(self, rows: int) -> float:
+        """Approximate Jaccard similarity at which the S-curve of banded LSH
+        (with `rows` rows per band) rises steeply"""
+        return (1 / (self.num_perm // rows)) ** (1 / rows)
+
+    def add(self, key: Hashable, signature: np.ndarray, cardinality: float) -> None:
+        partition = self._partition(cardinality)
+        if partition not in self._band_tables:
+            self._band_tables[partition] = {
+                rows: [defaultdict(list) for _ in range(self.num_perm // rows)]
+                for rows in self.rows_per_band
+            }
+        for rows, bands in self._band_tables[partition].items():
+            for band_idx, band in enumerate(bands):
+                band[signature[band_idx * rows : (band_idx + 1) * rows].tobytes()].append(
+                    key
+                )
+        self._partition_keys[partition].append(key)
+
+    def query(
+        self, signature: np.ndarray, cardinality: float, min_containment: float
+    ) -> set:
+        """Returns the keys of indexed sets which plausibly contain at least
+        `min_containment` of the query set"""
+        matches: set = set()
+        query_size = max(cardinality, 1.0)
+        for partition, band_tables in self._band_tables.items():
+            max_size = self.partition_base ** (partition + 1)
+            if max_size < min_containment * query_size:
+                continue
+            jaccard_threshold = (min_containment * query_size) / (
+                query_size + max_size - min_containment * query_size
+            )
+            usable_rows = [
+                rows
+                for rows in self.rows_per_band
+                if self._band_threshold(rows) <= jaccard_threshold
+            ]
+            if len(usable_rows) == 0:
+                matches.update(self._partition_keys[partition])
+                continue
+            rows = max(usable_rows)
+            for band_idx, band in enumerate(band_tables[rows]):
+                matches.update(
+                    band.get(
+                        signature[band_idx * rows : (band_idx + 1) * rows].tobytes(), ()
+                    )
+                )
+        return matches
@@ -1,2 +1,3 @@
-
 from .create_db import create_db
+from .path_index import TablePathIndex
+from .path_store import PathStore
@@ -2,45 +2,90 @@
 Function src.discover.table_links.create_db.create_db()
 """
 
-import json
 import logging
 import pickle
 import rustworkx as rx  # pip install rustworkx
 
+from src.instrumentation import emit, instrument_stage
+
+from .path_index import TablePathIndex, format_path, iter_simple_paths
+from .path_store import PathStore
+
 logger = logging.getLogger(__name__)
 
 
+@instrument_stage("discover.table_links.create_db")
 def create_db(
-    input_data_filepath: str, max_path_len: int, output_filepath: str
-) -> None:
-    """Disovers all pathes between tables and writes this information into a .JSON file
+    input_data_filepath: str,
+    max_path_len: int,
+    output_filepath: str | None = None,
+    output_format: str = "pickle",
+) -> TablePathIndex:
+    """Disovers all pathes between tables and (optionally) writes this information
+    into a .pickle file or a SQLite path store
 
     Notes: builds a graph in which every table/column pair is a node,
             and then traverses this graph to find joining paths
+
+    Args:
+        input_data_filepath (str): .json file containing identified join columns
+                (this file created by src.decision.join_keys.join_keys())
+        max_path_len (int): Maximum number of nodes in a path
+        output_filepath (str): (optional) If provided, every path between every
+                pair of tables is enumerated up front, and written to this
+                .pickle file. This is expensive on densely connected databases -
+                if only a few table pairs are of interest, query the returned
+                index instead
+        output_format (str): One of
+                "pickle": a pickled dict of {(source table, destination table):
+                    set of paths}
+                "sqlite": an indexed SQLite database (see
+                    src.discover.table_links.path_store.PathStore). Paths are
+                    written in batches as they are generated, so memory use
+                    does not depend on the number of paths
+
+    Returns:
+        TablePathIndex: on-demand (cached) path queries between pairs of tables
+                (see src.discover.table_links.path_index.TablePathIndex)
     """
-    logger.info("Loading input data from [%s]", input_data_filepath)
-    with open(input_data_filepath, "r", encoding="utf-8") as file:
-        col_pairs = json.load(file)
+    if output_format not in ("pickle", "sqlite"):
+        raise ValueError(
+            f"Unknown output_format '{output_format}' (expected 'pickle' or 'sqlite')"
+        )
 
     logger.info("Building graph")
-    gph = rx.PyGraph()
-    node_name_to_idx: dict[str, int] = {}
-    node_idx_to_name: dict[int, str] = {}
-    edge_name_to_idx: dict[str, int] = {}
-    for (t1, c1), (t2, c2) in col_pairs:
-        # add nodes to graph if they aren't there
-        for node_tbl, node_col in ((t1, c1), (t2, c2)):
-            node_name = f"{node_tbl}::{node_col}"
-            if node_name not in node_name_to_idx:
-                assigned_idx = gph.add_node(node_name)
-                node_name_to_idx[node_name] = assigned_idx
-                node_idx_to_name[assigned_idx] = node_name
-        # add edge if it isn't there
-        edge_name = " -> ".join(sorted([f"{t1}::{c1}", f"{t2}::{c2}"]))
-        if edge_name not in edge_name_to_idx:
-            edge_name_to_idx[edge_name] = gph.add_edge(
-                node_name_to_idx[f"{t1}::{c1}"], node_name_to_idx[f"{t2}::{c2}"], None
+    path_index = TablePathIndex.from_file(input_data_filepath, max_path_len)
+    if output_filepath is None:
+        return path_index
+
+    gph = path_index.graph
+    if output_format == "sqlite":
+        logger.info("Generating paths between nodes into [%s]", output_filepath)
+        path_store = PathStore(output_filepath)
+        path_store.clear()
+        src_node_indices = gph.node_indices()
+        for src_node_num, src_node_idx in enumerate(src_node_indices, start=1):
+            src_table_name = gph[src_node_idx].split("::")[0]
+            n_node_paths: int = 0
+            for path in iter_simple_paths(gph, src_node_idx, max_path_len):
+                n_node_paths += 1
+                path_str = format_path([gph[node_idx] for node_idx in path])
+                path_store.add_path(
+                    src_table_name,
+                    gph[path[-1]].split("::")[0],
+                    path_str,
+                    path_str.count(" -> ") + 1,
+                )
+            emit("count", name="paths_generated", value=n_node_paths)
+            emit(
+                "progress",
+                stage="discover.table_links.create_db",
+                n_done=src_node_num,
+                n_total=len(src_node_indices),
+                unit="source columns",
             )
+        path_store.close()
+        return path_index
 
     logger.info("Generating paths between nodes")
     all_pairs_all_simple_paths = rx.all_pairs_all_simple_paths(
@@ -49,26 +94,18 @@ def create_db(
     )
     all_node_paths: dict[tuple, set] = {}
     for src_node_idx, many_paths in all_pairs_all_simple_paths.items():
-        src_table_name = node_idx_to_name[src_node_idx].split("::")[0]
+        src_table_name = gph[src_node_idx].split("::")[0]
         for dest_node_idx, paths in many_paths.items():
-            dest_table_name = node_idx_to_name[dest_node_idx].split("::")[0]
+            dest_table_name = gph[dest_node_idx].split("::")[0]
             if (src_table_name, dest_table_name) not in all_node_paths:
                 all_node_paths[(src_table_name, dest_table_name)] = set()
+            emit("count", name="paths_generated", value=len(paths))
             for path in paths:
-                path_str = node_idx_to_name[path[0]]
-                src_colname = node_idx_to_name[path[0]].split("::")[1]
-                dest_colname = node_idx_to_name[path[-1]].split("::")[1]
-                if src_colname == dest_colname:
-                    path_str += f" -> {node_idx_to_name[path[-1]]}"
-                else:
-                    for idx in range(1, len(path) - 1):
-                        src_colname = node_idx_to_name[path[idx - 1]].split("::")[1]
-                        dest_colname = node_idx_to_name[path[idx]].split("::")[1]
-                        if src_colname != dest_colname:
-                            path_str += f" -> {node_idx_to_name[path[idx]]}"
-                    path_str += f" -> {node_idx_to_name[path[-1]]}"
-                all_node_paths[(src_table_name, dest_table_name)].add(path_str)
+                all_node_paths[(src_table_name, dest_table_name)].add(
+                    format_path([gph[node_idx] for node_idx in path])
+                )
 
     logger.info("Writing output to [%s]", output_filepath)
     with open(output_filepath, "wb") as file:
         pickle.dump(all_node_paths, file, pickle.HIGHEST_PROTOCOL)
+    return path_index
@@ -0,0 +1,230 @@
+"""
+Defines class src.discover.table_links.path_index.TablePathIndex
+"""
+
+import json
+import logging
+from collections import OrderedDict
+from typing import Iterator
+
+import rustworkx as rx  # pip install rustworkx
+
+logger = logging.getLogger(__name__)
+
+
+def node_name(tbl_name: str, col_name: str) -> str:
+    """Name of the graph node of a table column"""
+    return f"{tbl_name}::{col_name}"
+
+
+def format_path(path_node_names: list[str]) -> str:
+    """Formats a path of column nodes as a string, leaving out the intermediate
+    nodes at which the path continues along the same column name
+    e.g. "users::id -> orders::user_id -> payments::user_id"
+    """
+    path_str = path_node_names[0]
+    src_colname = path_node_names[0].split("::")[1]
+    dest_colname = path_node_names[-1].split("::")[1]
+    if src_colname != dest_colname:
+        for idx in range(1, len(path_node_names) - 1):
+            prev_colname = path_node_names[idx - 1].split("::")[1]
+            colname = path_node_names[idx].split("::")[1]
+            if prev_colname != colname:
+                path_str += f" -> {path_node_names[idx]}"
+    path_str += f" -> {path_node_names[-1]}"
+    return path_str
+
+
+def build_column_graph(col_pairs: list) -> tuple[rx.PyGraph, dict[str, int]]:
+    """Builds a graph in which every table/column pair is a node, and every
+    join key pair is an edge
+
+    Returns:
+        tuple: (graph, {node name: node index})
+    """
+    gph = rx.PyGraph()
+    node_name_to_idx: dict[str, int] = {}
+    edge_names: set[str] = set()
+    for (t1, c1), (t2, c2) in col_pairs:
+        # add nodes to graph if they aren't there
+        for node_tbl, node_col in ((t1, c1), (t2, c2)):
+            name = node_name(node_tbl, node_col)
+            if name not in node_name_to_idx:
+                node_name_to_idx[name] = gph.add_node(name)
+        # add edge if it isn't there
+        edge_name = " -> ".join(sorted([node_name(t1, c1), node_name(t2, c2)]))
+        if edge_name not in edge_names:
+            edge_names.add(edge_name)
+            gph.add_edge(
+                node_name_to_idx[node_name(t1, c1)],
+                node_name_to_idx[node_name(t2, c2)],
+                None,
+            )
+    return gph, node_name_to_idx
+
+
+def iter_simple_paths(
+    gph: rx.PyGraph, src_node_idx: int, max_path_len: int
+) -> Iterator[list[int]]:
+    """Yields every simple path (of 2 to `max_path_len` nodes) starting at node
+    `src_node_idx` (depth-first, so that memory use does not depend on the number
+    of paths)"""
+    path: list[int] = [src_node_idx]
+    on_path: set[int] = {src_node_idx}
+    neighbour_iters: list[Iterator[int]] = [iter(gph.neighbors(src_node_idx))]
+    while len(neighbour_iters) > 0:
+        next_node_idx = next(neighbour_iters[-1], None)
+        if next_node_idx is None:
+            neighbour_iters.pop()
+            on_path.discard(path.pop())
+            continue
+        if next_node_idx in on_path:
+            continue
+        path.append(next_node_idx)
+        yield path
+        if len(path) < max_path_len:
+            on_path.add(next_node_idx)
+            neighbour_iters.append(iter(gph.neighbors(next_node_idx)))
+        else:
+            path.pop()
+
+
+class TablePathIndex:
+    """Answers "how can table A be joined to table B?" on demand, instead of
+    enumerating the paths between every pair of tables up front
+
+    Notes:
+        - Paths are found on the same graph (and formatted in the same way) as in
+            src.discover.table_links.create_db(), and a path may contain at most
+            `max_path_len` nodes
+        - A query only explores paths which start in the source table and can
+            still reach the destination table within `max_path_len` nodes, in
+            order of increasing length, and stops as soon as `k` paths are found
+        - The results of the most recent `max_cached_queries` queries are cached
+            (least-recently-used entries are evicted first)
+
+    Attributes:
+        graph (rx.PyGraph): Column graph (node payloads are "table::column" names)
+        n_hits (int): Number of queries answered from the cache
+        n_misses (int): Number of queries which searched the graph
+
+    Example:
+        >>> path_index = TablePathIndex.from_file(
+        ...     "output/decision/join_keys/identified_join_keys.json", max_path_len=4
+        ... )
+        >>> path_index.paths("users", "payments", k=2)
+        ['users::id -> payments::user_id',
+         'users::id -> orders::user_id -> payments::user_id']
+    """
+
+    def __init__(
+        self, col_pairs: list, max_path_len: int, max_cached_queries: int = 256
+    ) -> None:
+        self.max_path_len = max_path_len
+        self.max_cached_queries = max_cached_queries
+        self.graph, self._node_name_to_idx = build_column_graph(col_pairs)
+        self._table_nodes: dict[str, list[int]] = {}
+        for name, node_idx in self._node_name_to_idx.items():
+            self._table_nodes.setdefault(name.split("::")[0], []).append(node_idx)
+        self._cache: OrderedDict[tuple, list[str]] = OrderedDict()
+        self.n_hits: int = 0
+        self.n_misses: int = 0
+
+    @classmethod
+    def from_file(
+        cls, input_data_filepath: str, max_path_len: int, max_cached_queries: int = 256
+    ) -> "TablePathIndex":
+        """Builds the index from the output of src.decision.join_keys.join_keys()"""
+        logger.info("Loading input data from [%s]", input_data_filepath)
+        with open(input_data_filepath, "r", encoding="utf-8") as file:
+            col_pairs = json.load(file)
+        return cls(col_pairs, max_path_len, max_cached_queries)
+
+    @property
+    def tables(self) -> list[str]:
+        """Names of the tables which have at least 1 join key"""
+        return list(self._table_nodes)
+
+    def clear(self) -> None:
+        """Empties the query cache"""
+        self._cache.clear()
+
+    def _distances_to(self, dest_nodes: list[int]) -> dict[int, int]:
+        """Number of edges from each node to the nearest of `dest_nodes` (only
+        nodes within `max_path_len`-1 edges are included)"""
+        distances: dict[int, int] = {node_idx: 0 for node_idx in dest_nodes}
+        frontier: list[int] = list(dest_nodes)
+        for distance in range(1, self.max_path_len):
+            next_frontier: list[int] = []
+            for node_idx in frontier:
+                for neighbour_idx in self.graph.neighbors(node_idx):
+                    if neighbour_idx not in distances:
+                        distances[neighbour_idx] = distance
+                        next_frontier.append(neighbour_idx)
+            frontier = next_frontier
+        return distances
+
+    def _search(
+        self, src_tbl_name: str, dest_tbl_name: str, k: int | None
+    ) -> list[str]:
+        dest_nodes: list[int] = self._table_nodes.get(dest_tbl_name, [])
+        dest_node_set: set[int] = set(dest_nodes)
+        distances: dict[int, int] = self._distances_to(dest_nodes)
+        found: list[str] = []
+        found_set: set[str] = set()
+        partial_paths: list[tuple[int, ...]] = [
+            (node_idx,)
+            for node_idx in self._table_nodes.get(src_tbl_name, [])
+            if node_idx in distances
+        ]
+        for n_nodes in range(2, self.max_path_len + 1):
+            next_partial_paths: list[tuple[int, ...]] = []
+            completed_paths: list[str] = []
+            for path in partial_paths:
+                for neighbour_idx in self.graph.neighbors(path[-1]):
+                    if (
+                        neighbour_idx in path
+                        or distances.get(neighbour_idx, self.max_path_len)
+                        > self.max_path_len - n_nodes
+                    ):
+                        continue
+                    extended_path = path + (neighbour_idx,)
+                    if neighbour_idx in dest_node_set:
+                        completed_paths.append(
+                            format_path([self.graph[idx] for idx in extended_path])
+                        )
+                    next_partial_paths.append(extended_path)
+            for path_str in sorted(set(completed_paths) - found_set):
+                found.append(path_str)
+                found_set.add(path_str)
+                if k is not None and len(found) == k:
+                    return found
+            partial_paths = next_partial_paths
+        return found
+
+    def paths(
+        self, src_tbl_name: str, dest_tbl_name: str, k: int | None = 10
+    ) -> list[str]:
+        """Returns the `k` shortest join paths from table `src_tbl_name` to table
+        `dest_tbl_name` (shortest first, ties in alphabetical order)
+
+        Args:
+            src_tbl_name (str): Table to start from
+            dest_tbl_name (str): Table to end at
+            k (int): Maximum number of paths to return (None returns every path
+                        of at most `max_path_len` nodes)
+
+        Returns:
+            list: paths, formatted as in src.discover.table_links.create_db()
+        """
+        cache_key = (src_tbl_name, dest_tbl_name, k)
+        if cache_key in self._cache:
+            self._cache.move_to_end(cache_key)
+            self.n_hits += 1
+            return list(self._cache[cache_key])
+        self.n_misses += 1
+        found = self._search(src_tbl_name, dest_tbl_name, k)
+        self._cache[cache_key] = found
+        while len(self._cache) > self.max_cached_queries:
+            self._cache.popitem(last=False)
+        return list(found)
@@ -0,0 +1,130 @@
+"""
+Defines class src.discover.table_links.path_store.PathStore
+"""
+
+import pathlib
+import sqlite3
+from typing import Iterator
+
+SQLITE_SUFFIXES: tuple[str, ...] = (".db", ".sqlite", ".sqlite3")
+
+
+class PathStore:
+    """Indexed SQLite store of the paths between tables found by
+    src.discover.table_links.create_db()
+
+    Notes:
+        - Each path is stored once per (source table, destination table), together
+            with its length (the number of table columns in the formatted path)
+        - Paths are inserted in batches of `batch_size`, one transaction per batch,
+            so memory use does not depend on the number of paths
+        - The primary key makes "all paths from table X" (and from table X to
+            table Y) an indexed lookup, and a second index does the same for
+            "all paths to table Y"
+
+    Example:
+        >>> store = PathStore("output/discover/table_links/create_db/table_link_paths.db")
+        >>> for row in store.iter_paths(source_table="users"):
+        ...     print(row["path"])
+        >>> store.close()
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 10_000) -> None:
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._pending_rows: list[tuple[str, str, str, int]] = []
+        self._con = sqlite3.connect(db_path)
+        self._con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS table_link_paths (
+                source_table        TEXT NOT NULL,
+                destination_table   TEXT NOT NULL,
+                path                TEXT NOT NULL,
+                path_len            INTEGER NOT NULL,
+                PRIMARY KEY (source_table, destination_table, path)
+            ) WITHOUT ROWID
+            """
+        )
+        self._con.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_table_link_paths_destination
+            ON table_link_paths (destination_table, source_table)
+            """
+        )
+        self._con.commit()
+
+    def add_path(
+        self, src_tbl_name: str, dest_tbl_name: str, path: str, path_len: int
+    ) -> None:
+        """Queues a path for insertion (duplicates are ignored), writing the
+        queue to the store once it reaches `batch_size` paths"""
+        self._pending_rows.append((src_tbl_name, dest_tbl_name, path, path_len))
+        if len(self._pending_rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes all queued paths to the store (in a single transaction)"""
+        if len(self._pending_rows) == 0:
+            return
+        with self._con:
+            self._con.executemany(
+                "INSERT OR IGNORE INTO table_link_paths VALUES (?, ?, ?, ?)",
+                self._pending_rows,
+            )
+        self._pending_rows = []
+
+    def clear(self) -> None:
+        """Deletes every stored path"""
+        self._pending_rows = []
+        with self._con:
+            self._con.execute("DELETE FROM table_link_paths")
+
+    def close(self) -> None:
+        self.flush()
+        self._con.close()
+
+    def iter_paths(
+        self,
+        source_table: str | None = None,
+        destination_table: str | None = None,
+        max_path_len: int | None = None,
+    ) -> Iterator[dict]:
+        """Streams the stored paths (optionally only those from `source_table`,
+        to `destination_table` and/or of at most `max_path_len` columns) from a
+        cursor, in (source table, destination table, path) order
+
+        Yields:
+            dict: {"source_table", "destination_table", "path", "path_len"}
+        """
+        self.flush()
+        conditions: list[str] = []
+        params: list = []
+        for condition, param in (
+            ("source_table = ?", source_table),
+            ("destination_table = ?", destination_table),
+            ("path_len <= ?", max_path_len),
+        ):
+            if param is not None:
+                conditions.append(condition)
+                params.append(param)
+        cursor = self._con.execute(
+            f"""
+            SELECT      source_table, destination_table, path, path_len
+            FROM        table_link_paths
+            {"WHERE " + " AND ".join(conditions) if len(conditions) > 0 else ""}
+            ORDER BY    source_table, destination_table, path
+            """,
+            params,
+        )
+        for src_tbl_name, dest_tbl_name, path, path_len in cursor:
+            yield {
+                "source_table": src_tbl_name,
+                "destination_table": dest_tbl_name,
+                "path": path,
+                "path_len": path_len,
+            }
+
+
+def is_path_store_file(filepath: str) -> bool:
+    """True if `filepath` names a PathStore (rather than a .pickle file)"""
+    return pathlib.Path(filepath).suffix in SQLITE_SUFFIXES
@@ -0,0 +1,2 @@
+from .hooks import add_hook, emit, hooks_active, instrument_stage, remove_hook
+from .metrics_recorder import MetricsRecorder
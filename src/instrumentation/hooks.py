@@ -0,0 +1,99 @@
+"""
+Instrumentation hooks: pipeline stages emit events (stage start/end, counts,
+progress, per-pair timings) to every registered hook
+
+Notes:
+    - If no hook is registered, emitting an event costs a single list check,
+        so stage functions are always instrumented
+"""
+
+import functools
+import logging
+import sys
+import time
+from typing import Callable
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_hooks: list[Callable[[dict], None]] = []
+
+
+def add_hook(hook: Callable[[dict], None]) -> None:
+    """Registers a function which is called with every emitted event (a dict
+    with at least an "event" key)"""
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[dict], None]) -> None:
+    _hooks.remove(hook)
+
+
+def hooks_active() -> bool:
+    """True if any hook is registered (use to skip expensive measurements)"""
+    return len(_hooks) > 0
+
+
+def emit(event: str, **fields) -> None:
+    """Sends an event to every registered hook"""
+    if len(_hooks) == 0:
+        return
+    event_dict: dict = {"event": event, "time": time.time(), **fields}
+    for hook in list(_hooks):
+        try:
+            hook(event_dict)
+        except Exception:  # a broken hook must never break the pipeline
+            logger.exception("Instrumentation hook %r failed", hook)
+
+
+def _max_rss_mb(who: int) -> float:
+    # ru_maxrss is in bytes on macOS, and in KiB elsewhere #
+    max_rss: int = resource.getrusage(who).ru_maxrss
+    return max_rss / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def peak_rss_mb() -> float | None:
+    """Peak resident set size so far of this process, in MiB (None where this is
+    not available)"""
+    if resource is None:
+        return None
+    return _max_rss_mb(resource.RUSAGE_SELF)
+
+
+def peak_children_rss_mb() -> float | None:
+    """Peak resident set size of the largest single (finished) child process of
+    this process, in MiB (None where this is not available)"""
+    if resource is None:
+        return None
+    return _max_rss_mb(resource.RUSAGE_CHILDREN)
+
+
+def instrument_stage(stage_name: str) -> Callable:
+    """Decorator which emits "stage_start" and "stage_end" events (with wall time,
+    and the peak RSS of this process and of its largest child process) around every call of a pipeline stage function"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if len(_hooks) == 0:
+                return func(*args, **kwargs)
+            emit("stage_start", stage=stage_name)
+            start_time: float = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                emit(
+                    "stage_end",
+                    stage=stage_name,
+                    seconds=time.perf_counter() - start_time,
+                    peak_rss_mb=peak_rss_mb(),
+                    peak_children_rss_mb=peak_children_rss_mb(),
+                )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,207 @@
+"""
+Defines class src.instrumentation.metrics_recorder.MetricsRecorder
+"""
+
+import heapq
+import json
+import logging
+import time
+from collections import Counter
+
+from .hooks import add_hook, peak_children_rss_mb, peak_rss_mb, remove_hook
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsRecorder:
+    """Instrumentation hook which collects the events emitted by the pipeline
+    stages into a machine-readable metrics summary
+
+    Notes:
+        - Per stage: wall time, peak RSS at the end of the stage (of the
+            process, and separately of its largest finished child process) and
+            counts (e.g. rows read,
+            values profiled, column pairs scored)
+        - Per column pair: scoring time, keeping the `slowest_n` slowest pairs.
+            Likewise, the profiling time of the `slowest_n` slowest columns is
+            kept (pairs and columns handled in worker processes i.e.
+            join_keys(workers>1) are not timed individually)
+        - Progress events are logged (at most every `progress_interval_seconds`)
+            with the throughput so far and the estimated time remaining
+        - Counts are attributed to the innermost stage which is running
+
+    Attributes:
+        stages (list): One dict per finished stage
+        slowest_pairs (list): The `slowest_n` slowest column pairs (slowest first)
+        slowest_columns (list): The `slowest_n` slowest columns to profile
+
+    Example:
+        >>> from src.instrumentation import MetricsRecorder
+        >>> with MetricsRecorder(output_filepath="output/metrics/join_keys.json"):
+        ...     src.discover.join_keys(tbl_contents=table_data)
+    """
+
+    def __init__(
+        self,
+        output_filepath: str | None = None,
+        slowest_n: int = 20,
+        progress_interval_seconds: float = 10.0,
+    ) -> None:
+        self.output_filepath = output_filepath
+        self.slowest_n = slowest_n
+        self.progress_interval_seconds = progress_interval_seconds
+        self.stages: list[dict] = []
+        self._running_stages: list[dict] = []
+        self._slowest_pairs_heap: list[tuple[float, int, dict]] = []
+        self._slowest_columns_heap: list[tuple[float, int, dict]] = []
+        self._n_pairs_timed: int = 0
+        self._total_pair_seconds: float = 0.0
+        self._n_columns_timed: int = 0
+        self._total_column_seconds: float = 0.0
+        self._last_progress_log: dict[str, float] = {}
+
+    @property
+    def slowest_pairs(self) -> list[dict]:
+        return [
+            pair for _, _, pair in sorted(self._slowest_pairs_heap, reverse=True)
+        ]
+
+    @property
+    def slowest_columns(self) -> list[dict]:
+        return [
+            column
+            for _, _, column in sorted(self._slowest_columns_heap, reverse=True)
+        ]
+
+    def _keep_if_slow(
+        self, heap: list[tuple[float, int, dict]], seconds: float, entry: dict
+    ) -> None:
+        """Keeps the `slowest_n` entries with the largest `seconds` in `heap`"""
+        heap_entry = (seconds, self._n_pairs_timed + self._n_columns_timed, entry)
+        if len(heap) < self.slowest_n:
+            heapq.heappush(heap, heap_entry)
+        elif seconds > heap[0][0]:
+            heapq.heapreplace(heap, heap_entry)
+
+    def __call__(self, event: dict) -> None:
+        handler = getattr(self, f"_on_{event['event']}", None)
+        if handler is not None:
+            handler(event)
+
+    def __enter__(self) -> "MetricsRecorder":
+        add_hook(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        remove_hook(self)
+        if self.output_filepath is not None:
+            self.write(self.output_filepath)
+
+    def _on_stage_start(self, event: dict) -> None:
+        self._running_stages.append(
+            {"stage": event["stage"], "start_time": event["time"], "counts": Counter()}
+        )
+
+    def _on_stage_end(self, event: dict) -> None:
+        stage = self._running_stages.pop()
+        self.stages.append(
+            {
+                "stage": stage["stage"],
+                "seconds": round(event["seconds"], 4),
+                "peak_rss_mb": (
+                    None
+                    if event["peak_rss_mb"] is None
+                    else round(event["peak_rss_mb"], 1)
+                ),
+                "peak_children_rss_mb": (
+                    None
+                    if event["peak_children_rss_mb"] is None
+                    else round(event["peak_children_rss_mb"], 1)
+                ),
+                "counts": dict(stage["counts"]),
+            }
+        )
+        logger.info("Stage metrics: %s", self.stages[-1])
+
+    def _on_count(self, event: dict) -> None:
+        if len(self._running_stages) > 0:
+            self._running_stages[-1]["counts"][event["name"]] += event["value"]
+
+    def _on_pair_scored(self, event: dict) -> None:
+        self._n_pairs_timed += 1
+        self._total_pair_seconds += event["seconds"]
+        self._keep_if_slow(
+            self._slowest_pairs_heap,
+            event["seconds"],
+            {
+                "sample_column": event["sample_column"],
+                "lookup_column": event["lookup_column"],
+                "seconds": round(event["seconds"], 6),
+                "n_values": event.get("n_values"),
+            },
+        )
+
+    def _on_column_profiled(self, event: dict) -> None:
+        self._n_columns_timed += 1
+        self._total_column_seconds += event["seconds"]
+        self._keep_if_slow(
+            self._slowest_columns_heap,
+            event["seconds"],
+            {
+                "column": event["column"],
+                "seconds": round(event["seconds"], 6),
+                "n_values": event.get("n_values"),
+            },
+        )
+
+    def _on_progress(self, event: dict) -> None:
+        stage = event["stage"]
+        n_done, n_total = event["n_done"], event["n_total"]
+        last_log_time = self._last_progress_log.get(stage)
+        if (
+            n_done < n_total
+            and last_log_time is not None
+            and event["time"] - last_log_time < self.progress_interval_seconds
+        ):
+            return
+        self._last_progress_log[stage] = event["time"]
+        running_stage = next(
+            (s for s in reversed(self._running_stages) if s["stage"] == stage), None
+        )
+        if running_stage is None:
+            return
+        elapsed_seconds: float = max(
+            event["time"] - running_stage["start_time"], 1e-9
+        )
+        throughput: float = n_done / elapsed_seconds
+        eta_seconds = (n_total - n_done) / throughput if throughput > 0 else None
+        logger.info(
+            "[%s] %s of %s %s (%.1f per second, ETA %s)",
+            stage,
+            f"{n_done:,}",
+            f"{n_total:,}",
+            event.get("unit", "items"),
+            throughput,
+            "unknown" if eta_seconds is None else f"{eta_seconds:,.0f} seconds",
+        )
+
+    def summary(self) -> dict:
+        """Returns all recorded metrics"""
+        return {
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_children_rss_mb": peak_children_rss_mb(),
+            "stages": self.stages,
+            "n_pairs_timed": self._n_pairs_timed,
+            "total_pair_seconds": round(self._total_pair_seconds, 4),
+            "slowest_pairs": self.slowest_pairs,
+            "n_columns_timed": self._n_columns_timed,
+            "total_column_seconds": round(self._total_column_seconds, 4),
+            "slowest_columns": self.slowest_columns,
+        }
+
+    def write(self, output_filepath: str) -> None:
+        """Writes the recorded metrics to a .json file"""
+        with open(output_filepath, "w", encoding="utf-8") as file:
+            json.dump(self.summary(), file, indent=4)
+        logger.info("Wrote metrics to [%s]", output_filepath)
@@ -1 +1,3 @@
 from .fetch_from_dict import fetch_from_dict
+from .flatten_dict import flatten_dict
+from .iter_records import iter_records
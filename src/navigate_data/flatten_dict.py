@@ -0,0 +1,19 @@
+"""
+Function src.navigate_data.flatten_dict.flatten_dict()
+"""
+
+
+def flatten_dict(dct: dict, prefix: tuple = ()) -> dict[tuple, object]:
+    """Flattens a nested dict into {(key, nested_key, ...): leaf value}
+
+    Example:
+        >>> flatten_dict({"matches": {"any": 3, "exactly_1": 2}, "table": "users"})
+        {('matches', 'any'): 3, ('matches', 'exactly_1'): 2, ('table',): 'users'}
+    """
+    flat: dict[tuple, object] = {}
+    for key, value in dct.items():
+        if isinstance(value, dict):
+            flat.update(flatten_dict(value, prefix + (key,)))
+        else:
+            flat[prefix + (key,)] = value
+    return flat
@@ -0,0 +1,79 @@
+"""
+Function src.navigate_data.iter_records.iter_records()
+"""
+
+import json
+import pathlib
+from typing import Any, Iterator
+
+READ_CHUNK_SIZE: int = 1_048_576
+
+
+def iter_records(filepath: str) -> Iterator[Any]:
+    """Streams the records in a .jsonl file (one JSON value per line), or the
+    elements of the top-level array in a .json file, one at a time (memory use
+    does not depend on the number of records)
+
+    Args:
+        filepath (str): Path to a .jsonl file, or a .json file containing an array
+
+    Example:
+        >>> for match_pair in iter_records("output/discover/join_keys/all_matches.jsonl"):
+        ...     print(match_pair["sampled_col"]["table_name"])
+    """
+    if pathlib.Path(filepath).suffix == ".jsonl":
+        with open(filepath, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip() != "":
+                    yield json.loads(line)
+        return
+
+    decoder = json.JSONDecoder()
+    with open(filepath, "r", encoding="utf-8") as file:
+        buffer: str = ""
+        pos: int = 0
+        is_eof: bool = False
+        started: bool = False
+
+        def next_char() -> str:
+            """Skips whitespace (reading more of the file if required) and returns
+            the next character (or "" at end of file)"""
+            nonlocal buffer, pos, is_eof
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer) or is_eof:
+                    return buffer[pos] if pos < len(buffer) else ""
+                chunk = file.read(READ_CHUNK_SIZE)
+                buffer, pos, is_eof = buffer[pos:] + chunk, 0, chunk == ""
+
+        if next_char() != "[":
+            raise ValueError(f"[{filepath}] does not contain a JSON array")
+        pos += 1
+        while True:
+            char = next_char()
+            if char == "]":
+                return
+            if char == "":
+                raise ValueError(f"[{filepath}] ended before the JSON array was closed")
+            if started:
+                if char != ",":
+                    raise ValueError(f"Expected ',' in [{filepath}]")
+                pos += 1
+                next_char()
+            while True:
+                try:
+                    value, end_pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    value, end_pos = None, None
+                # a value which ends exactly at the end of the buffer may be truncated
+                # (e.g. a number), so it is only accepted once more data has been read
+                if end_pos is not None and (end_pos < len(buffer) or is_eof):
+                    break
+                if is_eof:
+                    raise ValueError(f"[{filepath}] contains invalid JSON")
+                chunk = file.read(READ_CHUNK_SIZE)
+                buffer, pos, is_eof = buffer[pos:] + chunk, 0, chunk == ""
+            pos = end_pos
+            started = True
+            yield value
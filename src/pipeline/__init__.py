@@ -0,0 +1,8 @@
+from .run_pipeline import (
+    PipelineStage,
+    build_stages,
+    load_pipeline_config,
+    run_pipeline,
+    run_stages,
+)
+from .stage_cache import StageCache
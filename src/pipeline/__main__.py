@@ -0,0 +1,52 @@
+"""
+Command-line entry point of src.pipeline.run_pipeline.run_pipeline()
+
+Example:
+    $ python -m src.pipeline --input-dir data_input --config pipeline_config.json
+"""
+
+import argparse
+import logging
+
+from .run_pipeline import INGEST_FUNCTIONS, load_pipeline_config, run_pipeline
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.pipeline",
+        description=(
+            "Runs the database structure discovery pipeline on a directory of"
+            " .jsonl files, rerunning only the stages whose inputs or parameters"
+            " have changed"
+        ),
+    )
+    parser.add_argument(
+        "--input-dir", required=True, help="Directory of .jsonl files (1 per table)"
+    )
+    parser.add_argument("--output-dir", default="output/pipeline")
+    parser.add_argument("--cache-dir", default="temp_storage/pipeline_cache")
+    parser.add_argument(
+        "--config",
+        default=None,
+        help="(optional) .json file of keyword arguments of each stage function",
+    )
+    parser.add_argument(
+        "--ingest-with", choices=INGEST_FUNCTIONS, default="pivot_jsonl"
+    )
+    parser.add_argument("--max-concurrent-stages", type=int, default=4)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    run_pipeline(
+        input_dir=args.input_dir,
+        output_dir=args.output_dir,
+        cache_dir=args.cache_dir,
+        config=None if args.config is None else load_pipeline_config(args.config),
+        ingest_with=args.ingest_with,
+        max_concurrent_stages=args.max_concurrent_stages,
+    )
+
+
+if __name__ == "__main__":
+    main()
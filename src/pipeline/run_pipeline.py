@@ -0,0 +1,525 @@
+"""
+Defines function src.pipeline.run_pipeline.run_pipeline()
+"""
+
+import json
+import logging
+import pathlib
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable
+
+import src.dataviz
+import src.decision
+import src.discover
+import src.discover.table_links
+import src.transform_data
+from src.decision import comparison_operators
+from src.decision.join_keys import DEFAULT_MIN_MATCH_CRITERIA
+from src.transform_data.jsonl_io import find_jsonl_files, jsonl_stem
+from src.transform_data.summarise_jsonl import SUMMARY_SUFFIX
+
+from .stage_cache import MANIFEST_FILENAME, StageCache, file_hash, stage_key
+
+logger = logging.getLogger(__name__)
+
+INGEST_FUNCTIONS: tuple[str, ...] = ("pivot_jsonl", "summarise_jsonl")
+VALUE_TYPES: dict[str, type] = {"int": int, "str": str, "float": float, "bool": bool}
+
+
+@dataclass
+class PipelineStage:
+    """A single stage (node) of the pipeline DAG
+
+    Attributes:
+        name (str): Unique name of the stage (also the name of its cache directory)
+        func (Callable): Module-level function (so that it can be run in a worker
+                        process) called as func(upstream_dirs, input_files,
+                        output_dir, **params)
+        depends_on (tuple): Names of the stages whose output this stage reads
+        params (dict): Keyword arguments of `func` (part of the cache key)
+        input_files (tuple): Files read directly by the stage (their contents are
+                        part of the cache key)
+        publish (bool): Copy the output of the stage to the pipeline output directory
+    """
+
+    name: str
+    func: Callable
+    depends_on: tuple[str, ...] = ()
+    params: dict = field(default_factory=dict)
+    input_files: tuple[str, ...] = ()
+    publish: bool = False
+
+
+def _ingest_stage(
+    upstream_dirs: dict[str, pathlib.Path],
+    input_files: tuple[str, ...],
+    output_dir: pathlib.Path,
+    ingest_with: str,
+    **ingest_kwargs,
+) -> None:
+    input_path = pathlib.Path(input_files[0])
+    tbl_name: str = jsonl_stem(input_path)
+    if ingest_with == "summarise_jsonl":
+        src.transform_data.summarise_jsonl(
+            input_filepath=input_path,
+            output_filepath=output_dir / f"{tbl_name}{SUMMARY_SUFFIX}",
+            **ingest_kwargs,
+        )
+    elif ingest_kwargs.get("output_format", "json") == "columnar":
+        src.transform_data.pivot_jsonl(
+            input_filepath=input_path,
+            output_filepath=output_dir / tbl_name,
+            **ingest_kwargs,
+        )
+    else:
+        src.transform_data.pivot_jsonl(
+            input_filepath=input_path,
+            output_filepath=output_dir / f"{tbl_name}.json",
+            **ingest_kwargs,
+        )
+
+
+def _load_ingested_tables(upstream_dirs: dict[str, pathlib.Path]) -> dict[str, dict]:
+    """Loads the tables written by the ingest stages (pivoted .json files,
+    columnar tables or column summaries)"""
+    tbl_contents: dict[str, dict] = {}
+    for stage_name, upstream_dir in upstream_dirs.items():
+        tbl_name: str = stage_name.split(".", maxsplit=1)[1]
+        tbl_contents.update(
+            src.transform_data.load_tables(upstream_dir, table_names=[tbl_name])
+        )
+    return dict(sorted(tbl_contents.items()))
+
+
+def _discover_join_keys_stage(
+    upstream_dirs: dict[str, pathlib.Path],
+    input_files: tuple[str, ...],
+    output_dir: pathlib.Path,
+    **join_keys_kwargs,
+) -> None:
+    output_format: str = join_keys_kwargs.get("output_format", "json")
+    src.discover.join_keys(
+        tbl_contents=_load_ingested_tables(upstream_dirs),
+        output_path=str(output_dir / f"all_matches.{output_format}"),
+        **join_keys_kwargs,
+    )
+
+
+def _only_file(dirpath: pathlib.Path, pattern: str) -> pathlib.Path:
+    paths = sorted(dirpath.glob(pattern))
+    if len(paths) != 1:
+        raise FileNotFoundError(f"Expected 1 file [{pattern}] in [{dirpath}]")
+    return paths[0]
+
+
+def _decision_join_keys_stage(
+    upstream_dirs: dict[str, pathlib.Path],
+    input_files: tuple[str, ...],
+    output_dir: pathlib.Path,
+    min_match_criteria: tuple[tuple, ...],
+) -> None:
+    src.decision.join_keys(
+        input_data_filepath=str(
+            _only_file(upstream_dirs["discover.join_keys"], "all_matches.*")
+        ),
+        min_match_criteria=min_match_criteria,
+        output_filepath=str(output_dir / "identified_join_keys.json"),
+    )
+
+
+def _join_key_decisions_to_csv_stage(
+    upstream_dirs: dict[str, pathlib.Path],
+    input_files: tuple[str, ...],
+    output_dir: pathlib.Path,
+) -> None:
+    src.dataviz.join_key_decisions_to_csv(
+        input_data_filepath=str(
+            upstream_dirs["decision.join_keys"] / "identified_join_keys.json"
+        ),
+        output_filepath=str(output_dir / "identified_join_keys.csv"),
+    )
+
+
+def _make_sqlite_skeleton_stage(
+    upstream_dirs: dict[str, pathlib.Path],
+    input_files: tuple[str, ...],
+    output_dir: pathlib.Path,
+    load_sample_rows: bool = False,
+    **skeleton_kwargs,
+) -> None:
+    with open(
+        upstream_dirs["decision.join_keys"] / "identified_join_keys.json",
+        "r",
+        encoding="utf-8",
+    ) as file:
+        col_pairs = json.load(file)
+    if load_sample_rows:
+        skeleton_kwargs["tbl_contents"] = _load_ingested_tables(
+            {
+                stage_name: upstream_dir
+                for stage_name, upstream_dir in upstream_dirs.items()
+                if stage_name != "decision.join_keys"
+            }
+        )
+    src.dataviz.make_sqlite_skeleton(
+        col_pairs=col_pairs,
+        output_db_path=str(output_dir / "sqlite_skeleton.db"),
+        **skeleton_kwargs,
+    )
+
+
+def _create_db_stage(
+    upstream_dirs: dict[str, pathlib.Path],
+    input_files: tuple[str, ...],
+    output_dir: pathlib.Path,
+    max_path_len: int,
+    output_format: str = "pickle",
+) -> None:
+    src.discover.table_links.create_db(
+        input_data_filepath=str(
+            upstream_dirs["decision.join_keys"] / "identified_join_keys.json"
+        ),
+        max_path_len=max_path_len,
+        output_filepath=str(
+            output_dir
+            / (
+                "table_link_paths.db"
+                if output_format == "sqlite"
+                else "table_link_paths.pickle"
+            )
+        ),
+        output_format=output_format,
+    )
+
+
+def build_stages(
+    input_dir: str | pathlib.Path,
+    config: dict | None = None,
+    ingest_with: str = "pivot_jsonl",
+) -> list[PipelineStage]:
+    """Builds the pipeline DAG: one ingest stage per (optionally compressed)
+    .jsonl file in `input_dir` → discover.join_keys → decision.join_keys →
+    {join_key_decisions_to_csv, make_sqlite_skeleton, table_links.create_db}
+
+    Args:
+        input_dir (str): Directory containing one .jsonl file per table
+        config (dict): (optional) Keyword arguments of each stage function, keyed
+                        by stage function name (see run_pipeline())
+        ingest_with (str): One of "pivot_jsonl" or "summarise_jsonl"
+
+    Returns:
+        list: the stages, in topological (i.e. a valid execution) order
+    """
+    if ingest_with not in INGEST_FUNCTIONS:
+        raise ValueError(
+            f"Unknown ingest_with '{ingest_with}' (expected one of {INGEST_FUNCTIONS})"
+        )
+    config = config or {}
+    unknown_sections = set(config) - {
+        *INGEST_FUNCTIONS,
+        "discover.join_keys",
+        "decision.join_keys",
+        "dataviz.make_sqlite_skeleton",
+        "table_links.create_db",
+    }
+    if len(unknown_sections) > 0:
+        raise ValueError(f"Unknown pipeline config sections {unknown_sections}")
+    input_paths = find_jsonl_files(input_dir)
+    if len(input_paths) == 0:
+        raise FileNotFoundError(f"No .jsonl files found in [{input_dir}]")
+
+    ingest_stages: list[PipelineStage] = [
+        PipelineStage(
+            name=f"{ingest_with}.{jsonl_stem(path)}",
+            func=_ingest_stage,
+            params={"ingest_with": ingest_with, **config.get(ingest_with, {})},
+            input_files=(str(path),),
+        )
+        for path in input_paths
+    ]
+    skeleton_params: dict = config.get("dataviz.make_sqlite_skeleton", {})
+    return [
+        *ingest_stages,
+        PipelineStage(
+            name="discover.join_keys",
+            func=_discover_join_keys_stage,
+            depends_on=tuple(stage.name for stage in ingest_stages),
+            params=config.get("discover.join_keys", {}),
+            publish=True,
+        ),
+        PipelineStage(
+            name="decision.join_keys",
+            func=_decision_join_keys_stage,
+            depends_on=("discover.join_keys",),
+            params={
+                "min_match_criteria": DEFAULT_MIN_MATCH_CRITERIA,
+                **config.get("decision.join_keys", {}),
+            },
+            publish=True,
+        ),
+        PipelineStage(
+            name="dataviz.join_key_decisions_to_csv",
+            func=_join_key_decisions_to_csv_stage,
+            depends_on=("decision.join_keys",),
+            publish=True,
+        ),
+        PipelineStage(
+            name="dataviz.make_sqlite_skeleton",
+            func=_make_sqlite_skeleton_stage,
+            depends_on=(
+                "decision.join_keys",
+                *(
+                    stage.name
+                    for stage in ingest_stages
+                    if skeleton_params.get("load_sample_rows", False)
+                ),
+            ),
+            params=skeleton_params,
+            publish=True,
+        ),
+        PipelineStage(
+            name="table_links.create_db",
+            func=_create_db_stage,
+            depends_on=("decision.join_keys",),
+            params={"max_path_len": 4, **config.get("table_links.create_db", {})},
+            publish=True,
+        ),
+    ]
+
+
+def _run_stage(
+    func: Callable,
+    upstream_dirs: dict[str, pathlib.Path],
+    input_files: tuple[str, ...],
+    output_dir: pathlib.Path,
+    params: dict,
+) -> float:
+    """Runs a single stage (in a worker process), returning its wall time"""
+    start_time: float = time.perf_counter()
+    func(upstream_dirs, input_files, output_dir, **params)
+    return time.perf_counter() - start_time
+
+
+def _publish(stage_dir: pathlib.Path, output_dir: pathlib.Path) -> None:
+    """Copies the output files of a stage to `output_dir` (the stage's own output
+    directory, which is first cleared, so that files which an earlier run
+    produced but the stage no longer produces are not left behind)"""
+    if output_dir.exists():
+        shutil.rmtree(output_dir)
+    output_dir.mkdir(parents=True)
+    for path in stage_dir.iterdir():
+        if path.name == MANIFEST_FILENAME:
+            continue
+        if path.is_dir():
+            shutil.copytree(path, output_dir / path.name, dirs_exist_ok=True)
+        else:
+            shutil.copy2(path, output_dir / path.name)
+
+
+def run_stages(
+    stages: list[PipelineStage],
+    cache: StageCache,
+    output_dir: str | pathlib.Path,
+    max_concurrent_stages: int = 4,
+) -> list[dict]:
+    """Runs every stage whose output is not already cached, running stages which
+    do not depend on each other concurrently (in separate processes)
+
+    Notes:
+        - The cache key of a stage is a hash of its parameters, the contents of
+            its input files and the cache keys of the stages it depends on - so
+            changing a stage's parameters reruns only that stage and the stages
+            downstream of it
+        - A stage is started as soon as every stage it depends on has finished
+        - Instrumentation hooks (see src.instrumentation) are not called for
+            stages, since they run in other processes
+
+    Returns:
+        list: one dict per stage, in order of completion: {"stage", "key",
+                "status" ("cached" or "ran"), "seconds", "output_dir"}
+    """
+    keys: dict[str, str] = {}
+    stage_names: set[str] = set()
+    for stage in stages:
+        missing_dependencies = set(stage.depends_on) - stage_names
+        if len(missing_dependencies) > 0:
+            raise ValueError(
+                f"Stage '{stage.name}' depends on {missing_dependencies}, which must"
+                " come before it in `stages`"
+            )
+        stage_names.add(stage.name)
+
+    with ProcessPoolExecutor(max_workers=max_concurrent_stages) as executor:
+        input_files: list[str] = sorted(
+            {path for stage in stages for path in stage.input_files}
+        )
+        input_hashes: dict[str, str] = dict(
+            zip(input_files, executor.map(file_hash, input_files))
+        )
+        for stage in stages:
+            keys[stage.name] = stage_key(
+                stage_name=stage.name,
+                params=stage.params,
+                upstream_keys=[keys[dep] for dep in stage.depends_on],
+                input_hashes=[input_hashes[path] for path in stage.input_files],
+            )
+
+        results: dict[str, dict] = {}
+        remaining: list[PipelineStage] = list(stages)
+        running: dict[Future, tuple[PipelineStage, float]] = {}
+
+        def finish(stage: PipelineStage, status: str, seconds: float) -> None:
+            stage_dir = cache.stage_dir(stage.name, keys[stage.name])
+            if stage.publish:
+                _publish(stage_dir, pathlib.Path(output_dir) / stage.name)
+            results[stage.name] = {
+                "stage": stage.name,
+                "key": keys[stage.name],
+                "status": status,
+                "seconds": round(seconds, 3),
+                "output_dir": str(stage_dir),
+            }
+            print(f"Stage [{stage.name}] {status} ({seconds:,.1f} seconds)")
+
+        while len(remaining) > 0 or len(running) > 0:
+            for stage in list(remaining):
+                if not all(dep in results for dep in stage.depends_on):
+                    continue
+                remaining.remove(stage)
+                if cache.has(stage.name, keys[stage.name]):
+                    finish(stage, "cached", 0.0)
+                    continue
+                future = executor.submit(
+                    _run_stage,
+                    stage.func,
+                    {
+                        dep: cache.stage_dir(dep, keys[dep])
+                        for dep in stage.depends_on
+                    },
+                    stage.input_files,
+                    cache.temp_dir(stage.name, keys[stage.name]),
+                    stage.params,
+                )
+                running[future] = (stage, time.time())
+            if len(running) == 0:
+                # cached stages may have unblocked stages which are now ready #
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, start_time = running.pop(future)
+                seconds: float = future.result()
+                cache.commit(
+                    stage.name,
+                    keys[stage.name],
+                    manifest={
+                        "stage": stage.name,
+                        "key": keys[stage.name],
+                        "params": stage.params,
+                        "depends_on": {dep: keys[dep] for dep in stage.depends_on},
+                        "input_files": {
+                            path: input_hashes[path] for path in stage.input_files
+                        },
+                        "started_at": start_time,
+                        "seconds": seconds,
+                    },
+                )
+                finish(stage, "ran", seconds)
+
+    return list(results.values())
+
+
+def load_pipeline_config(filepath: str) -> dict:
+    """Reads a pipeline config from a .json file, converting the JSON-friendly
+    spellings of values which are not JSON serialisable
+
+    Notes:
+        - Comparison functions in "min_match_criteria" are given by name e.g.
+            ["matches", "exactly_1_match_in_lookup", "percent", ["greater_than", 0.1]]
+        - Value types in "allowed_key_types" and "allowed_types" are given by
+            name e.g. ["int", "str"]
+    """
+    with open(filepath, "r", encoding="utf-8") as file:
+        config: dict = json.load(file)
+    for section in config.values():
+        for types_param in ("allowed_key_types", "allowed_types"):
+            if types_param in section:
+                section[types_param] = tuple(
+                    VALUE_TYPES[type_name] for type_name in section[types_param]
+                )
+        if "min_match_criteria" in section:
+            section["min_match_criteria"] = tuple(
+                (
+                    *criterion[:-1],
+                    (
+                        getattr(comparison_operators, criterion[-1][0]),
+                        criterion[-1][1],
+                    ),
+                )
+                for criterion in section["min_match_criteria"]
+            )
+    return config
+
+
+def run_pipeline(
+    input_dir: str,
+    output_dir: str = "output/pipeline",
+    cache_dir: str = "temp_storage/pipeline_cache",
+    config: dict | None = None,
+    ingest_with: str = "pivot_jsonl",
+    max_concurrent_stages: int = 4,
+) -> list[dict]:
+    """Runs the whole pipeline (ingest → discover.join_keys → decision.join_keys
+    → dataviz and table_links) on a directory of .jsonl files, reusing the
+    cached output of every stage whose inputs and parameters have not changed
+
+    Notes:
+        - Each .jsonl file is ingested by its own stage, so tables are pivoted
+            concurrently, and likewise the 3 stages after decision.join_keys
+        - The outputs of the discover, decision, dataviz and table_links stages
+            are copied to "{output_dir}/{stage name}/"
+        - The run report is also written to "{output_dir}/pipeline_run.json"
+
+    Args:
+        input_dir (str): Directory containing one .jsonl file per table
+        output_dir (str): Directory into which the stage outputs are copied
+        cache_dir (str): Directory in which the output of each stage is cached
+        config (dict): (optional) Keyword arguments of each stage function, keyed
+                        by "pivot_jsonl" (or "summarise_jsonl"), "discover.join_keys",
+                        "decision.join_keys" and "table_links.create_db"
+        ingest_with (str): One of "pivot_jsonl" or "summarise_jsonl"
+        max_concurrent_stages (int): Maximum number of stages run at the same time
+
+    Returns:
+        list: the run report of each stage (see run_stages())
+
+    Example:
+        >>> run_pipeline(
+        ...     input_dir="data_input",
+        ...     config={
+        ...         "discover.join_keys": {"n_samples": 500, "engine": "numpy", "random_seed": 42},
+        ...         "table_links.create_db": {"max_path_len": 4},
+        ...     },
+        ... )
+    """
+    start_time: float = time.perf_counter()
+    stages = build_stages(input_dir, config=config, ingest_with=ingest_with)
+    run_report = run_stages(
+        stages,
+        cache=StageCache(cache_dir),
+        output_dir=output_dir,
+        max_concurrent_stages=max_concurrent_stages,
+    )
+    pathlib.Path(output_dir).mkdir(parents=True, exist_ok=True)
+    with open(
+        pathlib.Path(output_dir) / "pipeline_run.json", "w", encoding="utf-8"
+    ) as file:
+        json.dump(run_report, file, indent=4)
+    n_ran: int = sum(1 for stage in run_report if stage["status"] == "ran")
+    print(
+        f"Finished pipeline in {(time.perf_counter()-start_time)/60:,.1f} minutes"
+        f" ({n_ran} of {len(run_report)} stages ran, the rest were cached)"
+    )
+    return run_report
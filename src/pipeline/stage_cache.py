@@ -0,0 +1,119 @@
+"""
+Defines class src.pipeline.stage_cache.StageCache
+"""
+
+import hashlib
+import json
+import logging
+import pathlib
+import shutil
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE: int = 1024**2
+MANIFEST_FILENAME: str = "stage_manifest.json"
+
+
+def file_hash(filepath: str | pathlib.Path) -> str:
+    """Hashes the contents of a file (read in blocks, so memory use does not
+    depend on the size of the file)"""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as file:
+        while block := file.read(HASH_BLOCK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _json_default(obj) -> str:
+    """Makes the stage parameters which are not JSON serialisable hashable (e.g.
+    the comparison functions of min_match_criteria, or allowed_key_types)"""
+    if isinstance(obj, type) or callable(obj):
+        return f"{obj.__module__}.{obj.__qualname__}"
+    return repr(obj)
+
+
+def stage_key(
+    stage_name: str, params: dict, upstream_keys: list[str], input_hashes: list[str]
+) -> str:
+    """Hashes everything which a stage's output depends on: its name, its
+    parameters, the keys of the stages which it reads the output of and the
+    contents of the input files which it reads directly"""
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(
+        json.dumps(
+            {
+                "stage": stage_name,
+                "params": params,
+                "upstream_keys": upstream_keys,
+                "input_hashes": input_hashes,
+            },
+            sort_keys=True,
+            default=_json_default,
+        ).encode("utf-8")
+    )
+    return hasher.hexdigest()
+
+
+class StageCache:
+    """Directory of pipeline stage outputs, keyed by the stage_key() of each stage
+
+    Notes:
+        - The output of each run of a stage is stored in its own directory
+            "{cache_dir}/{stage name}/{stage key}". A stage is written into a
+            temporary directory which is only renamed to its final name once the
+            stage has finished, so an interrupted stage is never mistaken for a
+            cached one
+        - Outputs for keys which are no longer used are kept, so switching back
+            to earlier parameters is also a cache hit (call prune() to delete them)
+
+    Example:
+        >>> cache = StageCache("temp_storage/pipeline_cache")
+        >>> if not cache.has("decision.join_keys", key):
+        ...     output_dir = cache.temp_dir("decision.join_keys", key)
+        ...     src.decision.join_keys(..., output_filepath=output_dir / "identified_join_keys.json")
+        ...     cache.commit("decision.join_keys", key, manifest={})
+    """
+
+    def __init__(self, cache_dir: str | pathlib.Path) -> None:
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def stage_dir(self, stage_name: str, key: str) -> pathlib.Path:
+        return self.cache_dir / stage_name / key
+
+    def has(self, stage_name: str, key: str) -> bool:
+        return (self.stage_dir(stage_name, key) / MANIFEST_FILENAME).is_file()
+
+    def temp_dir(self, stage_name: str, key: str) -> pathlib.Path:
+        """Returns an empty directory into which the stage writes its output"""
+        temp_dir = self.cache_dir / stage_name / f"{key}.tmp"
+        if temp_dir.exists():
+            shutil.rmtree(temp_dir)
+        temp_dir.mkdir(parents=True)
+        return temp_dir
+
+    def commit(self, stage_name: str, key: str, manifest: dict) -> pathlib.Path:
+        """Moves the finished output of a stage from its temporary directory into
+        the cache"""
+        temp_dir = self.cache_dir / stage_name / f"{key}.tmp"
+        with open(temp_dir / MANIFEST_FILENAME, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=4, default=_json_default)
+        stage_dir = self.stage_dir(stage_name, key)
+        if stage_dir.exists():
+            shutil.rmtree(stage_dir)
+        temp_dir.rename(stage_dir)
+        return stage_dir
+
+    def prune(self, keep: dict[str, str]) -> int:
+        """Deletes every cached output except the {stage name: stage key} in
+        `keep`, returning the number of directories deleted"""
+        n_deleted: int = 0
+        for stage_name_dir in self.cache_dir.iterdir():
+            if not stage_name_dir.is_dir():
+                continue
+            for key_dir in stage_name_dir.iterdir():
+                if keep.get(stage_name_dir.name) != key_dir.name:
+                    shutil.rmtree(key_dir)
+                    n_deleted += 1
+        logger.info("Deleted %s unused stage outputs from the cache", n_deleted)
+        return n_deleted
@@ -1,2 +1,6 @@
+from .columnar_store import load_columnar_table, load_columnar_tables
+from .load_tables import load_tables
 from .pivot_jsonl import pivot_jsonl
+from .pivot_jsonl_files import pivot_jsonl_files
+from .summarise_jsonl import load_column_summaries, summarise_jsonl
 from .table_link_paths_to_csv import table_link_paths_to_csv
@@ -0,0 +1,326 @@
+"""
+Compact on-disk columnar table format, written by
+src.transform_data.pivot_jsonl.pivot_jsonl(output_format="columnar") and
+read (lazily, via memory-mapping) by load_columnar_table()
+
+Each table is stored as a directory containing:
+    - _manifest.json    row count, and the name, kind and value types of each column
+    - <col>.values      (int, float and bool columns) fixed-width array of values
+    - <col>.offsets     (str and json columns) int64 array of n_rows+1 byte offsets
+    - <col>.data        (str and json columns) concatenated utf-8 encoded values
+    - <col>.nulls       (only if the column contains nulls) bitmap with bit i set
+                            if row i is null
+
+Column kinds are:
+    - "int"     all values are ints fitting in int64 (stored as int64)
+    - "float"   all values are floats (stored as float64)
+    - "bool"    all values are bools (stored as uint8)
+    - "str"     all values are strings
+    - "json"    anything else (e.g. mixed types), each value stored as JSON text
+"""
+
+import array
+import contextlib
+import itertools
+import json
+import mmap
+import pathlib
+import sys
+from collections.abc import Mapping, Sequence
+from typing import Callable, Iterable, Iterator
+
+MANIFEST_FILENAME: str = "_manifest.json"
+FIXED_WIDTH_TYPECODES: dict[str, str] = {"int": "q", "float": "d", "bool": "B"}
+INT64_MIN: int = -(2**63)
+INT64_MAX: int = 2**63 - 1
+WRITE_BLOCK_SIZE: int = 65_536
+
+
+def column_kind(values: Iterable) -> tuple[str, list[str]]:
+    """Decides how a column will be stored
+
+    Returns:
+        tuple: (column kind, sorted names of the (non-null) value types in the column)
+    """
+    value_types: set[type] = set()
+    fits_int64: bool = True
+    for value in values:
+        if value is None:
+            continue
+        value_types.add(type(value))
+        if type(value) is int and fits_int64:
+            fits_int64 = INT64_MIN <= value <= INT64_MAX
+    kind: str = "json"
+    if value_types == {int}:
+        if fits_int64:
+            kind = "int"
+    elif value_types == {float}:
+        kind = "float"
+    elif value_types == {bool}:
+        kind = "bool"
+    elif value_types in ({str}, set()):
+        kind = "str"
+    return kind, sorted(t.__name__ for t in value_types)
+
+
+def write_columnar_table(
+    columns: dict[str, Callable[[], Iterable]], output_dir: str
+) -> None:
+    """Writes a table to disk in the columnar format
+
+    Args:
+        columns (dict): For each column name, a function returning a fresh
+                        iterator over the column values (each column is read twice:
+                        once to decide its kind, once to write it)
+        output_dir (str): Directory to write the table into (created if missing)
+    """
+    output_path = pathlib.Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    manifest: dict = {"format_version": 1, "n_rows": 0, "columns": []}
+    for col_idx, (colname, get_values) in enumerate(columns.items()):
+        kind, value_types = column_kind(get_values())
+        file_prefix = f"c{col_idx}"
+        n_rows, has_nulls = _write_column(
+            values=get_values(), kind=kind, path_prefix=output_path / file_prefix
+        )
+        if col_idx > 0 and n_rows != manifest["n_rows"]:
+            raise ValueError(
+                f"Column [{colname}] has {n_rows:,} rows"
+                f" (expected {manifest['n_rows']:,})"
+            )
+        manifest["n_rows"] = n_rows
+        manifest["columns"].append(
+            {
+                "name": colname,
+                "kind": kind,
+                "value_types": value_types,
+                "file_prefix": file_prefix,
+                "has_nulls": has_nulls,
+            }
+        )
+    with open(output_path / MANIFEST_FILENAME, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=4)
+
+
+def _write_column(
+    values: Iterable, kind: str, path_prefix: pathlib.Path
+) -> tuple[int, bool]:
+    """Writes the files of a single column
+
+    Returns:
+        tuple: (number of rows written, whether the column contains any nulls)
+    """
+    n_rows: int = 0
+    null_bits = bytearray()
+    values_iter = iter(values)
+    is_fixed_width: bool = kind in FIXED_WIDTH_TYPECODES
+    with open(
+        path_prefix.with_suffix(".values" if is_fixed_width else ".data"), "wb"
+    ) as data_file, open(
+        path_prefix.with_suffix(".offsets"), "wb"
+    ) if not is_fixed_width else contextlib.nullcontext() as offsets_file:
+        offset: int = 0
+        if offsets_file is not None:
+            _write_array(offsets_file, array.array("q", [0]))
+        while block := list(itertools.islice(values_iter, WRITE_BLOCK_SIZE)):
+            for idx, value in enumerate(block):
+                if value is None:
+                    row_idx = n_rows + idx
+                    if len(null_bits) <= row_idx // 8:
+                        null_bits.extend(bytes(row_idx // 8 - len(null_bits) + 1))
+                    null_bits[row_idx // 8] |= 1 << (row_idx % 8)
+            if is_fixed_width:
+                fill_value = False if kind == "bool" else 0
+                _write_array(
+                    data_file,
+                    array.array(
+                        FIXED_WIDTH_TYPECODES[kind],
+                        [fill_value if v is None else v for v in block],
+                    ),
+                )
+            else:
+                offsets = array.array("q")
+                for value in block:
+                    if value is not None:
+                        encoded = (
+                            value if kind == "str" else json.dumps(value)
+                        ).encode("utf-8")
+                        data_file.write(encoded)
+                        offset += len(encoded)
+                    offsets.append(offset)
+                _write_array(offsets_file, offsets)
+            n_rows += len(block)
+    has_nulls: bool = len(null_bits) > 0
+    if has_nulls:
+        null_bits.extend(bytes((n_rows + 7) // 8 - len(null_bits)))
+        with open(path_prefix.with_suffix(".nulls"), "wb") as file:
+            file.write(null_bits)
+    return n_rows, has_nulls
+
+
+def _write_array(file, arr: array.array) -> None:
+    """Writes an array to file in little-endian byte order"""
+    if sys.byteorder != "little":
+        arr.byteswap()
+    arr.tofile(file)
+
+
+def _mmap_file(path: pathlib.Path) -> memoryview:
+    """Memory-maps a file (read-only)"""
+    with open(path, "rb") as file:
+        if path.stat().st_size == 0:
+            return memoryview(b"")
+        return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class ColumnarColumn(Sequence):
+    """A read-only column of a table stored in the columnar format. The column
+    files are only memory-mapped once the column values are first accessed
+
+    Attributes:
+        name (str): The column name
+        kind (str): How the column is stored (refer to the module docstring)
+        value_types (frozenset): Names of the (non-null) value types in the column
+    """
+
+    def __init__(
+        self, table_dir: pathlib.Path, n_rows: int, column_manifest: dict
+    ) -> None:
+        self.name: str = column_manifest["name"]
+        self.kind: str = column_manifest["kind"]
+        self.value_types: frozenset = frozenset(column_manifest["value_types"])
+        self.n_rows: int = n_rows
+        self._path_prefix: pathlib.Path = table_dir / column_manifest["file_prefix"]
+        self._has_nulls: bool = column_manifest["has_nulls"]
+        self._values: memoryview | None = None
+        self._offsets: memoryview | None = None
+        self._nulls: memoryview | None = None
+
+    def __repr__(self) -> str:
+        return (
+            f"ColumnarColumn(name={self.name!r}, kind={self.kind!r},"
+            f" n_rows={self.n_rows:,})"
+        )
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._values is not None
+
+    def _load(self) -> None:
+        if self.kind in FIXED_WIDTH_TYPECODES:
+            self._values = _cast(
+                _mmap_file(self._path_prefix.with_suffix(".values")),
+                FIXED_WIDTH_TYPECODES[self.kind],
+            )
+        else:
+            self._values = _mmap_file(self._path_prefix.with_suffix(".data"))
+            self._offsets = _cast(
+                _mmap_file(self._path_prefix.with_suffix(".offsets")), "q"
+            )
+        if self._has_nulls:
+            self._nulls = _mmap_file(self._path_prefix.with_suffix(".nulls"))
+
+    def _is_null(self, idx: int) -> bool:
+        return self._nulls is not None and bool(self._nulls[idx // 8] >> (idx % 8) & 1)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self.n_rows))]
+        if idx < 0:
+            idx += self.n_rows
+        if not 0 <= idx < self.n_rows:
+            raise IndexError("column index out of range")
+        if self._values is None:
+            self._load()
+        if self._is_null(idx):
+            return None
+        if self.kind == "bool":
+            return bool(self._values[idx])
+        if self.kind in FIXED_WIDTH_TYPECODES:
+            return self._values[idx]
+        encoded = bytes(self._values[self._offsets[idx] : self._offsets[idx + 1]])
+        if self.kind == "str":
+            return encoded.decode("utf-8")
+        return json.loads(encoded)
+
+    def __iter__(self) -> Iterator:
+        if self._values is None:
+            self._load()
+        for block_start in range(0, self.n_rows, WRITE_BLOCK_SIZE):
+            block_end = min(block_start + WRITE_BLOCK_SIZE, self.n_rows)
+            if self.kind in FIXED_WIDTH_TYPECODES:
+                block = self._values[block_start:block_end].tolist()
+                if self.kind == "bool":
+                    block = [bool(x) for x in block]
+            else:
+                offsets = self._offsets[block_start : block_end + 1].tolist()
+                data = bytes(self._values[offsets[0] : offsets[-1]])
+                base = offsets[0]
+                block = [
+                    data[start - base : end - base].decode("utf-8")
+                    for start, end in zip(offsets[:-1], offsets[1:])
+                ]
+                if self.kind == "json":
+                    block = [json.loads(x) if x != "" else None for x in block]
+            if self._nulls is not None:
+                for idx in range(block_start, block_end):
+                    if self._is_null(idx):
+                        block[idx - block_start] = None
+            yield from block
+
+
+def _cast(buffer: memoryview, typecode: str) -> memoryview:
+    """Interprets a (little-endian) memory-mapped buffer as an array of `typecode`"""
+    if sys.byteorder != "little":
+        raise NotImplementedError(
+            "Columnar files can only be read on little-endian machines"
+        )
+    if len(buffer) == 0:
+        return memoryview(array.array(typecode))
+    return buffer.cast(typecode)
+
+
+class ColumnarTable(Mapping):
+    """A read-only table stored in the columnar format, behaving like the
+    dictionary of column lists expected by src.discover.join_keys.join_keys()
+    """
+
+    def __init__(self, table_dir: str) -> None:
+        self.table_dir = pathlib.Path(table_dir)
+        with open(self.table_dir / MANIFEST_FILENAME, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+        self.n_rows: int = manifest["n_rows"]
+        self._columns: dict[str, ColumnarColumn] = {
+            col_manifest["name"]: ColumnarColumn(
+                self.table_dir, self.n_rows, col_manifest
+            )
+            for col_manifest in manifest["columns"]
+        }
+
+    def __getitem__(self, colname: str) -> ColumnarColumn:
+        return self._columns[colname]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+
+def load_columnar_table(table_dir: str) -> ColumnarTable:
+    """Opens a table written in the columnar format. Only the manifest is read -
+    column data is memory-mapped lazily when each column is first accessed"""
+    return ColumnarTable(table_dir)
+
+
+def load_columnar_tables(dirpath: str) -> dict[str, ColumnarTable]:
+    """Opens every columnar table (i.e. subdirectory containing a manifest) in
+    `dirpath`, keyed by table (directory) name"""
+    return {
+        path.name: ColumnarTable(path)
+        for path in sorted(pathlib.Path(dirpath).iterdir())
+        if (path / MANIFEST_FILENAME).is_file()
+    }
@@ -0,0 +1,85 @@
+"""
+Streaming readers of (optionally compressed) newline-delimited JSON files, used
+by src.transform_data.pivot_jsonl() and src.transform_data.summarise_jsonl()
+
+Notes:
+    - Files ending in .gz are decompressed with gzip, and files ending in .zst or
+        .zstd with zstandard (pip install zstandard), one block at a time
+    - Lines are parsed with orjson (pip install orjson) if it is installed, and
+        otherwise with the standard library json module. Lines which orjson
+        rejects but json accepts (e.g. integers beyond 64 bits, or NaN) are
+        parsed with json, so the parsed rows are the same with either parser
+"""
+
+import gzip
+import io
+import json
+import pathlib
+from typing import BinaryIO
+
+try:
+    import orjson  # pip install orjson
+except ImportError:
+    orjson = None
+
+JSONL_SUFFIXES: tuple[str, ...] = (
+    ".jsonl",
+    ".jsonl.gz",
+    ".jsonl.zst",
+    ".jsonl.zstd",
+)
+
+
+def open_jsonl(filepath: str | pathlib.Path) -> BinaryIO:
+    """Opens a (optionally gzip- or zstd-compressed) .jsonl file for streaming,
+    in binary mode (iterate over it to get one line at a time)"""
+    filepath = pathlib.Path(filepath)
+    if filepath.suffix == ".gz":
+        return gzip.open(filepath, "rb")
+    if filepath.suffix in (".zst", ".zstd"):
+        try:
+            import zstandard  # pip install zstandard
+        except ImportError as error:
+            raise ImportError(
+                f"Reading [{filepath}] requires the zstandard package"
+                " (pip install zstandard)"
+            ) from error
+        decompressor = zstandard.ZstdDecompressor()
+        return io.BufferedReader(
+            decompressor.stream_reader(open(filepath, "rb"), closefd=True)
+        )
+    return open(filepath, "rb")
+
+
+def parse_json_line(line: bytes | str):
+    """Parses a single line of a .jsonl file (see the module notes)"""
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(line)
+
+
+def jsonl_stem(filepath: str | pathlib.Path) -> str:
+    """The name of the table stored in a .jsonl file (i.e. the file name without
+    its .jsonl and compression suffixes)
+
+    Example:
+        >>> jsonl_stem("data_input/users.jsonl.gz")
+        'users'
+    """
+    name: str = pathlib.Path(filepath).name
+    for suffix in sorted(JSONL_SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return pathlib.Path(filepath).stem
+
+
+def find_jsonl_files(dirpath: str | pathlib.Path) -> list[pathlib.Path]:
+    """Lists the (optionally compressed) .jsonl files in `dirpath`, sorted by name"""
+    return sorted(
+        path
+        for path in pathlib.Path(dirpath).iterdir()
+        if path.is_file() and path.name.endswith(JSONL_SUFFIXES)
+    )
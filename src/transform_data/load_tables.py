@@ -0,0 +1,53 @@
+"""
+Defines function src.transform_data.load_tables.load_tables()
+"""
+
+import json
+import logging
+import pathlib
+import pickle
+
+from .columnar_store import MANIFEST_FILENAME, ColumnarTable
+from .summarise_jsonl import SUMMARY_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+
+def load_tables(
+    dirpath: str | pathlib.Path, table_names: list[str] | None = None
+) -> dict[str, dict]:
+    """Loads every table in `dirpath` in whichever format it was written in: a
+    pivoted .json file (src.transform_data.pivot_jsonl()), a columnar table
+    directory (pivot_jsonl(output_format="columnar")) or a .summary.pickle file
+    (src.transform_data.summarise_jsonl())
+
+    Args:
+        dirpath (str): Directory containing the tables
+        table_names (list): (optional) Only load these tables
+
+    Returns:
+        dict: {table name: table contents}, sorted by table name (the format
+                expected by src.discover.join_keys())
+    """
+    tbl_contents: dict[str, dict] = {}
+    for path in sorted(pathlib.Path(dirpath).iterdir()):
+        if path.is_dir() and (path / MANIFEST_FILENAME).is_file():
+            tbl_name = path.name
+        elif path.name.endswith(SUMMARY_SUFFIX):
+            tbl_name = path.name[: -len(SUMMARY_SUFFIX)]
+        elif path.suffix == ".json":
+            tbl_name = path.stem
+        else:
+            continue
+        if table_names is not None and tbl_name not in table_names:
+            continue
+        if path.is_dir():
+            tbl_contents[tbl_name] = ColumnarTable(path)
+        elif path.name.endswith(SUMMARY_SUFFIX):
+            with open(path, "rb") as file:
+                tbl_contents[tbl_name] = pickle.load(file)
+        else:
+            with open(path, "r", encoding="utf-8") as file:
+                tbl_contents[tbl_name] = json.load(file)
+    logger.info("Loaded %s tables from [%s]", len(tbl_contents), dirpath)
+    return dict(sorted(tbl_contents.items()))
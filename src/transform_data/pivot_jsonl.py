@@ -4,42 +4,82 @@ Defines function pivot_jsonl()
 
 import json
 import logging
+import pathlib
+import tempfile
+from typing import Iterator, TextIO
+
+from src.instrumentation import emit, instrument_stage
+
+from .columnar_store import write_columnar_table
+from .jsonl_io import open_jsonl, parse_json_line
 
 logger = logging.getLogger(__name__)
 
+SCALAR_TYPES: tuple[type, ...] = (str, int, float, bool, type(None))
+
 
-def pivot_jsonl(input_filepath: str, output_filepath: str) -> None:
+@instrument_stage("transform_data.pivot_jsonl")
+def pivot_jsonl(
+    input_filepath: str,
+    output_filepath: str,
+    chunk_size: int | None = None,
+    output_format: str = "json",
+) -> None:
     """Converts data stored as newline-delimited JSON (i.e. a
     list of dicts, where each dict is a table row) into a JSON file in
     which the data is stored in columns (i.e. the format
     expected by the function src/discover_join_keys.py)
 
+    Notes:
+        - If `chunk_size` is provided, the input file is streamed line by line
+            and each column is spilled to disk every `chunk_size` rows, so that
+            peak memory is proportional to `chunk_size` rather than to the size
+            of the file. Columns which first appear partway through the file are
+            backfilled with nulls
+        - output_format="columnar" writes the table as a directory in the compact
+            binary format of src.transform_data.columnar_store, which can be
+            memory-mapped lazily by src.transform_data.load_columnar_tables()
+        - The input file may be gzip- or zstd-compressed (see
+            src.transform_data.jsonl_io)
+
     Args:
-        input_filepath (str): location of input .jsonl file
-        output_filepath (str): desired location of output .json file
+        input_filepath (str): location of input .jsonl (or .jsonl.gz, .jsonl.zst) file
+        output_filepath (str): desired location of output .json file (or output
+                            directory, if output_format="columnar")
+        chunk_size (int): (optional) number of rows to hold in memory before
+                            spilling column data to disk
+        output_format (str): One of "json" or "columnar"
 
     Returns:
-        None: output is written to a local .json file
+        None: output is written to a local .json file (or columnar directory)
     """
+    if output_format not in ("json", "columnar"):
+        raise ValueError(
+            f"Unknown output_format '{output_format}' (expected 'json' or 'columnar')"
+        )
+
+    if chunk_size is not None:
+        _pivot_jsonl_streaming(
+            input_filepath, output_filepath, chunk_size, output_format
+        )
+        return
+
     logger.info("Importing file [%s]", input_filepath)
     coldata = dict()
     invalid_data_type_colnames: set[str] = set()
-    with open(input_filepath, "r", encoding="utf-8") as file:
+    with open_jsonl(input_filepath) as file:
         lines: list[dict] = []
         for line in file.readlines():
-            linedict = json.loads(line.rstrip())
+            linedict = parse_json_line(line.rstrip())
             lines.append(linedict)
             for key, value in linedict.items():
                 if key not in coldata:
                     coldata[key] = []
-                if type(value) not in (str, int, float, bool, None):
+                if type(value) not in SCALAR_TYPES:
                     invalid_data_type_colnames.add(key)
 
-    if len(invalid_data_type_colnames) > 0:
-        logger.warning(
-            "The following columns contain complex or nested data types and have been ommitted from the output:\n%s",
-            invalid_data_type_colnames,
-        )
+    _warn_invalid_data_types(invalid_data_type_colnames)
+    emit("count", name="rows_read", value=len(lines))
 
     coldata = {
         key: val
@@ -55,7 +95,145 @@ def pivot_jsonl(input_filepath: str, output_filepath: str) -> None:
         len({len(col_contents) for col_contents in coldata.values()}) == 1
     ), "All columns must contain the same number of rows"
 
-    with open(output_filepath, "w", encoding="utf-8") as file:
-        json.dump(coldata, file, indent=4)
+    if output_format == "columnar":
+        write_columnar_table(
+            columns={
+                colname: (lambda colname=colname: coldata[colname])
+                for colname in coldata
+            },
+            output_dir=output_filepath,
+        )
+    else:
+        with open(output_filepath, "w", encoding="utf-8") as file:
+            json.dump(coldata, file, indent=4)
 
     logger.info("Exported file [%s]", output_filepath)
+
+
+def _warn_invalid_data_types(invalid_data_type_colnames: set[str]) -> None:
+    if len(invalid_data_type_colnames) > 0:
+        logger.warning(
+            "The following columns contain complex or nested data types and have been ommitted from the output:\n%s",
+            invalid_data_type_colnames,
+        )
+
+
+def _pivot_jsonl_streaming(
+    input_filepath: str, output_filepath: str, chunk_size: int, output_format: str
+) -> None:
+    """Single-pass version of pivot_jsonl() which spills column data to
+    disk every `chunk_size` rows"""
+    logger.info("Streaming file [%s] (chunk_size=%s)", input_filepath, chunk_size)
+    n_rows: int = 0
+    first_row_idx: dict[str, int] = {}
+    buffers: dict[str, list] = {}
+    invalid_data_type_colnames: set[str] = set()
+    with tempfile.TemporaryDirectory(
+        dir=pathlib.Path(output_filepath).parent
+    ) as spill_dir:
+        spill_paths: dict[str, pathlib.Path] = {}
+
+        def spill_buffers() -> None:
+            for colname, buffer in buffers.items():
+                if len(buffer) > 0:
+                    if colname not in spill_paths:
+                        spill_paths[colname] = pathlib.Path(spill_dir) / (
+                            f"{len(spill_paths)}.jsonl"
+                        )
+                    with open(spill_paths[colname], "a", encoding="utf-8") as file:
+                        file.write(json.dumps(buffer) + "\n")
+                    buffer.clear()
+
+        with open_jsonl(input_filepath) as file:
+            for line in file:
+                if len(line.strip()) == 0:
+                    continue
+                linedict = parse_json_line(line)
+                for key, value in linedict.items():
+                    if key in invalid_data_type_colnames:
+                        continue
+                    if type(value) not in SCALAR_TYPES:
+                        invalid_data_type_colnames.add(key)
+                        buffers.pop(key, None)
+                        first_row_idx.pop(key, None)
+                        if key in spill_paths:
+                            spill_paths.pop(key).unlink()
+                    elif key not in buffers:
+                        first_row_idx[key] = n_rows
+                        buffers[key] = []
+                for colname, buffer in buffers.items():
+                    buffer.append(linedict.get(colname))
+                n_rows += 1
+                if n_rows % chunk_size == 0:
+                    spill_buffers()
+        spill_buffers()
+        emit("count", name="rows_read", value=n_rows)
+
+        _warn_invalid_data_types(invalid_data_type_colnames)
+
+        if output_format == "columnar":
+            write_columnar_table(
+                columns={
+                    colname: (
+                        lambda colname=colname: _iter_spilled_column(
+                            n_leading_nulls=first_row_idx[colname],
+                            spill_path=spill_paths.get(colname),
+                        )
+                    )
+                    for colname in first_row_idx
+                },
+                output_dir=output_filepath,
+            )
+            logger.info(
+                "Exported table [%s] (%s rows)", output_filepath, f"{n_rows:,}"
+            )
+            return
+
+        with open(output_filepath, "w", encoding="utf-8") as file:
+            file.write("{")
+            for col_idx, (colname, n_leading_nulls) in enumerate(
+                first_row_idx.items()
+            ):
+                file.write(
+                    ("," if col_idx > 0 else "") + f"\n{json.dumps(colname)}: ["
+                )
+                is_first_value: bool = True
+                while n_leading_nulls > 0:
+                    n_nulls = min(n_leading_nulls, chunk_size)
+                    is_first_value = _write_json_values(
+                        file, ", ".join(["null"] * n_nulls), is_first_value
+                    )
+                    n_leading_nulls -= n_nulls
+                if colname in spill_paths:
+                    with open(spill_paths[colname], "r", encoding="utf-8") as chunks:
+                        for chunk in chunks:
+                            is_first_value = _write_json_values(
+                                file, chunk.rstrip()[1:-1], is_first_value
+                            )
+                file.write("]")
+            file.write("\n}")
+
+    logger.info("Exported file [%s] (%s rows)", output_filepath, f"{n_rows:,}")
+
+
+def _iter_spilled_column(
+    n_leading_nulls: int, spill_path: pathlib.Path | None
+) -> Iterator:
+    """Iterates over the values of a column which has been spilled to disk"""
+    for _ in range(n_leading_nulls):
+        yield None
+    if spill_path is not None:
+        with open(spill_path, "r", encoding="utf-8") as chunks:
+            for chunk in chunks:
+                yield from json.loads(chunk)
+
+
+def _write_json_values(file: TextIO, values_str: str, is_first_value: bool) -> bool:
+    """Appends a comma-separated string of JSON values to a JSON array which is
+    being written to `file`"""
+    if values_str == "":
+        return is_first_value
+    if not is_first_value:
+        file.write(", ")
+    file.write(values_str)
+    return False
@@ -0,0 +1,137 @@
+"""
+Defines function src.transform_data.pivot_jsonl_files.pivot_jsonl_files()
+"""
+
+import logging
+import os
+import pathlib
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+
+from src.instrumentation import add_hook, remove_hook
+
+from .jsonl_io import find_jsonl_files, jsonl_stem, orjson
+from .pivot_jsonl import pivot_jsonl
+
+logger = logging.getLogger(__name__)
+
+
+def _pivot_file(
+    input_filepath: pathlib.Path, output_filepath: pathlib.Path, pivot_kwargs: dict
+) -> dict:
+    """Pivots a single file (in a worker process), measuring its throughput"""
+    counts: dict[str, int] = {}
+
+    def count_rows(event: dict) -> None:
+        if event["event"] == "count":
+            counts[event["name"]] = counts.get(event["name"], 0) + event["value"]
+
+    add_hook(count_rows)
+    start_time: float = time.perf_counter()
+    try:
+        pivot_jsonl(
+            input_filepath=input_filepath,
+            output_filepath=output_filepath,
+            **pivot_kwargs,
+        )
+    finally:
+        remove_hook(count_rows)
+    seconds: float = max(time.perf_counter() - start_time, 1e-9)
+    n_bytes: int = input_filepath.stat().st_size
+    n_rows: int = counts.get("rows_read", 0)
+    return {
+        "input_filepath": str(input_filepath),
+        "output_filepath": str(output_filepath),
+        "n_bytes": n_bytes,
+        "n_rows": n_rows,
+        "seconds": round(seconds, 3),
+        "mb_per_second": round(n_bytes / 1024**2 / seconds, 2),
+        "rows_per_second": round(n_rows / seconds, 1),
+    }
+
+
+def pivot_jsonl_files(
+    input_dir: str,
+    output_dir: str,
+    workers: int | None = None,
+    **pivot_kwargs,
+) -> list[dict]:
+    """Pivots every (optionally gzip- or zstd-compressed) .jsonl file in
+    `input_dir` using src.transform_data.pivot_jsonl(), processing files
+    concurrently in a pool of `workers` processes
+
+    Notes:
+        - Each table is written to "{output_dir}/{table name}.json" (or to the
+            directory "{output_dir}/{table name}" if output_format="columnar"),
+            where the table name is the file name without its .jsonl (and
+            compression) suffixes
+        - The largest files are started first, so that a single large file does
+            not finish long after all of the others
+        - The throughput of each file is logged, and returned. "mb_per_second" is
+            measured in (compressed) bytes of the input file
+
+    Args:
+        input_dir (str): Directory containing one .jsonl file per table
+        output_dir (str): Directory into which the pivoted tables are written
+        workers (int): Number of processes (default: the number of CPUs)
+        **pivot_kwargs: Other arguments of src.transform_data.pivot_jsonl() (e.g.
+                        chunk_size, output_format)
+
+    Returns:
+        list: the throughput of each file (in order of file name) i.e. dicts of
+                {"input_filepath", "output_filepath", "n_bytes", "n_rows",
+                "seconds", "mb_per_second", "rows_per_second"}
+
+    Example:
+        >>> src.transform_data.pivot_jsonl_files(
+        ...     input_dir="data_input",
+        ...     output_dir="temp_storage",
+        ...     workers=8,
+        ...     chunk_size=100_000,
+        ... )
+    """
+    start_time: float = time.perf_counter()
+    output_suffix: str = (
+        "" if pivot_kwargs.get("output_format", "json") == "columnar" else ".json"
+    )
+    input_paths: list[pathlib.Path] = find_jsonl_files(input_dir)
+    pathlib.Path(output_dir).mkdir(parents=True, exist_ok=True)
+    logger.info(
+        "Pivoting %s files with %s workers (JSON parser: %s)",
+        len(input_paths),
+        workers or os.cpu_count(),
+        "json" if orjson is None else "orjson",
+    )
+
+    file_stats: dict[pathlib.Path, dict] = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures: dict[Future, pathlib.Path] = {
+            executor.submit(
+                _pivot_file,
+                path,
+                pathlib.Path(output_dir) / f"{jsonl_stem(path)}{output_suffix}",
+                pivot_kwargs,
+            ): path
+            for path in sorted(
+                input_paths, key=lambda path: path.stat().st_size, reverse=True
+            )
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            file_stats[path] = future.result()
+            logger.info(
+                "Pivoted [%s]: %s rows in %.1f seconds (%.2f MB/s, %s rows/s)",
+                path.name,
+                f"{file_stats[path]['n_rows']:,}",
+                file_stats[path]["seconds"],
+                file_stats[path]["mb_per_second"],
+                f"{file_stats[path]['rows_per_second']:,.0f}",
+            )
+
+    total_seconds: float = max(time.perf_counter() - start_time, 1e-9)
+    total_mb: float = sum(stats["n_bytes"] for stats in file_stats.values()) / 1024**2
+    print(
+        f"Pivoted {len(file_stats)} files ({total_mb:,.1f} MB) in"
+        f" {total_seconds:,.1f} seconds ({total_mb / total_seconds:,.2f} MB/s)"
+    )
+    return [file_stats[path] for path in input_paths]
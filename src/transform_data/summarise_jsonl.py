@@ -0,0 +1,209 @@
+"""
+Defines function src.transform_data.summarise_jsonl.summarise_jsonl()
+"""
+
+import hashlib
+import json
+import logging
+import math
+import pathlib
+import pickle
+import random
+from collections import Counter
+from dataclasses import dataclass
+
+from src.instrumentation import emit, instrument_stage
+
+from .jsonl_io import open_jsonl, parse_json_line
+from .pivot_jsonl import SCALAR_TYPES, _warn_invalid_data_types
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SUFFIX: str = ".summary.pickle"
+
+
+@dataclass
+class ColumnSummary:
+    """Compact summary of a single column, which src.discover.join_keys() can use
+    in place of the full column contents
+
+    Attributes:
+        n_rows (int): Number of rows in the column
+        n_null (int): Number of None (or missing) values in the column
+        value_counts (dict): Number of times that each (non-null) value appears
+                                in the column
+        sample (list): Uniform random sample of (at most) `n_samples` values from
+                                the column (including None values)
+        n_samples (int): Size of the reservoir which `sample` was drawn into
+    """
+
+    n_rows: int
+    n_null: int
+    value_counts: dict
+    sample: list
+    n_samples: int
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    @property
+    def value_types(self) -> set[str]:
+        """Names of the data types of the (non-null) values in the column"""
+        return {type(value).__name__ for value in self.value_counts}
+
+    def fingerprint(self) -> str:
+        """Hashes the contents of the summary (see
+        src.discover.checkpoint_store.column_fingerprint())"""
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(f"summary:{self.n_rows}:{self.n_null}".encode("ascii"))
+        hasher.update(
+            json.dumps(list(self.value_counts.items()), default=repr).encode("utf-8")
+        )
+        hasher.update(json.dumps(self.sample, default=repr).encode("utf-8"))
+        return hasher.hexdigest()
+
+
+def _uniform_open(rng: random.Random) -> float:
+    """Draws from the uniform distribution on (0, 1)"""
+    while (u := rng.random()) == 0.0:
+        pass
+    return u
+
+
+@instrument_stage("transform_data.summarise_jsonl")
+def summarise_jsonl(
+    input_filepath: str,
+    output_filepath: str,
+    n_samples: int = 500,
+    random_seed: int | None = None,
+    allowed_types: tuple[type, ...] | None = None,
+) -> dict[str, ColumnSummary]:
+    """Reads a newline-delimited JSON file (one table row per line) once, and
+    keeps only a ColumnSummary of each column (a fixed-size random sample of
+    rows, and the count of each distinct value) instead of pivoting it
+
+    Notes:
+        - src.discover.join_keys() runs directly from the summaries (load them
+            with src.transform_data.load_column_summaries()), so that memory
+            depends on the number of distinct values rather than on the number
+            of rows. The sample is the sample side of each column pair, and the
+            value counts are the lookup side
+        - The rows are sampled using reservoir sampling (Algorithm L, which only
+            draws random numbers for the rows which enter the reservoir). A single
+            reservoir of rows is kept per table, so the sample of every column is
+            a uniform random sample of its rows. The samples differ from those
+            drawn by src.discover.join_keys() from fully pivoted columns, so the
+            match counts can differ slightly
+        - Columns which first appear partway through the file (or which are
+            missing from some rows) are treated as null in those rows, exactly as
+            in src.transform_data.pivot_jsonl()
+        - Columns containing complex or nested values are omitted, as are
+            (if `allowed_types` is provided) columns containing non-null values of
+            other types. These columns stop being counted as soon as such a value
+            is read
+
+    Args:
+        input_filepath (str): location of input .jsonl (or .jsonl.gz, .jsonl.zst) file
+        output_filepath (str): desired location of the output summaries (a pickle
+                            file, named "{table name}.summary.pickle")
+        n_samples (int): Number of rows in the reservoir (use the `n_samples` which
+                            will be passed to src.discover.join_keys())
+        random_seed (int): (optional) Seed of the reservoir sampling
+        allowed_types (tuple): (optional) e.g. the `allowed_key_types` of
+                            src.discover.join_keys()
+
+    Returns:
+        dict: {column name: ColumnSummary}
+
+    Example:
+        >>> for path in pathlib.Path("data_input").glob("*.jsonl"):
+        ...     src.transform_data.summarise_jsonl(
+        ...         input_filepath=path,
+        ...         output_filepath=f"temp_storage/{path.stem}.summary.pickle",
+        ...         n_samples=500,
+        ...         random_seed=42,
+        ...         allowed_types=(int, str),
+        ...     )
+        >>> table_data = src.transform_data.load_column_summaries("temp_storage")
+    """
+    logger.info("Summarising file [%s] (n_samples=%s)", input_filepath, n_samples)
+    rng = random.Random(random_seed)
+    value_counts: dict[str, Counter] = {}
+    invalid_data_type_colnames: set[str] = set()
+    reservoir: list[dict] = []
+    # state of Algorithm L (the row index of the next row to enter the reservoir) #
+    weight: float = math.exp(math.log(_uniform_open(rng)) / max(n_samples, 1))
+    next_sample_idx: int = -1
+
+    def skip_rows() -> int:
+        return math.floor(math.log(_uniform_open(rng)) / math.log(1 - weight)) + 1
+
+    if n_samples > 0:
+        next_sample_idx = n_samples - 1 + skip_rows()
+    n_rows: int = 0
+    with open_jsonl(input_filepath) as file:
+        for line in file:
+            if len(line.strip()) == 0:
+                continue
+            linedict = parse_json_line(line)
+            for key, value in linedict.items():
+                if key in invalid_data_type_colnames:
+                    continue
+                if value is not None and (
+                    type(value) not in SCALAR_TYPES
+                    or (allowed_types is not None and type(value) not in allowed_types)
+                ):
+                    invalid_data_type_colnames.add(key)
+                    value_counts.pop(key, None)
+                    continue
+                col_value_counts = value_counts.get(key)
+                if col_value_counts is None:
+                    col_value_counts = value_counts[key] = Counter()
+                if value is not None:
+                    col_value_counts[value] += 1
+            if n_rows < n_samples:
+                reservoir.append(linedict)
+            elif n_rows == next_sample_idx:
+                reservoir[rng.randrange(n_samples)] = linedict
+                weight *= math.exp(math.log(_uniform_open(rng)) / n_samples)
+                next_sample_idx += skip_rows()
+            n_rows += 1
+    emit("count", name="rows_read", value=n_rows)
+
+    if allowed_types is None:
+        _warn_invalid_data_types(invalid_data_type_colnames)
+    else:
+        logger.info(
+            "%s columns contain values of types other than %s and have been omitted",
+            len(invalid_data_type_colnames),
+            [t.__name__ for t in allowed_types],
+        )
+
+    summaries: dict[str, ColumnSummary] = {}
+    for colname, col_value_counts in value_counts.items():
+        summaries[colname] = ColumnSummary(
+            n_rows=n_rows,
+            n_null=n_rows - sum(col_value_counts.values()),
+            value_counts=dict(col_value_counts),
+            sample=[row.get(colname) for row in reservoir],
+            n_samples=n_samples,
+        )
+    with open(output_filepath, "wb") as file:
+        pickle.dump(summaries, file, protocol=pickle.HIGHEST_PROTOCOL)
+    logger.info(
+        "Exported summaries of %s columns to [%s] (%s rows)",
+        len(summaries),
+        output_filepath,
+        f"{n_rows:,}",
+    )
+    return summaries
+
+
+def load_column_summaries(dirpath: str) -> dict[str, dict[str, ColumnSummary]]:
+    """Loads every table summary (i.e. "{table name}.summary.pickle" file) in
+    `dirpath` written by summarise_jsonl(), keyed by table name"""
+    table_summaries: dict[str, dict[str, ColumnSummary]] = {}
+    for path in sorted(pathlib.Path(dirpath).glob(f"*{SUMMARY_SUFFIX}")):
+        with open(path, "rb") as file:
+            table_summaries[path.name[: -len(SUMMARY_SUFFIX)]] = pickle.load(file)
+    return table_summaries
@@ -4,14 +4,40 @@ Function src.transform_data.table_link_paths_to_csv.table_link_paths_to_csv()
 
 import csv
 import pickle
+from typing import Iterator
 
+from src.discover.table_links.path_store import PathStore, is_path_store_file
 
-def table_link_paths_to_csv(input_data_filepath: str, output_filepath: str):
-    """Converts the table link pathes database from .pickle to a
-    more user-friendly .csv representation
-    """
+
+def _iter_pickled_paths(input_data_filepath: str) -> Iterator[dict]:
     with open(input_data_filepath, "rb") as file:
         paths_db = pickle.load(file)
+    for (src_tbl_name, dest_tbl_name), paths in paths_db.items():
+        for path in paths:
+            yield {
+                "source_table": src_tbl_name,
+                "destination_table": dest_tbl_name,
+                "path": path,
+                "path_len": len(path.split(" -> ")),
+            }
+
+
+def table_link_paths_to_csv(input_data_filepath: str, output_filepath: str):
+    """Converts the table link pathes database from .pickle (or a SQLite path
+    store) to a more user-friendly .csv representation
+
+    Notes:
+        - A SQLite path store (a .db, .sqlite or .sqlite3 file written by
+            src.discover.table_links.create_db(output_format="sqlite")) is
+            streamed from a cursor, so memory use does not depend on the
+            number of paths
+    """
+    if is_path_store_file(input_data_filepath):
+        path_store = PathStore(input_data_filepath)
+        rows = path_store.iter_paths()
+    else:
+        path_store = None
+        rows = _iter_pickled_paths(input_data_filepath)
 
     with open(output_filepath, mode="w", encoding="utf-8") as file:
         csv_writer = csv.DictWriter(
@@ -22,13 +48,6 @@ def table_link_paths_to_csv(input_data_filepath: str, output_filepath: str):
             quoting=csv.QUOTE_MINIMAL,
         )
         csv_writer.writeheader()
-        for (src_tbl_name, dest_tbl_name), paths in paths_db.items():
-            for path in paths:
-                csv_writer.writerow(
-                    {
-                        "source_table": src_tbl_name,
-                        "destination_table": dest_tbl_name,
-                        "path": path,
-                        "path_len": len(path.split(" -> ")),
-                    }
-                )
+        csv_writer.writerows(rows)
+    if path_store is not None:
+        path_store.close()
@@ -0,0 +1,32 @@
+"""
+Regression tests for src.discover.column_profile.ColumnProfileCache
+"""
+
+from src.discover.column_profile import ColumnProfileCache
+
+
+def test_cache_is_not_reused_for_a_new_column_object():
+    """A new list of values must not hit the profile of a freed list, even if
+    CPython gives it the same id()"""
+    cache = ColumnProfileCache()
+    cache.get("t", "c", [1, 2, 3, 4])
+    profile = cache.get("t", "c", [7, 8, 9, 10])
+    assert cache.n_hits == 0
+    assert list(profile.value_counts) == [7, 8, 9, 10]
+
+
+def test_cache_is_reused_for_the_same_column_object():
+    cache = ColumnProfileCache()
+    values = [1, 2, 2, None]
+    cache.get("t", "c", values)
+    cache.get("t", "c", values)
+    assert cache.n_hits == 1
+
+
+def test_profile_nbytes_counts_the_values():
+    """The memory estimate (used by the max_bytes cap) includes the values in
+    the profile, not only its containers"""
+    cache = ColumnProfileCache()
+    short_values = cache.get("t", "short", ["a", "b", "c"])
+    long_values = cache.get("t", "long", ["a" * 10_000, "b" * 10_000, "c" * 10_000])
+    assert long_values.nbytes > 30_000 > short_values.nbytes
@@ -0,0 +1,22 @@
+"""
+Regression tests for src.discover.inverted_index.InvertedValueIndex
+"""
+
+from src.discover.inverted_index import InvertedValueIndex
+
+
+def test_reused_index_reports_spills_of_the_current_build_only(tmp_path):
+    """Postings buffered (and spilled) by earlier builds must not leak into the
+    spill count of a later build of the same index"""
+    columns = [
+        ("orders", "customer_id", list(range(100))),
+        ("customers", "id", list(range(100))),
+    ]
+    index = InvertedValueIndex(n_partitions=4, max_buffered_postings=150)
+    for _ in range(3):
+        index.count_all_matches(
+            columns, n_samples=500, random_seed=0, temp_dir=tmp_path
+        )
+        assert index.report["n_postings"] == 200
+        assert index.report["n_postings_spilled"] <= index.report["n_postings"]
+        assert index.report["n_postings_spilled"] == 150
@@ -0,0 +1,19 @@
+"""
+Regression tests for src.discover.join_keys.join_keys()
+"""
+
+import pytest
+
+from src.discover import join_keys
+from src.discover.prefilters import FingerprintPrefilter
+
+
+def test_prefilter_requires_random_seed(tmp_path):
+    """Without a seed, the fingerprinted sample can differ from the sample which
+    is scored, so the prefilter would not be exact"""
+    with pytest.raises(ValueError, match="random_seed"):
+        join_keys(
+            tbl_contents={"a": {"id": [1, 2, 3]}, "b": {"a_id": [1, 2]}},
+            output_path=str(tmp_path / "all_matches.json"),
+            prefilter=FingerprintPrefilter(),
+        )
@@ -0,0 +1,59 @@
+"""
+Regression tests for src.dataviz.make_sqlite_skeleton.make_sqlite_skeleton()
+"""
+
+import sqlite3
+
+from src.dataviz.make_sqlite_skeleton import make_sqlite_skeleton
+
+
+def test_composite_key_pair_with_tbl_contents(tmp_path):
+    """Composite keys (which are not columns of the pivoted tables) are created
+    but left empty, and the real join columns are loaded (tables with no real
+    join columns are left empty)"""
+    output_db_path = str(tmp_path / "skeleton.db")
+    make_sqlite_skeleton(
+        col_pairs=[
+            (("payments", "(acct, br)"), ("accounts", "(acct, br)")),
+            (("payments", "customer_id"), ("customers", "id")),
+        ],
+        output_db_path=output_db_path,
+        tbl_contents={
+            "payments": {
+                "acct": [1, 2, 3],
+                "br": [10, 20, 30],
+                "customer_id": [5, 6, 7],
+            },
+            "accounts": {"acct": [1, 2, 3], "br": [10, 20, 30]},
+            "customers": {"id": [5, 6, 7]},
+        },
+        create_indexes=True,
+    )
+    sql_con = sqlite3.connect(output_db_path)
+    assert sql_con.execute(
+        'SELECT COUNT(*), COUNT("(acct, br)") FROM "payments"'
+    ).fetchone() == (3, 0)
+    assert sql_con.execute('SELECT COUNT(*) FROM "accounts"').fetchone()[0] == 0
+    assert (
+        sql_con.execute(
+            'SELECT COUNT(*) FROM "payments" JOIN "customers"'
+            ' ON "payments"."customer_id" = "customers"."id"'
+        ).fetchone()[0]
+        == 3
+    )
+    sql_con.close()
+
+
+def test_index_names_do_not_collide(tmp_path):
+    output_db_path = str(tmp_path / "skeleton.db")
+    make_sqlite_skeleton(
+        col_pairs=[(("a_b", "c"), ("a", "b_c"))],
+        output_db_path=output_db_path,
+        create_indexes=True,
+    )
+    sql_con = sqlite3.connect(output_db_path)
+    n_indexes = sql_con.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'"
+    ).fetchone()[0]
+    sql_con.close()
+    assert n_indexes == 2
@@ -0,0 +1,90 @@
+"""
+Regression tests for src.decision.metrics_table.load_metrics_table()
+"""
+
+import json
+
+import numpy as np
+
+from src.decision.comparison_operators import greater_than
+from src.decision.metrics_table import load_metrics_table
+
+
+def _match_pair(sample_colname: str, percent: float, **optional_fields) -> dict:
+    return {
+        "sampled_col": {"table_name": "orders", "column_name": sample_colname},
+        "lookup_col": {"table_name": "customers", "column_name": "id"},
+        "matches": {"exactly_1_match_in_lookup": {"percent": percent}},
+        **optional_fields,
+    }
+
+
+def test_mixed_adaptive_prefilter_and_composite_output(tmp_path):
+    """Fields whose type changes between records, fields missing from some
+    records and list-valued fields are all loaded"""
+    records = [
+        _match_pair(
+            "customer_id",
+            0.9,
+            adaptive_sampling={
+                "n_values_scored": 10,
+                "n_values_available": 10,
+                "stopped_early": None,
+            },
+        ),
+        # rejected by a prefilter: no "adaptive_sampling" #
+        _match_pair("order_id", 0.0),
+        _match_pair(
+            "(branch_id, account_no)",
+            0.5,
+            adaptive_sampling={
+                "n_values_scored": 4,
+                "n_values_available": 40,
+                "stopped_early": "settled_low",
+            },
+            composite_key={
+                "sampled_columns": ["branch_id", "account_no"],
+                "lookup_columns": ["branch_id", "account_no"],
+            },
+        ),
+    ]
+    filepath = tmp_path / "all_matches.jsonl"
+    filepath.write_text("\n".join(json.dumps(record) for record in records))
+
+    metrics_table = load_metrics_table(str(filepath))
+
+    assert metrics_table.n_rows == 3
+    for values in metrics_table.columns.values():
+        assert len(values) == 3
+    assert metrics_table.columns[("adaptive_sampling", "stopped_early")] == [
+        None,
+        None,
+        "settled_low",
+    ]
+    np.testing.assert_array_equal(
+        metrics_table.columns[("adaptive_sampling", "n_values_scored")],
+        [10, np.nan, 4],
+    )
+    assert metrics_table.columns[("composite_key", "sampled_columns")] == [
+        None,
+        None,
+        ["branch_id", "account_no"],
+    ]
+    mask = metrics_table.criteria_mask(
+        (("matches", "exactly_1_match_in_lookup", "percent", (greater_than, 0.1)),)
+    )
+    assert metrics_table.column_pairs(mask) == [
+        (("orders", "customer_id"), ("customers", "id")),
+        (("orders", "(branch_id, account_no)"), ("customers", "id")),
+    ]
+
+
+def test_field_which_is_always_none_is_numeric(tmp_path):
+    filepath = tmp_path / "all_matches.jsonl"
+    filepath.write_text(
+        json.dumps(
+            _match_pair("customer_id", 0.9, adaptive_sampling={"stopped_early": None})
+        )
+    )
+    metrics_table = load_metrics_table(str(filepath))
+    assert np.isnan(metrics_table.columns[("adaptive_sampling", "stopped_early")]).all()